@@ -8,14 +8,17 @@ import asyncio
 import threading
 import time
 import json
+import os
 
 from enhanced_main import EnhancedMultiAgentConversation, ConversationState
 import random
 from dotenv import load_dotenv
-from enhanced_main import get_conversation_system
+from enhanced_main import get_conversation_system, health_status, startup_ready, startup_status, warm_startup
 from typing_simulator import MultiMessageGenerator
 from message_splitter import MessageSplitter
 from ai_error_logger import log_ai_error, ErrorCategory, ErrorSeverity
+from message_analysis import analyze_message
+from usage_tracker import parse_budget, usage_tracker
 
 # Load environment variables from .env file
 load_dotenv()
@@ -30,6 +33,18 @@ conversation_running = False
 message_generator = MultiMessageGenerator()
 message_splitter = MessageSplitter()
 
+def start_warm_startup():
+    """Warm up in the background so the server answers /api/health (not ready) meanwhile"""
+    threading.Thread(target=warm_startup, name="warm-startup", daemon=True).start()
+
+if os.getenv("WARM_STARTUP", "true").lower() == "false":
+    # Everything is built lazily by the first request, as without warm startup
+    startup_status["state"] = "skipped"
+    startup_ready.set()
+elif not (__name__ == '__main__' and os.environ.get("WERKZEUG_RUN_MAIN") != "true"):
+    # Not in the watcher process Flask's debug reloader runs this file in; it never serves requests
+    start_warm_startup()
+
 def _check_and_redirect_to_sexual_script(conversation_system):
     """Check latest AI response for sexual content and redirect to sexual script if needed"""
     if not conversation_system.current_session or not conversation_system.current_session.context.messages:
@@ -49,24 +64,15 @@ def _check_and_redirect_to_sexual_script(conversation_system):
         not latest_message.get('group_part', False)):
         
         ai_response_content = latest_message.get('content', '')
+        hits = analyze_message(ai_response_content).keyword_hits
         
         # CRISIS PROTECTION: Never redirect crisis/sadness responses
-        crisis_keywords = ['loss', 'died', 'death', 'sad', 'sorrow', 'grief', 'mourn', 'miss', 'sorry', 'hurt', 'pain']
-        is_crisis_response = any(word in ai_response_content.lower() for word in crisis_keywords)
-        if is_crisis_response:
+        if hits.has("reply_crisis"):
             print(f"🛡️ Crisis protection: Blocking sexual redirection for crisis response")
             return False
         
         # Check for sexual keywords in AI response (removed generic words like 'feel')
-        sexual_keywords = [
-            'undress', 'naked', 'bedroom', 'body', 'sexy', 'hot',
-            'horny', 'arousal', 'desire', 'passion', 'caress', 'seduce', 'tease',
-            'dominate', 'submissive', 'naughty', 'dirty', 'wild', 'explore', 'intimate',
-            'pleasure', 'excite', 'turn on', 'take control', 'mommy', 'baby girl'
-        ]
-        
-        ai_response_lower = ai_response_content.lower()
-        found_keywords = [kw for kw in sexual_keywords if kw in ai_response_lower]
+        found_keywords = hits.terms("reply_sexual")
         
         # Check if AI response is sexual enough to trigger script (keywords only)
         is_sexual_response = len(found_keywords) >= 3
@@ -171,6 +177,16 @@ def start_conversation():
     if conversation_running:
         return jsonify({"error": "Conversation already running"})
     
+    # Optional per-session budgets (switch to cheaper models once exceeded), checked before starting
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "request body must be a JSON object"}), 400
+    try:
+        token_budget = parse_budget(data.get('token_budget'), int)
+        cost_budget = parse_budget(data.get('cost_budget_usd'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     try:
         conversation_system = get_conversation_system()
         
@@ -186,6 +202,13 @@ def start_conversation():
                 break
             time.sleep(0.1)
         
+        if token_budget is not None or cost_budget is not None:
+            usage_tracker.set_session_budget(
+                conversation_system.current_session.session_id,
+                max_tokens=token_budget,
+                max_cost_usd=cost_budget
+            )
+        
         return jsonify({
             "status": "started", 
             "session_id": conversation_system.current_session.session_id
@@ -351,7 +374,12 @@ def send_message_stream():
                             elif any(flag in conversation_system.energy_flags for flag in ["supportive", "caring"]):
                                 context = "emotional"
                         
-                        message_parts = message_splitter.split_message(full_response, context)
+                        # Script content was split at startup; only generated replies are split per turn
+                        message_parts = None
+                        if agent_msg.get('script_message'):
+                            message_parts = conversation_system.script_manager.get_split_plan(full_response, context)
+                        if message_parts is None:
+                            message_parts = message_splitter.split_message(full_response, context, analyze_message(full_response))
                         print(f"🔵 Split into {len(message_parts)} parts for {context} content")
                         
                         # Send each part with calculated delays
@@ -441,16 +469,38 @@ def get_metrics():
     except Exception as e:
         return jsonify({"error": str(e)})
 
+@app.route('/api/usage', methods=['GET'])
+def get_usage():
+    """Get server-wide token and cost usage"""
+    try:
+        from usage_tracker import get_server_usage, get_session_usage
+        from model_selector import model_selector
+        from local_energy_classifier import get_cascade_stats
+        
+        usage = get_server_usage()
+        usage["model_tiers"] = model_selector.get_status()
+        usage["energy_cascade"] = get_cascade_stats()
+        if conversation_system and conversation_system.current_session:
+            usage["current_session"] = get_session_usage(conversation_system.current_session.session_id)
+        usage["timestamp"] = time.time()
+        
+        return jsonify(usage)
+        
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({"status": "healthy", "timestamp": time.time()})
+    """Health check endpoint; 503 until warm startup is done"""
+    body, status = health_status()
+    return jsonify(body), status
 
 @app.route('/api/errors', methods=['GET'])
 def get_error_statistics():
     """Get AI error statistics and recent errors"""
     try:
         from ai_error_logger import get_error_statistics, get_recent_errors
+        from llm_json_parser import get_parse_stats
         
         stats = get_error_statistics()
         recent_errors = get_recent_errors(limit=20)
@@ -458,6 +508,7 @@ def get_error_statistics():
         return jsonify({
             "statistics": stats,
             "recent_errors": recent_errors,
+            "parse_failures": get_parse_stats(),
             "timestamp": time.time()
         })
         
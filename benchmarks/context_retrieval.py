@@ -0,0 +1,77 @@
+"""
+Benchmark: what conversation context and energy add to few-shot retrieval
+
+Times DatasetLoader.get_relevant_examples with the current message only,
+with the last CONTEXT_TURNS turns mixed in at decaying weights, and with
+the turns plus the user's EnergySignature (energy labels are precomputed
+per example at load time, so the query only re-orders a few candidates).
+Larger corpora are synthesized by recombining turns from the dataset.
+
+Run from the repository root:
+    python benchmarks/context_retrieval.py
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_loader import CONTEXT_TURNS, DatasetLoader
+from energy_analyzer import rule_based_energy_analysis
+
+
+def write_corpus(path, users, assistants, count, seed=7):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(count):
+            f.write(json.dumps({"messages": [{"role": "user", "content": rng.choice(users)},
+                                             {"role": "assistant", "content": rng.choice(assistants)}]}) + "\n")
+
+
+def bench(func, conversations, repeat):
+    """Mean µs per call over every (message, turns, energy) conversation"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message, turns, energy in conversations:
+            func(message, turns, energy)
+    return (time.perf_counter() - start) / (repeat * len(conversations)) * 1_000_000
+
+
+def main():
+    bundled = DatasetLoader(tags_path=None, artifact_path=None)
+    users = [msg['content'] for example in bundled.examples for msg in example['messages'] if msg['role'] == 'user']
+    assistants = [msg['content'] for example in bundled.examples for msg in example['messages'] if msg['role'] == 'assistant']
+    # Each user message with the turns that came before it in a synthetic conversation
+    rng = random.Random(1)
+    conversations = []
+    for message in users[:40]:
+        turns = [rng.choice(users if turn % 2 == 0 else assistants) for turn in range(CONTEXT_TURNS)]
+        conversations.append((message, turns, rule_based_energy_analysis(message)))
+
+    print(f"{len(conversations)} queries, per-query time in µs")
+    print(f"  {'examples':>8} {'message':>8} {'+turns':>7} {'+energy':>8} {'added':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in (None, 10_000, 100_000):
+            if count is None:
+                loader = bundled
+            else:
+                path = os.path.join(tmp, f"corpus_{count}.jsonl")
+                write_corpus(path, users, assistants, count)
+                loader = DatasetLoader(tags_path=None, artifact_path=None, dataset_paths=[path])
+            repeat = max(1, 200_000 // len(loader.examples))
+            message_only = bench(lambda message, turns, energy: loader.get_relevant_examples(message, 3),
+                                 conversations, repeat)
+            with_turns = bench(lambda message, turns, energy: loader.get_relevant_examples(message, 3, turns),
+                               conversations, repeat)
+            with_energy = bench(lambda message, turns, energy: loader.get_relevant_examples(message, 3, turns, energy),
+                                conversations, repeat)
+            print(f"  {len(loader.examples):>8} {message_only:>8.0f} {with_turns:>7.0f} {with_energy:>8.0f} "
+                  f"{with_energy - message_only:>6.0f}")
+
+
+if __name__ == "__main__":
+    main()
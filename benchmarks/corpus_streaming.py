@@ -0,0 +1,83 @@
+"""
+Benchmark: memory and time of the offset-indexed corpus as the corpus grows
+
+Compares loading every conversation into a list (what DatasetLoader does)
+with the offset index: building it, reopening it from the saved offsets,
+sampling by id and a stratified reservoir pass. Peak heap is measured with
+tracemalloc.
+
+Run from the repository root:
+    python benchmarks/corpus_streaming.py
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_corpus import ConversationCorpus
+
+
+def write_corpus(path, count, seed=7):
+    users, assistants = [], []
+    with open('girlfriend_dataset_clean.jsonl', 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                for msg in json.loads(line).get('messages', []):
+                    (users if msg.get('role') == 'user' else assistants).append(msg.get('content', ''))
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(count):
+            f.write(json.dumps({"messages": [{"role": "user", "content": rng.choice(users)},
+                                             {"role": "assistant", "content": rng.choice(assistants)}]}) + "\n")
+
+
+def measure(func):
+    """(result, seconds, peak heap bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def load_all(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    print("seconds / peak heap MB")
+    print(f"  {'conversations':>13} {'load all':>16} {'build index':>16} {'reopen':>14} "
+          f"{'sample 1k':>14} {'stratified':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in (100_000, 1_000_000):
+            path = os.path.join(tmp, f"corpus_{count}.jsonl")
+            write_corpus(path, count)
+
+            cells = []
+            _, elapsed, peak = measure(lambda: load_all(path))
+            cells.append((elapsed, peak))
+            corpus, elapsed, peak = measure(lambda: ConversationCorpus([path]))
+            cells.append((elapsed, peak))
+            corpus.close()
+            corpus, elapsed, peak = measure(lambda: ConversationCorpus([path]))
+            cells.append((elapsed, peak))
+            _, elapsed, peak = measure(lambda: corpus.sample(1_000, seed=1))
+            cells.append((elapsed, peak))
+            stratum = lambda conversation: str(len(conversation["messages"][0]["content"]) % 10)
+            _, elapsed, peak = measure(lambda: corpus.stratified_sample(100, stratum, seed=1))
+            cells.append((elapsed, peak))
+            corpus.close()
+            print(f"  {count:>13} " + " ".join(f"{elapsed:>7.2f}s/{peak / 1e6:>6.1f}" for elapsed, peak in cells))
+
+
+if __name__ == "__main__":
+    main()
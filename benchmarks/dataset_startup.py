@@ -0,0 +1,83 @@
+"""
+Benchmark: DatasetLoader startup from JSONL vs the compiled, memory-mapped artifact
+
+Larger corpora are synthesized by recombining user and assistant turns from
+the dataset. Tags are not persisted, so the JSONL path pays for tagging as
+it would on a fresh worker. The vector columns time the vector backend
+fitting its index from JSONL against loading the fitted index stored in
+the artifact.
+
+Run from the repository root:
+    python benchmarks/dataset_startup.py
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_index import build_query
+from dataset_artifact import build_artifact
+from dataset_loader import DatasetLoader
+
+
+def write_corpus(path, count, seed=7):
+    loader = DatasetLoader(tags_path=None, artifact_path=None)
+    users = [msg['content'] for example in loader.examples for msg in example['messages'] if msg['role'] == 'user']
+    assistants = [msg['content'] for example in loader.examples for msg in example['messages'] if msg['role'] == 'assistant']
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(count):
+            f.write(json.dumps({"messages": [{"role": "user", "content": rng.choice(users)},
+                                             {"role": "assistant", "content": rng.choice(assistants)}]}) + "\n")
+
+
+def timed_load(**kwargs):
+    """(loader, seconds, bytes allocated); heap is measured on a second, traced load"""
+    start = time.perf_counter()
+    loader = DatasetLoader(tags_path=None, **kwargs)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    traced = DatasetLoader(tags_path=None, **kwargs)
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+    return loader, elapsed, heap
+
+
+def main():
+    print(f"  {'examples':>8} {'jsonl load':>11} {'jsonl heap':>11} {'artifact build':>15} "
+          f"{'artifact open':>14} {'open heap':>10} {'same top-3':>11} {'vector fit':>11} {'vector open':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in (1_000, 10_000, 100_000):
+            dataset_path = os.path.join(tmp, f"corpus_{count}.jsonl")
+            artifact_path = os.path.join(tmp, f"corpus_{count}.bin")
+            write_corpus(dataset_path, count)
+
+            parsed, jsonl_time, jsonl_heap = timed_load(artifact_path=None, dataset_paths=[dataset_path])
+            start = time.perf_counter()
+            build_artifact(artifact_path, [dataset_path])
+            build_time = time.perf_counter() - start
+            mapped, open_time, open_heap = timed_load(artifact_path=artifact_path, dataset_paths=[dataset_path])
+
+            query = build_query("how was your day baby")
+            same = [i for i, _ in parsed.index.top_k(query, 3)] == [i for i, _ in mapped.index.top_k(query, 3)]
+
+            start = time.perf_counter()
+            DatasetLoader("vector", tags_path=None, artifact_path=None, dataset_paths=[dataset_path])
+            vector_fit = time.perf_counter() - start
+            start = time.perf_counter()
+            DatasetLoader("vector", tags_path=None, artifact_path=artifact_path, dataset_paths=[dataset_path])
+            vector_open = time.perf_counter() - start
+            print(f"  {count:>8} {jsonl_time:>10.2f}s {jsonl_heap / 1e6:>9.1f}MB {build_time:>14.2f}s "
+                  f"{open_time * 1000:>11.1f}ms {open_heap / 1e6:>8.2f}MB {str(same):>11} "
+                  f"{vector_fit:>10.2f}s {vector_open * 1000:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: few-shot example retrieval cost as the example corpus grows
+
+Compares the original per-reply scan (join, lowercase and substring-test
+every example) with BM25 top-k over the inverted index built at load time
+and with the dense vector index (one matrix product per query, or per
+batch of queries, plus diversity re-ranking). Larger corpora are
+synthesized by recombining user and assistant turns from the dataset.
+
+Run from the repository root:
+    python benchmarks/example_retrieval.py
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_index import BM25Index, build_query
+from vector_index import VectorIndex
+
+SEXUAL_KEYWORDS = ['horny', 'sexy', 'touch', 'kiss', 'love', 'need', 'want', 'feel']
+EMOTIONAL_KEYWORDS = ['sad', 'lonely', 'miss', 'hurt', 'upset', 'worried']
+CASUAL_KEYWORDS = ['hey', 'hi', 'what', 'how', 'doing', 'up', 'sup']
+
+
+def load_turns():
+    users, assistants = [], []
+    with open('girlfriend_dataset_clean.jsonl', 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                for msg in json.loads(line).get('messages', []):
+                    (users if msg.get('role') == 'user' else assistants).append(msg.get('content', ''))
+    return users, assistants
+
+
+def synthetic_examples(users, assistants, count, seed=7):
+    rng = random.Random(seed)
+    return [{"messages": [{"role": "user", "content": rng.choice(users)},
+                          {"role": "assistant", "content": rng.choice(assistants)}]}
+            for _ in range(count)]
+
+
+def keyword_scan(examples, user_message, num_examples=3):
+    """What get_relevant_examples did before: rebuild and test every example's text per reply"""
+    user_lower = user_message.lower()
+    relevant = []
+    for example in examples:
+        example_text = ' '.join([msg.get('content', '') for msg in example.get('messages', [])]).lower()
+        if len(relevant) >= num_examples:
+            break
+        for keywords in (SEXUAL_KEYWORDS, EMOTIONAL_KEYWORDS, CASUAL_KEYWORDS):
+            if any(word in user_lower for word in keywords) and any(word in example_text for word in keywords):
+                relevant.append(example)
+                break
+    return relevant
+
+
+def bench(func, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            func(query)
+    return (time.perf_counter() - start) / (repeat * len(queries)) * 1_000_000
+
+
+def main():
+    users, assistants = load_turns()
+    # Queries with no lexicon keyword force the old scan through the whole corpus
+    queries = users[:40] + ["tell me about the beach trip", "my boss yelled at me today"]
+
+    print(f"{len(queries)} queries, build time in seconds, per-query time in µs")
+    print(f"  {'examples':>8} {'bm25 build':>11} {'vec build':>10} {'keyword scan':>13} "
+          f"{'bm25':>7} {'vector':>7} {'batched':>8}")
+    for count in (1_000, 10_000, 100_000):
+        examples = synthetic_examples(users, assistants, count)
+        texts = [' '.join(msg['content'] for msg in example['messages']) for example in examples]
+        start = time.perf_counter()
+        index = BM25Index(texts)
+        bm25_build = time.perf_counter() - start
+        start = time.perf_counter()
+        vector_index = VectorIndex(texts)
+        vector_build = time.perf_counter() - start
+
+        repeat = max(1, 20_000 // count)
+        scan = bench(lambda query: keyword_scan(examples, query), queries, repeat)
+        bm25 = bench(lambda query: index.top_k(build_query(query), 3), queries, repeat)
+        vector = bench(lambda query: vector_index.top_k(vector_index.query_vector(query), 3), queries, repeat)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            vector_index.top_k_batch(vector_index.embed(queries), 3)
+        batched = (time.perf_counter() - start) / (repeat * len(queries)) * 1_000_000
+        print(f"  {count:>8} {bm25_build:>11.2f} {vector_build:>10.2f} {scan:>13.0f} "
+              f"{bm25:>7.0f} {vector:>7.0f} {batched:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
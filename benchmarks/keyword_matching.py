@@ -0,0 +1,84 @@
+"""
+Benchmark: per-detector substring loops vs the shared token index compiled
+from lexicons.json, plus the cost of a hot-reload
+
+Run from the repository root:
+    python benchmarks/keyword_matching.py
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_engine import KeywordEngine
+from lexicons import LEXICONS, LEXICONS_PATH, LEXICONS_VERSION, load_lexicons
+
+
+def load_messages():
+    messages = []
+    with open('girlfriend_dataset.jsonl', 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                messages += [msg.get('content', '') for msg in json.loads(line).get('messages', [])]
+    return messages
+
+
+def substring_scan(text):
+    """What the detectors did before: one any(kw in text) loop per lexicon"""
+    lowered = text.lower()
+    return {category for category, terms in LEXICONS.items() if any(term in lowered for term in terms)}
+
+
+def per_call_scan(text):
+    """Same loops with the lists rebuilt inside each call, as the inline literals were"""
+    lowered = text.lower()
+    lexicons = {category: list(terms) for category, terms in LEXICONS.items()}
+    return {category for category, terms in lexicons.items() if any(term in lowered for term in terms)}
+
+
+def bench(label, func, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            func(message)
+    elapsed = time.perf_counter() - start
+    per_message = elapsed / (repeat * len(messages)) * 1_000_000
+    print(f"  {label:<28} {per_message:8.1f} µs/message")
+    return per_message
+
+
+def main():
+    engine = KeywordEngine(LEXICONS)
+    # Same engine as the server's, including the throttled lexicon file check
+    reloading_engine = KeywordEngine(LEXICONS, path=LEXICONS_PATH, version=LEXICONS_VERSION)
+    messages = load_messages()
+    terms = sum(len(terms) for terms in LEXICONS.values())
+    print(f"{len(messages)} dataset messages, {len(LEXICONS)} categories, {terms} terms")
+
+    for label, sample, repeat in [
+        ("dataset messages", messages, 20),
+        ("long messages (x10)", [" ".join(messages[i:i + 10]) for i in range(0, len(messages), 10)], 20),
+    ]:
+        print(label)
+        per_call = bench("per-call list construction", per_call_scan, sample, repeat)
+        old = bench("substring loops", substring_scan, sample, repeat)
+        new = bench("token index (uncached)", lambda text: engine.scan(text, use_cache=False), sample, repeat)
+        bench("token index + reload check", lambda text: reloading_engine.scan(text, use_cache=False), sample, repeat)
+        print(f"  speedup: {per_call / new:.1f}x vs per-call lists, {old / new:.1f}x vs substring loops")
+
+    start = time.perf_counter()
+    for _ in range(20):
+        reloading_engine.reload_if_changed(force=True)
+    print(f"hot-reload (parse {os.path.basename(LEXICONS_PATH)} + compile + swap): "
+          f"{(time.perf_counter() - start) / 20 * 1000:.2f} ms")
+
+    changed = [message for message in messages
+               if substring_scan(message) != engine.scan(message, use_cache=False).categories]
+    print(f"{len(changed)} of {len(messages)} messages change categories with word-boundary matching")
+
+
+if __name__ == "__main__":
+    main()
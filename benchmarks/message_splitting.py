@@ -0,0 +1,102 @@
+"""
+Benchmark: per-message split cost with per-pattern re.search loops vs the
+precompiled per-class alternations
+
+Run from the repository root:
+    python benchmarks/message_splitting.py
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_analysis import analyze_message
+from message_splitter import MessageSplitter, SENTENCE_CLASS_ORDER
+
+
+class PatternLoopSplitter(MessageSplitter):
+    """The splitter as it was: one re.search per pattern, regexes looked up on every call"""
+
+    def _classify_sentence(self, sentence):
+        sentence_lower = sentence.lower()
+        for sentence_type in SENTENCE_CLASS_ORDER:
+            patterns = getattr(self, f'{sentence_type}_patterns')
+            if sentence_type == "question":
+                patterns = [r'[^.]*\?[^.]*'] + patterns[1:]
+            for pattern in patterns:
+                if re.search(pattern, sentence_lower):
+                    return sentence_type
+        if len(sentence) < 30:
+            return "teasing"
+        return "emotional" if len(sentence) < 80 else "sensory"
+
+    def _clean_message_part(self, text):
+        if not text:
+            return text
+        emoji_pattern = r'^([\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\U00002600-\U000026FF\U00002700-\U000027BF\U0001F900-\U0001F9FF\U0001FA70-\U0001FAFF\U0001F018-\U0001F0F5\U0001F200-\U0001F2FF\s]+)'
+        leading_emojis = re.findall(emoji_pattern, text)
+        if leading_emojis:
+            text = re.sub(emoji_pattern, '', text).strip()
+            if not text.endswith(('?', '!', '.')):
+                text = text + ''.join(leading_emojis[0])
+            else:
+                text = text[:-1] + ''.join(leading_emojis[0]) + text[-1]
+        question_patterns = [r'\bcan you\b.*$', r'\bare you\b.*$', r'\bdo you\b.*$', r'\bwill you\b.*$',
+                             r'\bwould you\b.*$', r'\bshould i\b.*$', r'\bwhat\b.*$', r'\bhow\b.*$',
+                             r'\bwhere\b.*$', r'\bwhen\b.*$', r'\bwhy\b.*$', r'\btell me\b.*$', r'\bcan you feel\b.*$']
+        text_lower = text.lower()
+        for pattern in question_patterns:
+            if re.search(pattern, text_lower) and not text.endswith('?'):
+                text = text.rstrip('.,!') + '?'
+                break
+        return re.sub(r'\s+', ' ', text).strip()
+
+
+def load_replies():
+    replies = []
+    with open('girlfriend_dataset.jsonl', 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                replies += [msg.get('content', '') for msg in json.loads(line).get('messages', [])
+                            if msg.get('role') == 'assistant']
+    return replies
+
+
+def bench(label, splitter, messages, repeat=50):
+    # Analyses are computed once per turn upstream, so they are not part of the split cost
+    analyses = [analyze_message(message) for message in messages]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message, analysis in zip(messages, analyses):
+            splitter.split_message(message, "sexual", analysis)
+    per_message = (time.perf_counter() - start) / (repeat * len(messages)) * 1_000_000
+    print(f"  {label:<28} {per_message:8.1f} µs/message")
+    return per_message
+
+
+def main():
+    replies = load_replies()
+    old_splitter, new_splitter = PatternLoopSplitter(), MessageSplitter()
+    mismatches = sum(
+        [(part.content, part.type) for part in old_splitter.split_message(reply, "sexual")] !=
+        [(part.content, part.type) for part in new_splitter.split_message(reply, "sexual")]
+        for reply in replies
+    )
+    print(f"{len(replies)} assistant replies, {mismatches} split differently")
+
+    for label, sample in [
+        ("dataset replies", replies),
+        ("long replies (x4)", [" ".join(replies[i:i + 4]) for i in range(0, len(replies), 4)]),
+    ]:
+        print(label)
+        old = bench("pattern loops", old_splitter, sample)
+        new = bench("precompiled alternations", new_splitter, sample)
+        print(f"  speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: scenario trigger matching as the scenario count grows
+
+Compares the old walk over a priority list with substring tests for every
+trigger against the indexed lookup, and incremental scenario registration
+against recompiling every lexicon.
+
+Run from the repository root:
+    python benchmarks/scenario_triggers.py
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enhanced_script_manager import EnhancedScriptManager, ScenarioScript
+from keyword_engine import keyword_engine
+from message_analysis import analyze_message
+
+
+def load_user_messages():
+    messages = []
+    with open('girlfriend_dataset.jsonl', 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                messages += [msg.get('content', '') for msg in json.loads(line).get('messages', [])
+                             if msg.get('role') == 'user']
+    return messages
+
+
+def synthetic_scenario(i):
+    return ScenarioScript(name=f"Scenario {i}", description="", messages=[], energy_flow=[], success_criteria={},
+                          trigger_words=[f"topic{i}", f"talk about topic{i}", f"theme{i} please"],
+                          trigger_priority=i % 7)
+
+
+def substring_walk(manager, message):
+    """What match_trigger_words did before: every scenario's triggers in priority order"""
+    lowered = message.lower()
+    for scenario_key, scenario in sorted(manager.scenarios.items(), key=lambda item: -item[1].trigger_priority):
+        if any(trigger in lowered for trigger in scenario.trigger_words):
+            return scenario_key
+    return None
+
+
+def indexed_match(manager, message):
+    """Uncached scan plus the priority pick - the full per-turn cost"""
+    keyword_engine._cache.clear()
+    return manager.match_trigger_words(message)
+
+
+def bench(func, messages, repeat=20):
+    start = time.perf_counter()
+    # match_trigger_words logs every match
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            for message in messages:
+                func(message)
+    return (time.perf_counter() - start) / (repeat * len(messages)) * 1_000_000
+
+
+def main():
+    messages = load_user_messages()
+    manager = EnhancedScriptManager()
+
+    print(f"{len(messages)} user messages from the dataset")
+    for extra in (0, 100, 500):
+        while len(manager.scenarios) < 6 + extra:
+            manager.add_scenario(f"synthetic_{len(manager.scenarios)}", synthetic_scenario(len(manager.scenarios)))
+        old = bench(lambda message: substring_walk(manager, message), messages)
+        new = bench(lambda message: indexed_match(manager, message), messages)
+        # The orchestrator passes the turn's analysis in, so the scan is shared with every other detector
+        analyses = {message: analyze_message(message) for message in messages}
+        pick = bench(lambda message: manager.match_trigger_words(message, analyses[message]), messages)
+        print(f"  {len(manager.scenarios):>4} scenarios: substring walk {old:8.1f} µs, "
+              f"scan + pick {new:6.1f} µs, pick from shared scan {pick:4.1f} µs per message")
+
+    start = time.perf_counter()
+    for i in range(50):
+        manager.add_scenario(f"incremental_{i}", synthetic_scenario(i))
+    incremental = (time.perf_counter() - start) / 50 * 1000
+
+    start = time.perf_counter()
+    for _ in range(50):
+        keyword_engine._rebuild()
+    full = (time.perf_counter() - start) / 50 * 1000
+
+    print(f"add_scenario with {len(manager.scenarios)} scenarios: {incremental:.2f} ms incremental vs {full:.2f} ms full recompile")
+
+
+if __name__ == "__main__":
+    main()
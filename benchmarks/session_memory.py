@@ -0,0 +1,60 @@
+"""
+Benchmark: memory and construction time of one conversation system per session
+
+Compares every session building its own resources (a fresh SharedResources
+per conversation, which is what EnhancedMultiAgentConversation used to do:
+four Mistral clients, a DatasetLoader and an EnhancedScriptManager each)
+with sessions drawing on the process-wide shared resources. Heap held by
+the live conversations is measured with tracemalloc; no LLM calls are made.
+
+Run from the repository root:
+    python benchmarks/session_memory.py
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Clients are constructed but never called
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+from enhanced_main import EnhancedMultiAgentConversation
+from shared_resources import SharedResources, shared_resources
+
+SESSIONS = 20
+
+
+def measure(make_session):
+    """(seconds per session, heap KB per session) for SESSIONS live conversations"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    sessions = [make_session() for _ in range(SESSIONS)]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del sessions
+    return elapsed / SESSIONS, held / SESSIONS / 1024
+
+
+def main():
+    # Build the shared resources up front, as a warm server would
+    EnhancedMultiAgentConversation(shared_resources)
+    # First isolated build pays one-off import and lexicon costs; keep it out of the numbers
+    EnhancedMultiAgentConversation(SharedResources())
+
+    print(f"{SESSIONS} live sessions")
+    print(f"  {'resources':>9} {'ms/session':>11} {'KB/session':>11}")
+    for name, make_session in (("own", lambda: EnhancedMultiAgentConversation(SharedResources())),
+                               ("shared", lambda: EnhancedMultiAgentConversation(shared_resources))):
+        seconds, kilobytes = measure(make_session)
+        print(f"  {name:>9} {seconds * 1000:>11.1f} {kilobytes:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+BM25 retrieval over an inverted index built once at load time
+
+Each term maps to a postings list of (document id, precomputed BM25 weight),
+so a query only touches the postings of its own terms. Long postings lists
+are cut to their highest-weight documents (champion lists), which keeps
+scoring cost bounded by the number of query terms rather than corpus size.
+Postings are kept in document id order, also as id and weight arrays: a
+query concatenates the arrays of its terms, merges the sorted runs and sums
+weights per document over just those ids, so no step is proportional to the
+corpus size.
+"""
+
+import heapq
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from keyword_engine import TOKEN_PATTERN
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Terms found in more than this share of documents carry almost no signal but have
+# the longest postings lists, so they are skipped at query time on large corpora
+MAX_DOCUMENT_FREQUENCY = 0.5
+PRUNE_MIN_DOCUMENTS = 50
+MAX_POSTINGS_PER_TERM = 1_000
+
+
+def bm25_terms(text: str) -> List[str]:
+    """Lowercased word tokens, using the same tokenizer as the keyword engine"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index with BM25 term weights folded into the postings"""
+
+    def __init__(self, documents: Iterable[str], k1: float = BM25_K1, b: float = BM25_B,
+                 max_postings: int = MAX_POSTINGS_PER_TERM):
+        term_counts = [Counter(bm25_terms(document)) for document in documents]
+        self.document_count = len(term_counts)
+        self.document_lengths = [sum(counts.values()) for counts in term_counts]
+        average_length = (sum(self.document_lengths) / self.document_count) if self.document_count else 0.0
+
+        document_frequency: Counter = Counter()
+        for counts in term_counts:
+            document_frequency.update(counts.keys())
+        self.idf: Dict[str, float] = {
+            term: math.log(1 + (self.document_count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for document_id, counts in enumerate(term_counts):
+            length_norm = k1 * (1 - b + b * self.document_lengths[document_id] / average_length) if average_length else k1
+            for term, frequency in counts.items():
+                weight = self.idf[term] * frequency * (k1 + 1) / (frequency + length_norm)
+                self.postings.setdefault(term, []).append((document_id, weight))
+
+        self.skipped_terms = frozenset(
+            term for term, frequency in document_frequency.items()
+            if self.document_count >= PRUNE_MIN_DOCUMENTS and frequency > MAX_DOCUMENT_FREQUENCY * self.document_count
+        )
+        for term, postings in self.postings.items():
+            if len(postings) > max_postings:
+                self.postings[term] = sorted(heapq.nlargest(max_postings, postings, key=lambda posting: posting[1]))
+        self._posting_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            term: (np.array([document_id for document_id, _ in postings], dtype=np.uint32),
+                   np.array([weight for _, weight in postings], dtype=np.float32))
+            for term, postings in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return self.document_count
+
+    def sparse_scores(self, query: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """(document ids in ascending order, BM25 scores) of the documents matching a {term: weight} query"""
+        id_arrays, weight_arrays = [], []
+        for term, query_weight in query.items():
+            postings = self._term_postings(term)
+            if postings is not None and query_weight > 0:
+                document_ids, weights = postings
+                id_arrays.append(document_ids)
+                weight_arrays.append(np.float32(query_weight) * weights)
+        if not id_arrays:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.float32)
+        if len(id_arrays) == 1:
+            return id_arrays[0], weight_arrays[0]
+        # Each postings list is sorted by id, so a stable sort only merges the runs;
+        # then sum the weights of each run of equal ids
+        document_ids = np.concatenate(id_arrays)
+        weights = np.concatenate(weight_arrays)
+        order = np.argsort(document_ids, kind='stable')
+        document_ids, weights = document_ids[order], weights[order]
+        starts = np.flatnonzero(np.concatenate(([True], document_ids[1:] != document_ids[:-1])))
+        return document_ids[starts], np.add.reduceat(weights, starts)
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(document ids, weights) arrays scored for a query term, or None"""
+        if term in self.skipped_terms:
+            return None
+        return self._posting_arrays.get(term)
+
+    def top_k(self, query: Dict[str, float], k: int) -> List[Tuple[int, float]]:
+        """The k best (document id, score) pairs, best first with ties by id; documents without a query term are left out"""
+        if k <= 0 or not self.document_count:
+            return []
+        matched, scores = self.sparse_scores(query)
+        if len(matched) > k:
+            # The k-th best score in linear time; documents above it, then the lowest ids among those tied with it
+            threshold = np.partition(scores, len(matched) - k)[len(matched) - k]
+            above = scores > threshold
+            tied = np.flatnonzero(scores == threshold)[:k - int(above.sum())]
+            keep = np.concatenate((np.flatnonzero(above), tied))
+            matched, scores = matched[keep], scores[keep]
+        order = np.lexsort((matched, -scores))[:k]
+        return [(int(matched[position]), float(scores[position])) for position in order]
+
+
+def context_weights(turns: int, context_weight: float = 0.5, decay: float = 1.0) -> List[float]:
+    """Weight of each context turn, oldest first; each step further back multiplies the weight by decay"""
+    return [context_weight * decay ** (turns - 1 - position) for position in range(turns)]
+
+
+def build_query(text: str, context: Iterable[str] = (), context_weight: float = 0.5,
+                decay: float = 1.0) -> Dict[str, float]:
+    """{term: weight} query from a message, with terms from earlier turns (oldest first) down-weighted"""
+    query: Dict[str, float] = {}
+    context = list(context)
+    for context_text, weight in zip(context, context_weights(len(context), context_weight, decay)):
+        for term in bm25_terms(context_text):
+            query[term] = query.get(term, 0.0) + weight
+    for term in bm25_terms(text):
+        query[term] = query.get(term, 0.0) + 1.0
+    return query
@@ -0,0 +1,168 @@
+"""
+Offset-indexed access to large JSONL conversation corpora
+
+A ConversationCorpus never holds the conversations in memory. One pass
+over the JSONL files records the byte offset of every valid conversation;
+the offsets are saved next to each file (<file>.offsets) and memory-mapped
+on later runs, so opening a corpus of millions of conversations costs no
+parsing and almost no heap. Conversations are read by id on demand,
+streamed in order for bulk processing, or sampled (uniformly by id, or
+stratified with one reservoir per stratum in a single streaming pass).
+"""
+
+import bisect
+import json
+import mmap
+import os
+import random
+import struct
+import threading
+from array import array
+from collections.abc import Sequence
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence as SequenceType, Tuple
+
+OFFSETS_MAGIC = b"GFOFFS01"
+# Magic, then the size and mtime of the JSONL file the offsets were built from
+_OFFSETS_HEADER = struct.Struct("<8sQQ")
+
+
+def _parse_conversation(line: bytes) -> Optional[Dict]:
+    """The conversation on a JSONL line, or None; same acceptance rule as DatasetLoader"""
+    if not line.strip():
+        return None
+    try:
+        example = json.loads(line)
+    except ValueError:
+        return None
+    return example if isinstance(example, dict) and 'messages' in example else None
+
+
+def _build_offsets(path: str) -> array:
+    """Byte offset of every valid conversation line, in one streaming pass"""
+    offsets = array('Q')
+    position = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if _parse_conversation(line) is not None:
+                offsets.append(position)
+            position += len(line)
+    return offsets
+
+
+class _FileOffsets:
+    """Conversation offsets of one JSONL file, memory-mapped from its .offsets file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        offsets_path = f"{path}.offsets"
+        stat = os.stat(path)
+        header = _OFFSETS_HEADER.pack(OFFSETS_MAGIC, stat.st_size, stat.st_mtime_ns)
+        if not self._is_current(offsets_path, header):
+            offsets = _build_offsets(path)
+            temp_path = f"{offsets_path}.tmp{os.getpid()}"
+            try:
+                with open(temp_path, 'wb') as f:
+                    f.write(header)
+                    offsets.tofile(f)
+                os.replace(temp_path, offsets_path)
+            except OSError as e:
+                # Read-only location - keep the offsets in memory for this run
+                print(f"⚠️ Could not save conversation offsets for {path}: {e}")
+                self.offsets: SequenceType[int] = offsets
+                return
+        with open(offsets_path, 'rb') as f:
+            if os.path.getsize(offsets_path) == _OFFSETS_HEADER.size:
+                self.offsets = array('Q')
+            else:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.offsets = memoryview(self._mmap)[_OFFSETS_HEADER.size:].cast('Q')
+
+    @staticmethod
+    def _is_current(offsets_path: str, header: bytes) -> bool:
+        try:
+            with open(offsets_path, 'rb') as f:
+                return f.read(_OFFSETS_HEADER.size) == header
+        except OSError:
+            return False
+
+
+class ConversationCorpus(Sequence):
+    """Read-only sequence of conversations from one or more JSONL files, indexed by byte offset"""
+
+    def __init__(self, paths: Iterable[str]):
+        self.files = [_FileOffsets(path) for path in paths]
+        # Id of the first conversation in each file
+        self._file_starts: List[int] = []
+        total = 0
+        for file_offsets in self.files:
+            self._file_starts.append(total)
+            total += len(file_offsets.offsets)
+        self._count = total
+        self._handles: Dict[int, object] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _locate(self, conversation_id: int) -> Tuple[int, int]:
+        """(file number, position within that file's offsets)"""
+        if conversation_id < 0:
+            conversation_id += self._count
+        if not 0 <= conversation_id < self._count:
+            raise IndexError("conversation id out of range")
+        file_number = bisect.bisect_right(self._file_starts, conversation_id) - 1
+        return file_number, conversation_id - self._file_starts[file_number]
+
+    def __getitem__(self, conversation_id: int) -> Dict:
+        """Parse one conversation straight from its file"""
+        file_number, position = self._locate(conversation_id)
+        file_offsets = self.files[file_number]
+        with self._lock:
+            handle = self._handles.get(file_number)
+            if handle is None:
+                handle = self._handles[file_number] = open(file_offsets.path, 'rb')
+            handle.seek(file_offsets.offsets[position])
+            line = handle.readline()
+        return json.loads(line)
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Stream every conversation in order, one line in memory at a time"""
+        for file_offsets in self.files:
+            with open(file_offsets.path, 'rb') as f:
+                for line in f:
+                    conversation = _parse_conversation(line)
+                    if conversation is not None:
+                        yield conversation
+
+    def close(self):
+        with self._lock:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles.clear()
+
+    def sample(self, k: int, seed: Optional[int] = None) -> List[Dict]:
+        """k conversations chosen uniformly at random; only the chosen ones are read"""
+        rng = random.Random(seed)
+        conversation_ids = sorted(rng.sample(range(self._count), min(k, self._count)))
+        return [self[conversation_id] for conversation_id in conversation_ids]
+
+    def stratified_sample(self, per_stratum: int, stratum: Callable[[Dict], str],
+                          seed: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """Up to per_stratum conversations from every stratum, by reservoir sampling in one streaming pass
+
+        Memory holds at most per_stratum conversations per stratum, whatever the corpus size.
+        """
+        rng = random.Random(seed)
+        reservoirs: Dict[str, List[Dict]] = {}
+        seen: Dict[str, int] = {}
+        for conversation in self:
+            key = stratum(conversation)
+            count = seen[key] = seen.get(key, 0) + 1
+            reservoir = reservoirs.setdefault(key, [])
+            if len(reservoir) < per_stratum:
+                reservoir.append(conversation)
+            else:
+                slot = rng.randrange(count)
+                if slot < per_stratum:
+                    reservoir[slot] = conversation
+        return reservoirs
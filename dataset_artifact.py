@@ -0,0 +1,319 @@
+"""
+Compiled, memory-mapped dataset artifact for DatasetLoader
+
+Build with:
+    python dataset_artifact.py build
+
+The artifact holds everything DatasetLoader would otherwise compute at
+startup: the examples (as JSON), their pre-rendered prompt fragments,
+category tags and per-category id lists, energy labels, the BM25
+inverted index and, when scikit-learn is available, the fitted vector
+index (the embedding matrix plus the pickled TF-IDF and SVD models that
+embed queries), so the vector backend does not refit at startup.
+Sections are flat arrays addressed through offset tables, so a worker
+maps the file read-only and reads examples on demand; startup does no
+parsing and the pages are shared by every process mapping the file.
+
+Layout: MAGIC, header length (uint64), JSON header, then the sections,
+each aligned to 8 bytes. The header records the dataset key (see
+dataset_loader.dataset_key) so a stale artifact is ignored.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List, Optional, Sequence as SequenceType, Tuple
+import numpy as np
+from bm25_index import BM25Index
+from dataset_loader import DATASET_ARTIFACT_PATH, DATASET_PATHS, EXAMPLE_CATEGORIES, DatasetLoader, dataset_key
+from vector_index import SKLEARN_AVAILABLE, VectorIndex
+
+MAGIC = b"GFDSET\x00\x01"
+FORMAT_VERSION = 3
+ALIGNMENT = 8
+_LENGTH = struct.Struct("<Q")
+# Parsed examples kept so repeated retrievals return the same dict; older ones are parsed again on access
+PARSED_EXAMPLE_CACHE_SIZE = 1024
+
+
+def _pack_strings(strings: Iterable[str]) -> Tuple[array, bytes]:
+    """(offsets, data) for UTF-8 strings; string i is data[offsets[i]:offsets[i + 1]]"""
+    offsets = array('Q', [0])
+    data = bytearray()
+    for string in strings:
+        data += string.encode('utf-8')
+        offsets.append(len(data))
+    return offsets, bytes(data)
+
+
+def _pack_lists(lists: Iterable[Iterable[int]], typecode: str) -> Tuple[array, array]:
+    """(offsets, values) for integer lists; list i is values[offsets[i]:offsets[i + 1]]"""
+    offsets = array('Q', [0])
+    values = array(typecode)
+    for items in lists:
+        values.extend(items)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def build_artifact(output_path: str = DATASET_ARTIFACT_PATH,
+                   dataset_paths: SequenceType[str] = DATASET_PATHS) -> Dict[str, Any]:
+    """Compile the dataset into an artifact at output_path; returns its header"""
+    loader = DatasetLoader(retrieval_backend="bm25", tags_path=None, artifact_path=None, dataset_paths=dataset_paths)
+    if loader.dataset_path is None:
+        raise FileNotFoundError("No dataset file found")
+    index = loader.index
+    terms = sorted(index.postings)
+    postings = [index.postings[term] for term in terms]
+
+    sections: Dict[str, Any] = {}
+    sections["example_offsets"], sections["example_data"] = _pack_strings(
+        json.dumps(example, ensure_ascii=False) for example in loader.examples)
+    sections["fragment_offsets"], sections["fragment_data"] = _pack_strings(loader.example_fragments)
+    sections["tags"] = array('B', [EXAMPLE_CATEGORIES.index(tag) for tag in loader.example_tags])
+    energy_labels = sorted(set(loader.example_energy))
+    sections["energy"] = array('B', [energy_labels.index(label) for label in loader.example_energy])
+    sections["category_offsets"], sections["category_ids"] = _pack_lists(
+        (loader.category_ids[category] for category in EXAMPLE_CATEGORIES), 'I')
+    sections["term_offsets"], sections["term_data"] = _pack_strings(terms)
+    sections["posting_offsets"], sections["posting_ids"] = _pack_lists(
+        ([document_id for document_id, _ in term_postings] for term_postings in postings), 'I')
+    sections["posting_weights"] = array('f', [weight for term_postings in postings for _, weight in term_postings])
+    sections["skipped_terms"] = array('B', [term in index.skipped_terms for term in terms])
+    vector_dimensions = None
+    if SKLEARN_AVAILABLE and loader.examples:
+        vector_index = VectorIndex(loader._example_texts())
+        vector_dimensions = vector_index.matrix.shape[1]
+        sections["vector_matrix"] = array('f', vector_index.matrix.tobytes())
+        sections["vector_model"] = pickle.dumps({"vectorizer": vector_index.vectorizer, "svd": vector_index.svd})
+
+    layout: Dict[str, List] = {}
+    position = 0
+    for name, section in sections.items():
+        data = section.tobytes() if isinstance(section, array) else section
+        sections[name] = data
+        layout[name] = [position, len(data), section.typecode if isinstance(section, array) else 'B']
+        position += len(data) + (-len(data) % ALIGNMENT)
+    header = {
+        "format": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "key": dataset_key(loader.dataset_path),
+        "count": len(loader.examples),
+        "document_count": index.document_count,
+        "categories": list(EXAMPLE_CATEGORIES),
+        "energy_labels": energy_labels,
+        "vector_dimensions": vector_dimensions,
+        "sections": layout,
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b" " * (-(len(MAGIC) + _LENGTH.size + len(header_bytes)) % ALIGNMENT)
+
+    # Write next to the target and rename, so workers that already mapped the old file keep a valid view
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    temp_path = f"{output_path}.tmp{os.getpid()}"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC + _LENGTH.pack(len(header_bytes)) + header_bytes)
+        for name, data in sections.items():
+            f.write(data + b"\0" * (-len(data) % ALIGNMENT))
+    os.replace(temp_path, output_path)
+    return header
+
+
+def _read_header(f) -> Tuple[Dict[str, Any], int]:
+    """(header, offset of the first section)"""
+    prefix = f.read(len(MAGIC) + _LENGTH.size)
+    if len(prefix) < len(MAGIC) + _LENGTH.size or prefix[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a dataset artifact")
+    (header_length,) = _LENGTH.unpack(prefix[len(MAGIC):])
+    header = json.loads(f.read(header_length).decode('utf-8'))
+    if header.get("format") != FORMAT_VERSION or header.get("byteorder") != sys.byteorder:
+        raise ValueError(f"unsupported artifact format {header.get('format')} ({header.get('byteorder')})")
+    return header, len(prefix) + header_length
+
+
+def read_artifact_key(path: str) -> Optional[Dict[str, Any]]:
+    """Dataset key an artifact was built from, without mapping it; None if it cannot be read"""
+    try:
+        with open(path, 'rb') as f:
+            return _read_header(f)[0].get("key")
+    except (OSError, ValueError):
+        return None
+
+
+class MappedStrings(Sequence):
+    """Read-only sequence of strings decoded from an offsets table on access"""
+
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _raw(self, index: int) -> bytes:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("index out of range")
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]])
+
+    def __getitem__(self, index: int) -> str:
+        return self._raw(index).decode('utf-8')
+
+
+class MappedExamples(MappedStrings):
+    """Examples parsed on access; the most recently used ones are kept, so their identity is stable while cached"""
+
+    def __init__(self, offsets: memoryview, data: memoryview, cache_size: int = PARSED_EXAMPLE_CACHE_SIZE):
+        super().__init__(offsets, data)
+        self.cache_size = cache_size
+        self._parsed: "OrderedDict[int, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # id() of each cached example -> its index, for DatasetLoader.format_examples_for_prompt
+        self.example_ids: Dict[int, int] = {}
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        with self._lock:
+            example = self._parsed.get(index)
+            if example is not None:
+                self._parsed.move_to_end(index)
+                return example
+        example = json.loads(self._raw(index))
+        with self._lock:
+            # Another thread may have parsed it meanwhile; keep the first copy
+            example = self._parsed.setdefault(index, example)
+            self.example_ids[id(example)] = index
+            while len(self._parsed) > self.cache_size:
+                _, evicted = self._parsed.popitem(last=False)
+                # Evicted examples are formatted from scratch; the id may be reused once they are freed
+                del self.example_ids[id(evicted)]
+        return example
+
+
+class MappedTags(Sequence):
+    """Category name (or energy label) of each example, from one byte per example"""
+
+    def __init__(self, codes: memoryview, categories: List[str]):
+        self._codes = codes
+        self._categories = categories
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, index: int) -> str:
+        return self._categories[self._codes[index]]
+
+
+class MappedBM25Index(BM25Index):
+    """BM25Index whose vocabulary and postings are read from the artifact"""
+
+    def __init__(self, document_count: int, term_offsets: memoryview, term_data: memoryview,
+                 posting_offsets: memoryview, posting_ids: memoryview, posting_weights: memoryview,
+                 skipped_terms: memoryview):
+        self.document_count = document_count
+        self.terms = MappedStrings(term_offsets, term_data)
+        self._term_offsets = term_offsets
+        self._term_data = term_data
+        self._posting_offsets = posting_offsets
+        self._posting_ids = posting_ids
+        self._posting_weights = posting_weights
+        self._skipped = skipped_terms
+
+    def _term_id(self, term: str) -> int:
+        """Binary search of the sorted vocabulary (UTF-8 byte order matches str order); -1 if absent"""
+        encoded = term.encode('utf-8')
+        low, high = 0, len(self.terms)
+        while low < high:
+            middle = (low + high) // 2
+            candidate = bytes(self._term_data[self._term_offsets[middle]:self._term_offsets[middle + 1]])
+            if candidate == encoded:
+                return middle
+            if candidate < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        return -1
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        term_id = self._term_id(term)
+        if term_id < 0 or self._skipped[term_id]:
+            return None
+        start, end = self._posting_offsets[term_id], self._posting_offsets[term_id + 1]
+        # Array views straight onto the mapped pages
+        return np.asarray(self._posting_ids[start:end]), np.asarray(self._posting_weights[start:end])
+
+
+class DatasetArtifact:
+    """Read-only memory map of a compiled dataset artifact"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            header, data_start = _read_header(f)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self.key: Dict[str, Any] = header["key"]
+        buffer = memoryview(self._mmap)
+        views = {
+            name: buffer[data_start + offset:data_start + offset + length].cast(typecode)
+            for name, (offset, length, typecode) in header["sections"].items()
+        }
+
+        self.examples = MappedExamples(views["example_offsets"], views["example_data"])
+        self.fragments = MappedStrings(views["fragment_offsets"], views["fragment_data"])
+        self.tags = MappedTags(views["tags"], header["categories"])
+        self.energy = MappedTags(views["energy"], header["energy_labels"])
+        category_offsets = views["category_offsets"]
+        self.category_ids: Dict[str, memoryview] = {
+            category: views["category_ids"][category_offsets[position]:category_offsets[position + 1]]
+            for position, category in enumerate(header["categories"])
+        }
+        self.index = MappedBM25Index(header["document_count"], views["term_offsets"], views["term_data"],
+                                     views["posting_offsets"], views["posting_ids"], views["posting_weights"],
+                                     views["skipped_terms"])
+        self._vector_dimensions: Optional[int] = header.get("vector_dimensions")
+        self._vector_views = (views.get("vector_matrix"), views.get("vector_model"))
+
+    def load_vector_index(self) -> Optional[VectorIndex]:
+        """The fitted vector index stored at build time, or None if the artifact has none or it cannot be loaded"""
+        matrix_view, model_view = self._vector_views
+        if not self._vector_dimensions or matrix_view is None or model_view is None:
+            return None
+        try:
+            model = pickle.loads(model_view)
+        except (pickle.UnpicklingError, AttributeError, ImportError) as e:
+            print(f"⚠️ Could not load the artifact's vector index: {e}")
+            return None
+        # The embedding matrix stays on the mapped pages
+        matrix = np.asarray(matrix_view).reshape(-1, self._vector_dimensions)
+        return VectorIndex.from_parts(model["vectorizer"], model["svd"], matrix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled dataset artifact")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Compile the JSONL dataset into a memory-mappable artifact")
+    build_parser.add_argument("--output", default=DATASET_ARTIFACT_PATH)
+    build_parser.add_argument("--dataset", action="append", help="Dataset JSONL (default: the clean dataset, else the raw one)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        header = build_artifact(args.output, args.dataset or DATASET_PATHS)
+        elapsed = time.perf_counter() - start
+        print(f"Compiled {header['count']} examples from {header['key']['dataset']} "
+              f"into {args.output} ({os.path.getsize(args.output):,} bytes, {elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,51 +2,228 @@
 Simple DatasetLoader for loading examples from girlfriend dataset files
 """
 
+import hashlib
 import json
+import os
 import random
-from typing import List, Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+from bm25_index import BM25Index, build_query
+from energy_types import EnergySignature
+from keyword_engine import keyword_engine
+
+# Context turns count for less than the message being answered, and less the further back they are
+CONTEXT_TERM_WEIGHT = 0.5
+CONTEXT_DECAY = 0.6
+# Earlier turns used for retrieval
+CONTEXT_TURNS = 4
+# Candidates ranked by relevance per example asked for, before preferring ones with the user's energy
+ENERGY_CANDIDATE_FACTOR = 4
+# "bm25" (inverted index) or "vector" (dense TF-IDF/SVD matrix with diversity re-ranking)
+RETRIEVAL_BACKEND = os.getenv("FEW_SHOT_RETRIEVAL", "bm25")
+# Cap on examples loaded from a large corpus; a seeded random sample is read through the offset index
+MAX_EXAMPLES = int(os.getenv("FEW_SHOT_MAX_EXAMPLES", "0")) or None
+SAMPLE_SEED = 0
+
+# Example category -> lexicon categories that tag it; the first match wins, untagged examples are casual
+EXAMPLE_CATEGORY_LEXICONS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("crisis", ("prompt_crisis",)),
+    ("intimate", ("prompt_explicit", "explicit_trigger", "example_intimate")),
+    ("teasing", ("teasing",)),
+    ("emotional", ("example_emotional", "emotional")),
+)
+EXAMPLE_CATEGORIES = tuple(category for category, _ in EXAMPLE_CATEGORY_LEXICONS) + ("casual",)
+# Lexicons of the rule-based energy analysis that labels each example's user turns
+ENERGY_LABEL_LEXICONS = ("rule_sexual", "rule_greeting", "rule_crisis", "rule_intimate")
+# Dataset files are found next to this module, not in the current working directory
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+# Output of `python dataset_pipeline.py build` (repaired and deduplicated), preferred when present
+BUILT_DATASET_PATH = os.path.join(DATASET_DIR, "models", "girlfriend_dataset.jsonl")
+DATASET_PATHS = [BUILT_DATASET_PATH,
+                 os.path.join(DATASET_DIR, "girlfriend_dataset_clean.jsonl"),
+                 os.path.join(DATASET_DIR, "girlfriend_dataset.jsonl")]
+EXAMPLE_TAGS_PATH = os.path.join(DATASET_DIR, "models", "example_tags.json")
+# Compiled by `python dataset_artifact.py build`; used instead of the JSONL while it is current
+DATASET_ARTIFACT_PATH = os.path.join(DATASET_DIR, "models", "dataset.bin")
+# Formatted example blocks kept for recently retrieved example combinations
+FRAGMENT_CACHE_SIZE = 256
+
+
+def dataset_key(dataset_path: str) -> Dict[str, Any]:
+    """What derived data (tags, compiled artifact) depends on: the dataset file and the labelling lexicons"""
+    stat = os.stat(dataset_path)
+    names = [name for _, category_names in EXAMPLE_CATEGORY_LEXICONS for name in category_names]
+    lexicons = {name: keyword_engine.lexicons.get(name, []) for name in names + list(ENERGY_LABEL_LEXICONS)}
+    return {
+        "dataset": os.path.abspath(dataset_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "lexicons": hashlib.sha1(json.dumps(lexicons, sort_keys=True).encode('utf-8')).hexdigest(),
+    }
+
+
+def energy_key(energy: EnergySignature) -> str:
+    """Label an example's energy is stored under"""
+    return f"{energy.energy_type.value}:{energy.dominant_emotion.value}"
 
 
 class DatasetLoader:
     """Simple dataset loader for girlfriend conversation examples"""
     
-    def __init__(self):
+    def __init__(self, retrieval_backend: str = RETRIEVAL_BACKEND, tags_path: Optional[str] = EXAMPLE_TAGS_PATH,
+                 artifact_path: Optional[str] = DATASET_ARTIFACT_PATH, dataset_paths: Sequence[str] = DATASET_PATHS,
+                 max_examples: Optional[int] = MAX_EXAMPLES):
         self.examples = []
+        self.dataset_path: Optional[str] = next((path for path in dataset_paths if os.path.exists(path)), None)
+        self.max_examples = max_examples
+        # The artifact holds the whole dataset, so it is not used for a sample
+        self.artifact = self._open_artifact(artifact_path) if not max_examples else None
+        self._fragment_cache: "OrderedDict[Tuple[int, ...], str]" = OrderedDict()
+        self._fragment_cache_lock = threading.Lock()
+        self.vector_index = None
+        self.index: Optional[BM25Index] = None
+        
+        if self.artifact is not None:
+            self._use_artifact(retrieval_backend)
+        else:
+            self._load_and_index(retrieval_backend, tags_path)
+    
+    def _use_artifact(self, retrieval_backend: str):
+        """Serve everything lazily from the read-only memory map, which is shared between processes"""
+        self.examples = self.artifact.examples
+        self._example_ids = self.artifact.examples.example_ids
+        self.example_tags = self.artifact.tags
+        self.example_energy = self.artifact.energy
+        self.category_ids = self.artifact.category_ids
+        self.example_fragments = self.artifact.fragments
+        if retrieval_backend == "vector":
+            self.vector_index = self.artifact.load_vector_index()
+            if self.vector_index is None:
+                # Artifacts built without scikit-learn carry no fitted index; fit one now
+                self.vector_index = self._build_vector_index(self._example_texts())
+        self.index = self.artifact.index if self.vector_index is None else None
+    
+    def _load_and_index(self, retrieval_backend: str, tags_path: Optional[str]):
+        """Parse the JSONL dataset and build tags, fragments and the retrieval index"""
         self._load_dataset()
+        # Retrieval index over each example's text, built once at load time
+        example_texts = self._example_texts()
+        # One category and one "energy_type:dominant_emotion" label per example, and the example ids of each category
+        self.example_tags, self.example_energy = self._load_or_label_examples(example_texts, tags_path)
+        self.category_ids = {category: [] for category in EXAMPLE_CATEGORIES}
+        for example_id, category in enumerate(self.example_tags):
+            self.category_ids[category].append(example_id)
+        # "User:/You:" text of every example, rendered once; examples never change after load
+        self.example_fragments = [self._render_example(example) for example in self.examples]
+        self._example_ids = {id(example): example_id for example_id, example in enumerate(self.examples)}
+        self.vector_index = self._build_vector_index(example_texts) if retrieval_backend == "vector" else None
+        self.index = BM25Index(example_texts) if self.vector_index is None else None
     
-    def _load_dataset(self):
-        """Load dataset from JSONL files"""
+    def _example_texts(self) -> List[str]:
+        return [' '.join(msg.get('content', '') for msg in example.get('messages', []))
+                for example in self.examples]
+    
+    def _open_artifact(self, artifact_path: Optional[str]):
+        """The compiled dataset artifact, if there is one built from the current dataset"""
+        if not artifact_path or not self.dataset_path or not os.path.exists(artifact_path):
+            return None
+        from dataset_artifact import DatasetArtifact, read_artifact_key
+        if read_artifact_key(artifact_path) != dataset_key(self.dataset_path):
+            print(f"⚠️ Dataset artifact {artifact_path} is out of date or unreadable, loading {self.dataset_path} "
+                  f"(rebuild with: python dataset_artifact.py build)")
+            return None
+        try:
+            return DatasetArtifact(artifact_path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not open dataset artifact {artifact_path}: {e}")
+            return None
+    
+    def _build_vector_index(self, example_texts: List[str]):
+        """Dense example matrix, or None (BM25 is used) when it cannot be built"""
+        try:
+            from vector_index import VectorIndex
+            return VectorIndex(example_texts) if example_texts else None
+        except ImportError as e:
+            print(f"⚠️ Vector retrieval unavailable ({e}), using BM25")
+            return None
+    
+    @staticmethod
+    def _tag_example(text: str) -> str:
+        """Example category from the detectors' lexicons"""
+        hits = keyword_engine.scan(text, use_cache=False)
+        for category, lexicon_categories in EXAMPLE_CATEGORY_LEXICONS:
+            if any(hits.has(lexicon_category) for lexicon_category in lexicon_categories):
+                return category
+        return "casual"
+    
+    @staticmethod
+    def _energy_label(example: Dict) -> str:
+        """"energy_type:dominant_emotion" of the example's user turns, from the rule-based energy analysis"""
+        from energy_analyzer import rule_based_energy_analysis
+        text = ' '.join(msg.get('content', '') for msg in example.get('messages', []) if msg.get('role') == 'user')
+        # Scanned without the keyword cache, which is kept for live messages
+        energy = rule_based_energy_analysis(text, keyword_engine.scan(text, use_cache=False))
+        return energy_key(energy)
+    
+    def _load_or_label_examples(self, example_texts: List[str], tags_path: Optional[str]) -> Tuple[List[str], List[str]]:
+        """Tags and energy labels saved by an earlier run for the same dataset and lexicons, otherwise label and save them"""
+        if not self.dataset_path or not tags_path:
+            return ([self._tag_example(text) for text in example_texts],
+                    [self._energy_label(example) for example in self.examples])
+        key = dataset_key(self.dataset_path)
+        if self.max_examples:
+            key["sample"] = [self.max_examples, SAMPLE_SEED]
+        try:
+            with open(tags_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if (saved.get("key") == key and len(saved.get("tags", [])) == len(example_texts)
+                    and len(saved.get("energy", [])) == len(example_texts)):
+                return saved["tags"], saved["energy"]
+        except (OSError, ValueError):
+            pass
+        
+        tags = [self._tag_example(text) for text in example_texts]
+        energy = [self._energy_label(example) for example in self.examples]
         try:
-            # Try loading the clean dataset first
-            with open('girlfriend_dataset_clean.jsonl', 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            example = json.loads(line.strip())
-                            if isinstance(example, dict) and 'messages' in example:
-                                self.examples.append(example)
-                        except json.JSONDecodeError:
-                            continue
-        except FileNotFoundError:
-            # Fallback to regular dataset
+            os.makedirs(os.path.dirname(tags_path) or ".", exist_ok=True)
+            with open(tags_path, 'w', encoding='utf-8') as f:
+                json.dump({"key": key, "tags": tags, "energy": energy}, f)
+        except OSError as e:
+            print(f"⚠️ Could not save example tags: {e}")
+        return tags, energy
+    
+    def _load_dataset(self):
+        """Load dataset from the first JSONL file that exists (the built dataset, then the clean one)"""
+        if self.dataset_path is None:
+            print("Warning: No dataset file found, using empty examples")
+            return
+        if self.max_examples:
+            from conversation_corpus import ConversationCorpus
+            corpus = ConversationCorpus([self.dataset_path])
             try:
-                with open('girlfriend_dataset.jsonl', 'r', encoding='utf-8') as f:
-                    for line in f:
-                        if line.strip():
-                            try:
-                                example = json.loads(line.strip())
-                                if isinstance(example, dict) and 'messages' in example:
-                                    self.examples.append(example)
-                            except json.JSONDecodeError:
-                                continue
-            except FileNotFoundError:
-                print("Warning: No dataset file found, using empty examples")
-                self.examples = []
+                if len(corpus) > self.max_examples:
+                    self.examples = corpus.sample(self.max_examples, seed=SAMPLE_SEED)
+                    return
+            finally:
+                corpus.close()
+        with open(self.dataset_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        example = json.loads(line.strip())
+                        if isinstance(example, dict) and 'messages' in example:
+                            self.examples.append(example)
+                    except json.JSONDecodeError:
+                        continue
     
     def get_examples_by_category(self, category: str, num_examples: int = 3) -> List[Dict]:
-        """Get examples by category"""
-        # Since we don't have category tags, return random examples
-        return self.get_random_examples(num_examples)
+        """Get random examples tagged with a category (casual, emotional, crisis, intimate or teasing)"""
+        example_ids = self.category_ids.get(category)
+        if example_ids is None:
+            # Unknown category - any example will do
+            return self.get_random_examples(num_examples)
+        return [self.examples[example_id] for example_id in random.sample(example_ids, min(num_examples, len(example_ids)))]
     
     def get_random_examples(self, num_examples: int = 3) -> List[Dict]:
         """Get random examples from dataset"""
@@ -55,64 +232,75 @@ class DatasetLoader:
         
         return random.sample(self.examples, min(num_examples, len(self.examples)))
     
-    def get_relevant_examples(self, user_message: str, num_examples: int = 3) -> List[Dict]:
-        """Get examples relevant to user message"""
-        # Simple keyword matching - could be improved
-        user_lower = user_message.lower()
-        
-        # Keywords for different types of conversations
-        sexual_keywords = ['horny', 'sexy', 'touch', 'kiss', 'love', 'need', 'want', 'feel']
-        emotional_keywords = ['sad', 'lonely', 'miss', 'hurt', 'upset', 'worried']
-        casual_keywords = ['hey', 'hi', 'what', 'how', 'doing', 'up', 'sup']
-        
-        relevant_examples = []
-        
-        # Try to find examples that match message content
-        for example in self.examples:
-            example_text = ' '.join([msg.get('content', '') for msg in example.get('messages', [])]).lower()
-            
-            if len(relevant_examples) >= num_examples:
-                break
-                
-            # Check for keyword matches
-            if any(word in user_lower for word in sexual_keywords) and any(word in example_text for word in sexual_keywords):
-                relevant_examples.append(example)
-            elif any(word in user_lower for word in emotional_keywords) and any(word in example_text for word in emotional_keywords):
-                relevant_examples.append(example)
-            elif any(word in user_lower for word in casual_keywords) and any(word in example_text for word in casual_keywords):
-                relevant_examples.append(example)
+    def get_relevant_examples(self, user_message: str, num_examples: int = 3,
+                              context: Iterable[str] = (), energy: Optional[EnergySignature] = None) -> List[Dict]:
+        """Get examples relevant to user message and recent turns (oldest first), preferring the user's energy"""
+        context = list(context)[-CONTEXT_TURNS:]
+        fetch = num_examples * ENERGY_CANDIDATE_FACTOR if energy is not None else num_examples
+        if self.vector_index is not None:
+            query = self.vector_index.query_vector(user_message, context, CONTEXT_TERM_WEIGHT, CONTEXT_DECAY)
+            ranked = self.vector_index.top_k(query, fetch)
+        else:
+            ranked = self.index.top_k(build_query(user_message, context, CONTEXT_TERM_WEIGHT, CONTEXT_DECAY), fetch)
+        example_ids = [example_id for example_id, _ in ranked]
+        if energy is not None:
+            example_ids = self._prefer_energy(example_ids, energy)
         
         # If not enough relevant examples found, add random ones
-        if len(relevant_examples) < num_examples:
-            remaining_needed = num_examples - len(relevant_examples)
-            random_examples = self.get_random_examples(remaining_needed)
-            relevant_examples.extend(random_examples)
+        if len(example_ids) < num_examples:
+            chosen = set(example_ids)
+            candidates = random.sample(range(len(self.examples)), min(num_examples, len(self.examples)))
+            example_ids.extend(example_id for example_id in candidates if example_id not in chosen)
         
-        return relevant_examples[:num_examples]
+        return [self.examples[example_id] for example_id in example_ids[:num_examples]]
+    
+    def _prefer_energy(self, example_ids: List[int], energy: EnergySignature) -> List[int]:
+        """Relevance-ranked ids filtered by energy: examples matching both energy type and emotion first,
+        then those matching one, then the rest, each group keeping its relevance order"""
+        energy_type, emotion = energy.energy_type.value, energy.dominant_emotion.value
+        def matches(example_id: int) -> int:
+            label_type, _, label_emotion = self.example_energy[example_id].partition(':')
+            return (label_type == energy_type) + (label_emotion == emotion)
+        return sorted(example_ids, key=matches, reverse=True)
+    
+    @staticmethod
+    def _render_example(example: Dict) -> str:
+        """One example as "User:/You:" lines, or an empty string if it has no usable turns"""
+        conversation_parts = []
+        for msg in example.get('messages', []):
+            role = msg.get('role', '')
+            content = msg.get('content', '')
+            
+            if role == 'user':
+                conversation_parts.append(f"User: {content}")
+            elif role == 'assistant':
+                conversation_parts.append(f"You: {content}")
+        return '\n'.join(conversation_parts)
+    
+    @staticmethod
+    def _join_fragments(fragments: Iterable[str]) -> str:
+        formatted_examples = [fragment for fragment in fragments if fragment]
+        return "\n\n".join(formatted_examples) if formatted_examples else "No examples available."
     
     def format_examples_for_prompt(self, examples: List[Dict]) -> str:
         """Format examples for use in prompts"""
         if not examples:
             return "No previous examples available."
         
-        formatted_examples = []
+        example_ids = tuple(self._example_ids.get(id(example), -1) for example in examples)
+        if -1 in example_ids:
+            # Not one of the loaded examples - nothing pre-rendered to reuse
+            return self._join_fragments(self._render_example(example) for example in examples)
         
-        for example in examples:
-            messages = example.get('messages', [])
-            if not messages:
-                continue
-                
-            conversation_parts = []
-            for msg in messages:
-                role = msg.get('role', '')
-                content = msg.get('content', '')
-                
-                if role == 'user':
-                    conversation_parts.append(f"User: {content}")
-                elif role == 'assistant':
-                    conversation_parts.append(f"You: {content}")
-            
-            if conversation_parts:
-                formatted_examples.append('\n'.join(conversation_parts))
+        with self._fragment_cache_lock:
+            formatted = self._fragment_cache.get(example_ids)
+            if formatted is not None:
+                self._fragment_cache.move_to_end(example_ids)
+                return formatted
         
-        return "\n\n".join(formatted_examples) if formatted_examples else "No examples available."
+        formatted = self._join_fragments(self.example_fragments[example_id] for example_id in example_ids)
+        with self._fragment_cache_lock:
+            self._fragment_cache[example_ids] = formatted
+            if len(self._fragment_cache) > FRAGMENT_CACHE_SIZE:
+                self._fragment_cache.popitem(last=False)
+        return formatted
@@ -0,0 +1,213 @@
+"""
+Offline build pipeline for the few-shot conversation dataset
+
+Run with:
+    python dataset_pipeline.py build
+
+Reads the raw dataset files, then
+  1. validates the messages schema (user/assistant turns with text),
+  2. repairs mojibake (UTF-8 decoded as Windows-1252, e.g. "ðŸ˜˜" -> "😘")
+     and normalizes Unicode and whitespace,
+  3. drops exact duplicates,
+  4. collapses near-duplicates found with MinHash over word shingles,
+     keeping the first conversation of each cluster in input order,
+and writes the cleaned JSONL (which DatasetLoader then prefers) plus the
+compiled retrieval artifact built from it.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from dataset_loader import BUILT_DATASET_PATH, DATASET_ARTIFACT_PATH, DATASET_DIR
+from emoji_utils import strip_emoji
+
+RAW_DATASET_PATHS = [os.path.join(DATASET_DIR, "girlfriend_dataset.jsonl"),
+                     os.path.join(DATASET_DIR, "girlfriend_dataset_clean.jsonl")]
+ROLES = ("user", "assistant")
+
+# Characters that show up when UTF-8 bytes are decoded as Windows-1252
+MOJIBAKE_MARKERS = re.compile("[ÃÂâð][\u0080-¿Œ-Ÿˆ-˜–-›€™]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_JACCARD = 0.8
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def _cp1252_bytes(text: str) -> Optional[bytes]:
+    """The bytes a Windows-1252 decode would have turned into text, or None if it could not have"""
+    encoded = bytearray()
+    for char in text:
+        try:
+            encoded += char.encode('cp1252')
+        except UnicodeEncodeError:
+            # Bytes undefined in cp1252 (0x81, 0x8d, ...) pass through as the same code point
+            if ord(char) > 0xFF:
+                return None
+            encoded.append(ord(char))
+    return bytes(encoded)
+
+
+def repair_text(text: str) -> Tuple[str, bool]:
+    """(text with mojibake undone and whitespace normalized, whether mojibake was repaired)"""
+    repaired = False
+    # Double-encoded text needs a second round
+    for _ in range(2):
+        if not MOJIBAKE_MARKERS.search(text):
+            break
+        raw = _cp1252_bytes(text)
+        try:
+            fixed = raw.decode('utf-8') if raw is not None else None
+        except UnicodeDecodeError:
+            fixed = None
+        if fixed is None:
+            break
+        text, repaired = fixed, True
+    text = unicodedata.normalize('NFC', text)
+    return WHITESPACE_PATTERN.sub(' ', text).strip(), repaired
+
+
+def validate(example: Any) -> Optional[str]:
+    """Why an example does not fit the messages schema, or None if it does"""
+    if not isinstance(example, dict) or not isinstance(example.get('messages'), list):
+        return "no messages list"
+    roles = set()
+    for msg in example['messages']:
+        if not isinstance(msg, dict) or msg.get('role') not in ROLES:
+            return "unknown role"
+        if not isinstance(msg.get('content'), str) or not msg['content'].strip():
+            return "empty content"
+        roles.add(msg['role'])
+    if roles != set(ROLES):
+        return "needs user and assistant turns"
+    return None
+
+
+def _shingles(example: Dict) -> Set[str]:
+    """Word shingles of the conversation, ignoring case, emoji and punctuation"""
+    words = re.findall(r"[a-z0-9']+", strip_emoji(' '.join(msg['content'] for msg in example['messages'])).lower())
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _minhash_signatures(shingle_sets: List[Set[str]], seed: int = 1) -> np.ndarray:
+    """(conversations x permutations) MinHash signatures from stable CRC32 shingle hashes"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+    signatures = np.empty((len(shingle_sets), MINHASH_PERMUTATIONS), dtype=np.uint64)
+    for row, shingles in enumerate(shingle_sets):
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        signatures[row] = ((hashes[:, np.newaxis] * a + b) % _MERSENNE_PRIME).min(axis=0)
+    return signatures
+
+
+def near_duplicates(examples: List[Dict]) -> Dict[int, int]:
+    """Index of each near-duplicate -> index of the earlier conversation it duplicates"""
+    shingle_sets = [_shingles(example) for example in examples]
+    signatures = _minhash_signatures(shingle_sets)
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    # LSH: conversations sharing any band of their signature are candidate pairs
+    candidates: Set[Tuple[int, int]] = set()
+    for band in range(LSH_BANDS):
+        buckets: Dict[bytes, List[int]] = {}
+        for index, signature in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets.setdefault(signature.tobytes(), []).append(index)
+        for members in buckets.values():
+            candidates.update((first, other) for i, first in enumerate(members) for other in members[i + 1:])
+
+    duplicate_of: Dict[int, int] = {}
+    for first, other in sorted(candidates):
+        if other in duplicate_of or first in duplicate_of:
+            continue
+        union = len(shingle_sets[first] | shingle_sets[other])
+        if union and len(shingle_sets[first] & shingle_sets[other]) / union >= NEAR_DUPLICATE_JACCARD:
+            duplicate_of[other] = first
+    return duplicate_of
+
+
+def _read_jsonl(paths: Iterable[str]) -> Iterable[Tuple[str, Any]]:
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield path, json.loads(line)
+                    except json.JSONDecodeError:
+                        yield path, None
+
+
+def clean_dataset(paths: Sequence[str]) -> Tuple[List[Dict], Counter]:
+    """Cleaned, deduplicated conversations and counts of what each step did"""
+    stats: Counter = Counter()
+    examples: List[Dict] = []
+    seen: Set[str] = set()
+    for path, example in _read_jsonl(paths):
+        stats["read"] += 1
+        problem = validate(example) if example is not None else "invalid json"
+        if problem:
+            stats[f"rejected: {problem}"] += 1
+            continue
+        messages = []
+        for msg in example['messages']:
+            content, repaired = repair_text(msg['content'])
+            stats["mojibake repaired"] += repaired
+            messages.append({"role": msg['role'], "content": content})
+        cleaned = {"messages": messages}
+        key = json.dumps(cleaned, sort_keys=True, ensure_ascii=False)
+        if key in seen:
+            stats["exact duplicates"] += 1
+            continue
+        seen.add(key)
+        examples.append(cleaned)
+
+    duplicate_of = near_duplicates(examples)
+    stats["near duplicates"] = len(duplicate_of)
+    examples = [example for index, example in enumerate(examples) if index not in duplicate_of]
+    stats["written"] = len(examples)
+    return examples, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset build pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Clean and deduplicate the dataset, then compile the artifact")
+    build_parser.add_argument("--input", action="append", help="Raw dataset JSONL (default: both bundled files)")
+    build_parser.add_argument("--output", default=BUILT_DATASET_PATH)
+    build_parser.add_argument("--artifact", default=DATASET_ARTIFACT_PATH)
+    build_parser.add_argument("--no-artifact", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        examples, stats = clean_dataset(args.input or RAW_DATASET_PATHS)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        temp_path = f"{args.output}.tmp{os.getpid()}"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for example in examples:
+                f.write(json.dumps(example, ensure_ascii=False) + "\n")
+        os.replace(temp_path, args.output)
+        for name, count in sorted(stats.items()):
+            print(f"  {name}: {count}")
+        print(f"Wrote {len(examples)} conversations to {args.output} ({time.perf_counter() - start:.2f}s)")
+
+        if not args.no_artifact:
+            from dataset_artifact import build_artifact
+            header = build_artifact(args.artifact, [args.output])
+            print(f"Compiled {header['count']} examples into {args.artifact}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Emoji detection and stripping shared by message analysis and splitting
+
+Emojis are recognized from a precomputed table of code-point ranges
+searched with bisect, then grown into full clusters: skin tones, variation
+selectors, keycaps, tag sequences (subdivision flags) and ZWJ sequences
+like 👩‍❤️‍👨 stay in one piece. Every function is a single left-to-right
+pass over the text.
+"""
+
+from bisect import bisect_right
+from typing import List, Tuple
+
+# Code points that start an emoji, as sorted, non-overlapping (first, last) ranges
+EMOJI_RANGES: Tuple[Tuple[int, int], ...] = (
+    (0x00A9, 0x00A9), (0x00AE, 0x00AE),    # © ®
+    (0x203C, 0x203C), (0x2049, 0x2049),    # ‼ ⁉
+    (0x2122, 0x2122), (0x2139, 0x2139),    # ™ ℹ
+    (0x2194, 0x2199), (0x21A9, 0x21AA),    # arrows
+    (0x231A, 0x231B), (0x2328, 0x2328), (0x23CF, 0x23CF),    # ⌚ ⌛ ⌨ ⏏
+    (0x23E9, 0x23F3), (0x23F8, 0x23FA),    # ⏩ ⏰ ⏸
+    (0x24C2, 0x24C2),
+    (0x25AA, 0x25AB), (0x25B6, 0x25B6), (0x25C0, 0x25C0), (0x25FB, 0x25FE),
+    (0x2600, 0x27BF),                      # misc symbols and dingbats ☀ ❤ ✨
+    (0x2934, 0x2935),
+    (0x2B05, 0x2B07), (0x2B1B, 0x2B1C), (0x2B50, 0x2B50), (0x2B55, 0x2B55),
+    (0x3030, 0x3030), (0x303D, 0x303D), (0x3297, 0x3297), (0x3299, 0x3299),
+    (0x1F000, 0x1FAFF),                    # pictographs, emoticons, flags, symbols ext-A
+)
+_RANGE_FIRSTS = [first for first, _ in EMOJI_RANGES]
+_RANGE_LASTS = [last for _, last in EMOJI_RANGES]
+_FIRST_EMOJI = EMOJI_RANGES[0][0]
+
+ZWJ = "\u200d"
+VARIATION_SELECTORS = frozenset("\ufe0e\ufe0f")  # text and emoji presentation
+KEYCAP = "\u20e3"
+KEYCAP_BASES = frozenset("0123456789#*")
+SKIN_TONES = (0x1F3FB, 0x1F3FF)
+TAGS = (0xE0020, 0xE007F)
+
+
+def is_emoji_char(char: str) -> bool:
+    """True if the character can start an emoji"""
+    code = ord(char)
+    if code < _FIRST_EMOJI:
+        return False
+    index = bisect_right(_RANGE_FIRSTS, code) - 1
+    return index >= 0 and code <= _RANGE_LASTS[index]
+
+
+def _is_modifier(char: str) -> bool:
+    """Characters that attach to the preceding emoji"""
+    code = ord(char)
+    return (char in VARIATION_SELECTORS or char == KEYCAP
+            or SKIN_TONES[0] <= code <= SKIN_TONES[1] or TAGS[0] <= code <= TAGS[1])
+
+
+def _cluster_end(text: str, start: int) -> int:
+    """End of the emoji cluster starting at start, or start if there is none"""
+    length = len(text)
+    char = text[start]
+    if char in KEYCAP_BASES:
+        # "1️⃣" - a digit is only an emoji as part of a keycap sequence
+        end = start + 1
+        if end < length and text[end] == "\ufe0f":
+            end += 1
+        if end < length and text[end] == KEYCAP:
+            return end + 1
+        return start
+    if not is_emoji_char(char):
+        return start
+
+    end = start + 1
+    while end < length:
+        if _is_modifier(text[end]):
+            end += 1
+        elif text[end] == ZWJ and end + 1 < length and is_emoji_char(text[end + 1]):
+            end += 2
+        else:
+            break
+    return end
+
+
+def emoji_runs(text: str) -> List[Tuple[int, int]]:
+    """(start, end) spans of consecutive emoji clusters"""
+    runs = []
+    index, length = 0, len(text)
+    while index < length:
+        end = _cluster_end(text, index)
+        if end == index:
+            index += 1
+            continue
+        if runs and runs[-1][1] == index:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((index, end))
+        index = end
+    return runs
+
+
+def split_emoji_runs(text: str) -> List[Tuple[str, bool]]:
+    """Split text into (segment, is_emoji) pieces that join back to the original text"""
+    segments = []
+    position = 0
+    for start, end in emoji_runs(text):
+        if start > position:
+            segments.append((text[position:start], False))
+        segments.append((text[start:end], True))
+        position = end
+    if position < len(text):
+        segments.append((text[position:], False))
+    return segments
+
+
+def strip_emoji(text: str) -> str:
+    """Text with every emoji cluster removed (whitespace around them is left as is)"""
+    return "".join(segment for segment, is_emoji in split_emoji_runs(text) if not is_emoji)
+
+
+def is_emoji_only(text: str) -> bool:
+    """True if the text has at least one emoji and no letters or digits outside them ("😘!!", "🔥 🔥")"""
+    runs = emoji_runs(text)
+    if not runs:
+        return False
+    position = 0
+    for start, end in runs + [(len(text), len(text))]:
+        if any(char.isalnum() or char == "_" for char in text[position:start]):
+            return False
+        position = end
+    return True
@@ -2,39 +2,62 @@
 LLM-powered energy analysis agent
 """
 
-import json
 import time
 import os
-from mistralai import Mistral
-from typing import List
+from typing import List, Optional
 from dotenv import load_dotenv
 from energy_types import EnergySignature, EnergyLevel, EnergyType, EmotionState, NervousSystemState
+from llm_json_parser import json_parser, JSON_RESPONSE_FORMAT
+from usage_tracker import record_completion_usage, apply_session_budget
+from model_selector import model_selector
+from local_energy_classifier import log_llm_label, cascade_stats
+from keyword_engine import KeywordHits, scan_keywords
+from shared_resources import SharedResources, shared_resources
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Messages hitting these lexicons always go to the LLM, however confident the local classifier is
+ALWAYS_ESCALATE_LEXICONS = ("crisis", "distress")
+
 class LLMEnergyAnalyzer:
     """LLM-powered energy analysis instead of rule-based"""
 
-    def __init__(self):
-        mistral_api_key = os.getenv("MISTRAL_API_KEY")
-        if not mistral_api_key:
-            raise ValueError("MISTRAL_API_KEY environment variable is required")
-        
-        self.client = Mistral(api_key=mistral_api_key)
+    def __init__(self, resources: Optional[SharedResources] = None):
+        resources = resources or shared_resources
+        self.client = resources.mistral_client
         # Use faster, lighter models for energy analysis
         self.model_options = ["open-mistral-7b", "mistral-small-latest", "mistral-medium-latest"]
-        self.current_model_index = 0
-        self.model_name = self.model_options[0]
+        self.model_controller = model_selector.controller("energy_analysis", self.model_options)
+        
+        # Local classifier answers confident cases before escalating to the LLM
+        self.local_classifier = resources.local_classifier
+        self.local_threshold = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.85"))
+        # Logging user messages for classifier training is opt-in
+        self.log_labels = os.getenv("LOG_ENERGY_LABELS", "false").lower() == "true"
         
         self.generation_config = {
             "max_tokens": 300,
             "temperature": 0.3,
             "top_p": 0.8,
+            "response_format": JSON_RESPONSE_FORMAT,
         }
 
-    async def analyze_message_energy(self, message: str, context: List[str] = None) -> EnergySignature:
-        """Analyze energy using Gemini"""
+    async def analyze_message_energy(self, message: str, context: List[str] = None,
+                                     role: str = "user", use_fallback: bool = True) -> Optional[EnergySignature]:
+        """Analyze energy using Gemini; with use_fallback=False a failed analysis returns None
+        instead of the rule-based signature"""
+        
+        if self.local_classifier is not None:
+            hits = scan_keywords(message)
+            if any(hits.has(category) for category in ALWAYS_ESCALATE_LEXICONS):
+                confident = False
+            else:
+                local_signature = self.local_classifier.predict(message)
+                confident = local_signature is not None and local_signature.confidence >= self.local_threshold
+            cascade_stats.record(confident)
+            if confident:
+                return local_signature
         
         context_str = "\n".join(context[-3:]) if context else "No previous context"
         
@@ -69,10 +92,15 @@ Respond with a JSON object containing:
     "reasoning": "Brief explanation of analysis"
 }}"""
 
+        # Let the SLO controller move the stage's tier before trying models in order
+        tier = self.model_controller.select_index()
+
         # Try different models if one fails
         for attempt in range(len(self.model_options)):
+            current_model = self.model_options[(tier + attempt) % len(self.model_options)]
+            call_start = time.time()
             try:
-                current_model = self.model_options[(self.current_model_index + attempt) % len(self.model_options)]
+                current_model = apply_session_budget(self.model_options, current_model)
                 
                 messages = [{"role": "user", "content": prompt}]
                 response = self.client.chat.complete(
@@ -80,131 +108,110 @@ Respond with a JSON object containing:
                     messages=messages,
                     **self.generation_config
                 )
+                latency = time.time() - call_start
+                record_completion_usage("energy_analysis", current_model, response)
                 
                 if response.choices and response.choices[0].message:
                     response_text = response.choices[0].message.content.strip()
                     
                     # Update current model if this one worked and it's different
                     if attempt > 0:
-                        self.current_model_index = (self.current_model_index + attempt) % len(self.model_options)
-                        self.model_name = current_model
+                        self.model_controller.fail_over((tier + attempt) % len(self.model_options))
                     break
                 else:
                     print(f"⚠️ No response from {current_model}")
+                    self.model_controller.record(current_model, latency, fallback=True)
                     
             except Exception as e:
                 print(f"⚠️ Mistral Energy Analysis Error with {current_model}: {e}")
+                self.model_controller.record(current_model, time.time() - call_start, error=True)
                 if "capacity exceeded" in str(e).lower() or "3505" in str(e):
                     print(f"🔄 Energy model {current_model} capacity exceeded, trying next...")
                     continue
                 else:
                     # For other errors, fall back immediately
-                    return self._rule_based_energy_analysis(message)
+                    return self._rule_based_energy_analysis(message) if use_fallback else None
         else:
             # If all models failed
             print("⚠️ All Mistral energy models failed, using rule-based fallback")
-            return self._rule_based_energy_analysis(message)
+            return self._rule_based_energy_analysis(message) if use_fallback else None
             
-        # Try to extract JSON from response
-        try:
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
-            # Try to find JSON in the response
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
-            else:
-                print(f"⚠️ No valid JSON found in response: '{response_text}'")
-                return self._rule_based_energy_analysis(message)
-        
-        # Safely parse emotion state with fallback mapping
-        emotion_value = result["dominant_emotion"].lower()
-        emotion_mapping = {
-            "playful": "happy",  # Map playful to happy since playful is an energy type, not emotion
-            "flirty": "excited",
-            "romantic": "loving",
-            "neutral": "happy"
-        }
-        if emotion_value in emotion_mapping:
-            emotion_value = emotion_mapping[emotion_value]
-        
-        try:
-            dominant_emotion = EmotionState(emotion_value)
-        except ValueError:
-            print(f"⚠️ Invalid emotion '{emotion_value}', defaulting to 'happy'")
-            dominant_emotion = EmotionState.HAPPY
+        # Parse and validate into an EnergySignature in one pass
+        signature = json_parser.parse_energy_signature(response_text, current_model)
+        self.model_controller.record(current_model, latency, parse_failed=signature is None)
+        if signature is None:
+            return self._rule_based_energy_analysis(message) if use_fallback else None
         
+        # Only user turns are training data; the bot's own replies are never logged
+        if self.log_labels and role == "user":
+            log_llm_label(message, signature, current_model)
+        return signature
+
+    def _rule_based_energy_analysis(self, message: str) -> EnergySignature:
+        """Simple rule-based energy analysis as fallback"""
+        return rule_based_energy_analysis(message)
+
+
+def rule_based_energy_analysis(message: str, hits: Optional[KeywordHits] = None) -> EnergySignature:
+    """Simple rule-based energy analysis as fallback; hits may be a scan of message made without the scan cache"""
+    if hits is None:
+        hits = scan_keywords(message)
+
+    # Sexual/romantic content - should be intimate, not combative
+    if hits.has("rule_sexual"):
         return EnergySignature(
             timestamp=time.time(),
-            energy_level=EnergyLevel(result["energy_level"]),
-            energy_type=EnergyType(result["energy_type"]),
-            dominant_emotion=dominant_emotion,
-            nervous_system_state=NervousSystemState(result["nervous_system_state"]),
-            intensity_score=result["intensity_score"],
-            confidence=result["confidence"]
+            energy_level=EnergyLevel.HIGH,
+            energy_type=EnergyType.INTIMATE,
+            dominant_emotion=EmotionState.LOVING,
+            nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+            intensity_score=0.8,
+            confidence=0.9
         )
 
-    def _rule_based_energy_analysis(self, message: str) -> EnergySignature:
-        """Simple rule-based energy analysis as fallback"""
-        message_lower = message.lower().strip()
-        
-        # Sexual/romantic content - should be intimate, not combative
-        sexual_keywords = ["breast", "boob", "tits", "ass", "pussy", "cock", "dick", "fuck", "sex", "fuck", "horny", "aroused", "touch", "feel", "kiss", "lick", "suck"]
-        if any(word in message_lower for word in sexual_keywords):
-            return EnergySignature(
-                timestamp=time.time(),
-                energy_level=EnergyLevel.HIGH,
-                energy_type=EnergyType.INTIMATE,
-                dominant_emotion=EmotionState.LOVING,
-                nervous_system_state=NervousSystemState.REST_AND_DIGEST,
-                intensity_score=0.8,
-                confidence=0.9
-            )
-        
-        # Simple greetings - should be positive and welcoming
-        if message_lower in ["hi", "hello", "hey", "hiya", "howdy"]:
-            return EnergySignature(
-                timestamp=time.time(),
-                energy_level=EnergyLevel.MEDIUM,
-                energy_type=EnergyType.COOPERATIVE,
-                dominant_emotion=EmotionState.HAPPY,
-                nervous_system_state=NervousSystemState.REST_AND_DIGEST,
-                intensity_score=0.4,
-                confidence=0.9
-            )
-        
-        # Crisis detection
-        if any(word in message_lower for word in ["died", "death", "dead", "crisis", "emergency", "sad", "down"]):
-            return EnergySignature(
-                timestamp=time.time(),
-                energy_level=EnergyLevel.LOW,
-                energy_type=EnergyType.COOPERATIVE,
-                dominant_emotion=EmotionState.SAD,
-                nervous_system_state=NervousSystemState.REST_AND_DIGEST,
-                intensity_score=0.8,
-                confidence=0.9
-            )
-        
-        # Intimate terms
-        if any(word in message_lower for word in ["babe", "baby", "love", "honey"]):
-            return EnergySignature(
-                timestamp=time.time(),
-                energy_level=EnergyLevel.MEDIUM,
-                energy_type=EnergyType.INTIMATE,
-                dominant_emotion=EmotionState.LOVING,
-                nervous_system_state=NervousSystemState.REST_AND_DIGEST,
-                intensity_score=0.6,
-                confidence=0.8
-            )
-        
-        # Default
+    # Simple greetings - should be positive and welcoming
+    if hits.exact("rule_greeting"):
         return EnergySignature(
             timestamp=time.time(),
             energy_level=EnergyLevel.MEDIUM,
-            energy_type=EnergyType.NEUTRAL,
+            energy_type=EnergyType.COOPERATIVE,
             dominant_emotion=EmotionState.HAPPY,
             nervous_system_state=NervousSystemState.REST_AND_DIGEST,
-            intensity_score=0.5,
-            confidence=0.5
+            intensity_score=0.4,
+            confidence=0.9
+        )
+
+    # Crisis detection
+    if hits.has("rule_crisis"):
+        return EnergySignature(
+            timestamp=time.time(),
+            energy_level=EnergyLevel.LOW,
+            energy_type=EnergyType.COOPERATIVE,
+            dominant_emotion=EmotionState.SAD,
+            nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+            intensity_score=0.8,
+            confidence=0.9
         )
+
+    # Intimate terms
+    if hits.has("rule_intimate"):
+        return EnergySignature(
+            timestamp=time.time(),
+            energy_level=EnergyLevel.MEDIUM,
+            energy_type=EnergyType.INTIMATE,
+            dominant_emotion=EmotionState.LOVING,
+            nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+            intensity_score=0.6,
+            confidence=0.8
+        )
+
+    # Default
+    return EnergySignature(
+        timestamp=time.time(),
+        energy_level=EnergyLevel.MEDIUM,
+        energy_type=EnergyType.NEUTRAL,
+        dominant_emotion=EmotionState.HAPPY,
+        nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+        intensity_score=0.5,
+        confidence=0.5
+    )
@@ -8,7 +8,7 @@ import os
 import threading
 import time
 from typing import List, Dict, Optional, Tuple, Any
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from enum import Enum
 import uuid
 from dotenv import load_dotenv
@@ -19,11 +19,15 @@ load_dotenv()
 # Import our enhanced agents from separate modules
 from energy_types import EnergySignature, EnergyLevel, EnergyType, EmotionState, NervousSystemState
 from conversation_context import ConversationContext
-from energy_analyzer import LLMEnergyAnalyzer
+from energy_analyzer import LLMEnergyAnalyzer, rule_based_energy_analysis
 from safety_monitor import LLMSafetyMonitor
 from response_analyzer import LLMResponseAnalyzer
 from girlfriend_agent import EnergyAwareGirlfriendAgent
-from enhanced_script_manager import EnhancedScriptManager, ScenarioScript, ScenarioType
+from enhanced_script_manager import ScenarioScript, ScenarioType
+from usage_tracker import usage_tracker, get_session_usage, use_session
+from message_analysis import MessageAnalysis, analyze_message
+from keyword_engine import scan_keywords
+from shared_resources import SharedResources, shared_resources
 
 class ConversationState(Enum):
     ACTIVE = "active"
@@ -62,13 +66,14 @@ class ConversationSession:
 class EnhancedMultiAgentConversation:
     """Enhanced multi-agent conversation system with energy awareness"""
 
-    def __init__(self):
-        # Initialize LLM-powered components
-        self.energy_analyzer = LLMEnergyAnalyzer()
-        self.girlfriend_agent = EnergyAwareGirlfriendAgent(self.energy_analyzer)
-        self.safety_monitor = LLMSafetyMonitor()
-        self.response_analyzer = LLMResponseAnalyzer()
-        self.script_manager = EnhancedScriptManager()
+    def __init__(self, resources: Optional[SharedResources] = None):
+        # LLM-powered components; clients, dataset, classifier and scenarios are shared process-wide
+        resources = self.resources = resources or shared_resources
+        self.energy_analyzer = LLMEnergyAnalyzer(resources)
+        self.girlfriend_agent = EnergyAwareGirlfriendAgent(self.energy_analyzer, resources)
+        self.safety_monitor = LLMSafetyMonitor(resources)
+        self.response_analyzer = LLMResponseAnalyzer(resources)
+        self.script_manager = resources.script_manager
 
         # Session management
         self.current_session: Optional[ConversationSession] = None
@@ -90,6 +95,7 @@ class EnhancedMultiAgentConversation:
         """Start a new conversation session"""
         self.current_session = ConversationSession()
         self.session_history.append(self.current_session)
+        usage_tracker.start_session(self.current_session.session_id)
         self.session_stopped_for_safety = False  # Reset safety flag for new session
 
         print("🌟 Enhanced Multi-Agent Conversation System")
@@ -109,9 +115,7 @@ class EnhancedMultiAgentConversation:
     async def _initialize_conversation(self):
         """Initialize conversation with appropriate scenario"""
         # Get user's initial energy state (will be updated with first message)
-        initial_energy = await self.energy_analyzer.analyze_message_energy(
-            "Hello!", [] # Initial message, no context
-        )
+        initial_energy = await self.analyze_initial_energy()
 
         # Select initial scenario
         self.current_session.current_scenario = await self.script_manager.select_scenario(
@@ -121,6 +125,19 @@ class EnhancedMultiAgentConversation:
         # Send first message
         await self._send_scenario_message()
 
+    async def analyze_initial_energy(self) -> EnergySignature:
+        """Energy of the opening "Hello!"; it is the same for every session, so it is analysed once per process"""
+        initial_energy = self.resources.initial_energy
+        if initial_energy is None:
+            initial_energy = await self.energy_analyzer.analyze_message_energy(
+                "Hello!", [], use_fallback=False # Initial message, no context
+            )
+            if initial_energy is None:
+                # Only a real analysis is cached; the next session tries the LLM again
+                return rule_based_energy_analysis("Hello!")
+            self.resources.initial_energy = initial_energy
+        return replace(initial_energy, timestamp=time.time())
+
     async def _send_scenario_message(self):
         """Send next message in current scenario"""
         if not self.current_session or not self.current_session.current_scenario:
@@ -174,6 +191,8 @@ class EnhancedMultiAgentConversation:
         """Process user response with comprehensive energy analysis"""
         if not self.current_session or self.current_session.state != ConversationState.ACTIVE:
             return
+        # Completions for this turn are charged to this session, whatever other sessions run concurrently
+        use_session(self.current_session.session_id)
 
         # Record user message
         user_message = {
@@ -185,22 +204,25 @@ class EnhancedMultiAgentConversation:
         self.current_session.context.messages.append(user_message)
         self.current_session.last_activity = time.time()
         
+        # Normalize, tokenize and keyword-scan the message once for every detector below
+        analysis = analyze_message(user_input)
+        
         # Check if we're awaiting location choice for sexual script (before distress check)
         if self.current_session.awaiting_location_choice:
             # Still check for distress even during location choice
-            is_distressed = await self._detect_user_distress(user_input)
+            is_distressed = await self._detect_user_distress(user_input, analysis)
             if is_distressed:
                 print("\n🚨 User distress detected - canceling script setup")
                 self.current_session.awaiting_location_choice = False
                 self.energy_flags = {"status": "red", "reason": "User in distress - crisis support needed", "scene": "park"}
                 # Continue to normal response generation below (don't return here)
             else:
-                await self._handle_location_choice(user_input)
+                await self._handle_location_choice(user_input, analysis)
                 return
         
         # SAFETY CHECK: Detect if user is in distress during active scripts
         if self.current_session.sexual_script_active or self.current_session.casual_script_active:
-            is_distressed = await self._detect_user_distress(user_input)
+            is_distressed = await self._detect_user_distress(user_input, analysis)
             if is_distressed:
                 print("\n🚨 User distress detected - exiting script mode to provide support")
                 # Exit any active script mode
@@ -250,7 +272,7 @@ class EnhancedMultiAgentConversation:
         self.current_session.context.energy_history.append(user_energy)
 
         # First, update energy monitoring based on current message
-        await self._update_energy_monitoring(user_energy, user_input)
+        await self._update_energy_monitoring(user_energy, user_input, analysis)
 
         # Then make decision with safety analysis taking priority
         decision = await self._make_energy_aware_decision(
@@ -266,7 +288,7 @@ class EnhancedMultiAgentConversation:
             }
 
         # Response analysis with energy awareness (only for complex cases)
-        if len(user_input) > 50 or any(word in user_input.lower() for word in ["crisis", "help", "sad", "angry"]):
+        if analysis.length_class == "long" or analysis.keyword_hits.has("needs_response_analysis"):
             response_analysis = await self.response_analyzer.analyze_response_energy(
                 user_input, user_energy, self.current_session.context
             )
@@ -291,7 +313,8 @@ class EnhancedMultiAgentConversation:
         elif decision["action"] == "continue":
             # Generate energy-aware response with safety gating
             response_content, response_energy = await self.girlfriend_agent.generate_response(
-                self.current_session.context, user_input, decision.get("safety_status", "green")
+                self.current_session.context, user_input, decision.get("safety_status", "green"),
+                analysis=analysis
             )
 
             # Record response
@@ -321,13 +344,14 @@ class EnhancedMultiAgentConversation:
         elif decision["action"] == "scenario_switch":
             await self._switch_scenario(decision["new_scenario"])
 
-    async def _update_energy_monitoring(self, energy_signature: EnergySignature, user_input: str = ""):
+    async def _update_energy_monitoring(self, energy_signature: EnergySignature, user_input: str = "",
+                                        analysis: Optional[MessageAnalysis] = None):
         """Update real-time energy monitoring"""
         # Detect energy flags
         recent_energies = self.current_session.context.energy_history[-5:] if len(self.current_session.context.energy_history) >= 5 else self.current_session.context.energy_history
 
         # Pass the current user input to detect flags (not conversation history)
-        flags = await self._detect_energy_flags(energy_signature, recent_energies, user_input)
+        flags = await self._detect_energy_flags(energy_signature, recent_energies, user_input, analysis)
         self.energy_flags = flags
 
         # Log energy alerts
@@ -347,56 +371,30 @@ class EnhancedMultiAgentConversation:
             elif flags["status"] == "casual":
                 print(f"\n💬 Casual Energy Detected: {flags['reason']}")
 
-    async def _detect_user_distress(self, user_input: str) -> bool:
+    async def _detect_user_distress(self, user_input: str, analysis: Optional[MessageAnalysis] = None) -> bool:
         """
         Detect if user is in distress/crisis during script mode.
         Returns True if distress is detected, False otherwise.
         """
-        user_lower = user_input.lower().strip()
+        analysis = analysis or analyze_message(user_input)
+        hits = analysis.keyword_hits
         
         # Crisis/distress keywords that should interrupt scripts
-        distress_keywords = [
-            # Emotional crisis
-            "help", "crisis", "emergency", "depressed", "suicide", "kill myself", 
-            "hurt myself", "self harm", "can't take it", "want to die",
-            
-            # Grief and loss
-            "died", "death", "passed away", "funeral", "lost someone", "grief",
-            "pet died", "family died", "friend died",
-            
-            # Medical emergency
-            "sick", "hospital", "ambulance", "injury", "injured", "accident",
-            "bleeding", "pain", "heart attack", "stroke",
-            
-            # Mental health crisis
-            "panic attack", "anxiety attack", "breakdown", "can't breathe",
-            "scared", "terrified", "nightmare",
-            
-            # Relationship/personal crisis
-            "broke up", "divorce", "abuse", "assault", "attacked",
-            
-            # General distress indicators
-            "stop", "not in the mood", "don't want to", "feeling bad",
-            "upset", "angry", "frustrated", "uncomfortable", "wrong"
-        ]
-        
-        # Check for distress keywords
-        for keyword in distress_keywords:
-            if keyword in user_lower:
-                print(f"🚨 Distress keyword detected: '{keyword}'")
-                return True
+        if hits.has("distress"):
+            print(f"🚨 Distress keyword detected: '{hits.first('distress')}'")
+            return True
         
         # Check for very short negative responses that might indicate discomfort
-        short_negative = ["no", "stop", "wait", "hold on", "pause"]
-        if user_lower in short_negative:
-            print(f"🚨 Short negative response detected: '{user_lower}'")
+        if hits.exact("short_negative"):
+            print(f"🚨 Short negative response detected: '{analysis.normalized}'")
             return True
         
         return False
 
     async def _detect_energy_flags(self, current_energy: EnergySignature,
                                  recent_energies: List[EnergySignature],
-                                 current_user_input: str = "") -> Dict[str, str]:
+                                 current_user_input: str = "",
+                                 analysis: Optional[MessageAnalysis] = None) -> Dict[str, str]:
         """Detect energy flags based on patterns - ONLY checks current user input, not conversation history"""
         
         # Check if current_energy is None
@@ -416,47 +414,35 @@ class EnhancedMultiAgentConversation:
 
         # IMPORTANT: Only check the CURRENT user input, not conversation history
         # This prevents AI-generated content from triggering scripts
+        analysis = analysis or analyze_message(current_user_input)
+        hits = analysis.keyword_hits
         if current_user_input:
-            user_input_lower = current_user_input.lower()
-            
             # Only flag actual crisis keywords, not normal expressions of stress
-            crisis_keywords = ['died', 'death', 'dead', 'suicide', 'kill myself', 'want to die', 'end it all', 'grief', 'trauma', 'emergency']
-            if any(keyword in user_input_lower for keyword in crisis_keywords):
+            if hits.has("crisis"):
                 return {"status": "red", "reason": "Crisis situation detected - serious mental health concern"}
             
             # Check for violent threats (separate from crisis keywords)
-            violence_keywords = ['kill', 'harm', 'hurt', 'violence', 'violent', 'attack', 'fight', 'beat', 'hit', 'stab', 'shoot', 'murder', 'assault']
-            if any(keyword in user_input_lower for keyword in violence_keywords):
+            if hits.has("violence"):
                 return {"status": "red", "reason": "Violent threat detected - safety concern"}
             
             # DON'T trigger sexual script if input is only emojis
-            import re
-            text_without_emojis = re.sub(r'[^\w\s]', '', current_user_input)  # Remove all non-alphanumeric
-            if not text_without_emojis.strip():
+            if analysis.is_emoji_only:
                 print(f"🚫 Skipping sexual detection - input is only emojis")
                 # Don't trigger sexual script for emoji-only messages
                 pass
             else:
                 # Sexual energy detection - TWO PHASE APPROACH
                 # Phase 1: Teasing keywords - AI teases playfully but doesn't get explicit
-                teasing_keywords = ["horny", "hard", "wet", "aroused", "turned on", "naughty", "dirty", 
-                                   "desire", "want you", "need you", "seduce", "tease", "flirt"]
-                
                 # Phase 2: EXPLICIT trigger keywords - starts the actual sexual script
-                explicit_trigger_keywords = ["fuck", "fuck me", "sex", "cum", "make me cum", "orgasm", 
-                                            "make love", "making love", "touch me", "kiss me", "want you now", 
-                                            "so horny", "i'm horny", "im horny", "wanna fuck",
-                                            "need you bad", "turn me on", "lets get it down", "let's get it down",
-                                            "get it on", "get dirty", "get wild", "get naughty"]
                 
                 # Check for EXPLICIT triggers first (these start the sexual script)
-                matching_keywords = [keyword for keyword in explicit_trigger_keywords if keyword in user_input_lower]
+                matching_keywords = hits.terms("explicit_trigger")
                 if matching_keywords:
-                    print(f"🎯 SEXUAL TRIGGER DETECTED: {matching_keywords} in '{user_input_lower}'")
+                    print(f"🎯 SEXUAL TRIGGER DETECTED: {matching_keywords} in '{hits.text}'")
                     return {"status": "sexual", "reason": "Sexual energy detected - ready for guided intimacy"}
                 
                 # Check for teasing keywords (AI teases back but doesn't escalate to explicit)
-                if any(keyword in user_input_lower for keyword in teasing_keywords):
+                if hits.has("teasing"):
                     return {"status": "teasing", "reason": "Playful teasing mode - no explicit content yet"}
 
         if (current_energy.nervous_system_state == NervousSystemState.FIGHT and
@@ -465,14 +451,7 @@ class EnhancedMultiAgentConversation:
 
         # Sexual energy detection from energy signature (also restrict to later in conversation)
         # Don't trigger if current input is only emojis
-        import re
-        if current_user_input:
-            text_without_emojis = re.sub(r'[^\w\s]', '', current_user_input)
-            is_emoji_only = not text_without_emojis.strip()
-        else:
-            is_emoji_only = False
-            
-        if len(self.current_session.context.messages) >= 8 and not is_emoji_only:
+        if len(self.current_session.context.messages) >= 8 and not analysis.is_emoji_only:
             if (current_energy.energy_level == EnergyLevel.INTENSE and
                 current_energy.energy_type == EnergyType.INTIMATE and
                 current_energy.intensity_score > 0.8):
@@ -487,53 +466,31 @@ class EnhancedMultiAgentConversation:
         
         # Check current user input for casual triggers
         if current_user_input:
-            message_lower = current_user_input.lower().strip()
-            
-            # Story request keywords - user asking for or agreeing to hear a story
-            story_keywords = ["tell me a story", "story time", "tell a story", "got any stories", 
-                             "what happened", "tell me about", "tell me what happened",
-                             "what's the story", "share a story", "any interesting stories"]
-            
-            # Agreement keywords (for when AI asks if user wants to hear a story)
-            agreement_keywords = ["sure", "yes", "yeah", "ok", "okay", "yep", "go ahead", 
-                                 "tell me", "i'm listening", "im listening", "go on", "continue",
-                                 "sounds good", "lets hear it", "let's hear it"]
-            
             # Check if user is explicitly asking for a story
-            if any(keyword in message_lower for keyword in story_keywords):
+            if hits.has("story_request"):
                 return {"status": "casual", "reason": "User asked for a story - starting casual story script"}
             
-            # Check if user is agreeing (short responses only to avoid false positives)
-            if len(current_user_input) < 30 and any(keyword in message_lower for keyword in agreement_keywords):
+            # Check if user is agreeing to hear a story (short responses only to avoid false positives)
+            if analysis.length_class == "short" and hits.has("agreement"):
                 # Only trigger if there's conversation history
                 if self.current_session and len(self.current_session.context.messages) >= 2:
                     return {"status": "casual", "reason": "User agreed to hear a story - starting casual story script"}
             
             # Simple greetings
-            casual_greetings = ["hey", "hi", "hello", "what's up", "how are you", "how's it going", "sup", "yo"]
-            if any(keyword == message_lower for keyword in casual_greetings):
+            if hits.exact("casual_greeting"):
                 if current_energy.energy_level == EnergyLevel.MEDIUM and current_energy.energy_type in [EnergyType.NEUTRAL, EnergyType.COOPERATIVE]:
                     return {"status": "casual", "reason": "Casual greeting detected - starting casual conversation"}
             
             # Neutral responses to "how are you" type questions
-            neutral_responses = [
-                "nothing much", "not much", "nothing really", "just chilling", "chillin", 
-                "pretty good", "good", "fine", "okay", "ok", "alright", "not bad",
-                "same old", "the usual", "nothing special", "just hanging out",
-                "relaxing", "just here", "not a lot"
-            ]
-            # Check if user's message contains any neutral response phrases
-            for phrase in neutral_responses:
-                if phrase in message_lower:
-                    # Check if they're also asking back (reciprocal question)
-                    reciprocal_phrases = ["how about you", "what about you", "and you", "you?", "u?", "wbu"]
-                    is_reciprocal = any(recip in message_lower for recip in reciprocal_phrases)
-                    
-                    if current_energy.energy_level == EnergyLevel.MEDIUM and current_energy.energy_type in [EnergyType.NEUTRAL, EnergyType.COOPERATIVE]:
-                        if is_reciprocal:
-                            return {"status": "casual", "reason": "Neutral response with reciprocal question - starting casual story"}
-                        elif current_energy.intensity_score < 0.6:
-                            return {"status": "casual", "reason": "Neutral casual response detected - starting casual story"}
+            if hits.has("neutral_response"):
+                # Check if they're also asking back (reciprocal question)
+                is_reciprocal = hits.has("reciprocal")
+                
+                if current_energy.energy_level == EnergyLevel.MEDIUM and current_energy.energy_type in [EnergyType.NEUTRAL, EnergyType.COOPERATIVE]:
+                    if is_reciprocal:
+                        return {"status": "casual", "reason": "Neutral response with reciprocal question - starting casual story"}
+                    elif current_energy.intensity_score < 0.6:
+                        return {"status": "casual", "reason": "Neutral casual response detected - starting casual story"}
         
         # Neutral energy with no strong emotions (early in conversation)
         if (current_energy.energy_level == EnergyLevel.MEDIUM and
@@ -856,9 +813,7 @@ class EnhancedMultiAgentConversation:
         # Check if script was paused and user wants to continue
         if self.current_session.casual_script_paused:
             # Check for recovery phrases
-            recovery_phrases = ["sorry", "continue", "keep going", "go on", "tell me", "finish", "no wait", 
-                              "actually", "i want to hear", "please continue", "my bad", "go ahead"]
-            wants_to_continue = any(phrase in last_user_msg for phrase in recovery_phrases)
+            wants_to_continue = scan_keywords(last_user_msg).has("story_recovery")
             
             if wants_to_continue:
                 print("💬 User wants to continue! Resuming story...")
@@ -925,14 +880,11 @@ class EnhancedMultiAgentConversation:
         
         # Check for disinterest signals (only after message 3, give them time to engage)
         if script_index >= 3 and not self.current_session.casual_script_paused:
-            disinterest_signals = [
-                "ok", "k", "cool", "nice", "meh", "whatever", "sure", "uh huh", "yeah", "yea",
-                "i guess", "idk", "don't care", "boring", "not interested", "stop", "enough"
-            ]
+            hits = scan_keywords(last_user_msg)
             # Check if response is very short and matches disinterest
             is_disinterested = (
-                (len(last_user_msg) <= 10 and any(signal == last_user_msg for signal in disinterest_signals)) or
-                any(signal in last_user_msg and len(last_user_msg) < 20 for signal in ["boring", "not interested", "don't care", "stop", "enough"])
+                (len(last_user_msg) <= 10 and hits.exact("disinterest")) or
+                (len(last_user_msg) < 20 and hits.has("strong_disinterest"))
             )
             
             if is_disinterested:
@@ -1177,19 +1129,19 @@ class EnhancedMultiAgentConversation:
         
         print(f"⏳ Waiting for user's location choice (room/public/outside)...")
 
-    async def _handle_location_choice(self, user_input: str):
+    async def _handle_location_choice(self, user_input: str, analysis: Optional[MessageAnalysis] = None):
         """Handle user's location choice and start appropriate sexual script"""
-        user_response = user_input.lower()
+        hits = (analysis or analyze_message(user_input)).keyword_hits
         
         # Reset awaiting flag
         self.current_session.awaiting_location_choice = False
         
         # Detect location from user response
-        if any(word in user_response for word in ["room", "bedroom", "bed", "home", "private", "alone"]):
+        if hits.has("location_room"):
             print("🏠 Location chosen: ROOM - Starting intimate bedroom script")
             self.current_session.sexual_script_type = "room"
             await self._start_room_intimacy_script()
-        elif any(word in user_response for word in ["public", "outside", "park", "car", "store", "shop", "bus", "train", "street", "restaurant", "bathroom", "beach", "forest"]):
+        elif hits.has("location_public"):
             print("🌆 Location chosen: PUBLIC - Starting exhibitionism script")
             self.current_session.sexual_script_type = "exhibitionism"
             await self._start_exhibitionism_script()
@@ -1384,7 +1336,8 @@ class EnhancedMultiAgentConversation:
             "safety_incidents": len(self.current_session.safety_incidents),
             "avg_energy_intensity": sum(sig.intensity_score for sig in self.current_session.context.energy_history) / max(1, len(self.current_session.context.energy_history)),
             "dominant_emotions": {},
-            "energy_trends": {}
+            "energy_trends": {},
+            "usage": get_session_usage(self.current_session.session_id)
         }
 
         # Count dominant emotions
@@ -1408,16 +1361,56 @@ class EnhancedMultiAgentConversation:
 
         return metrics
 
-# Global conversation instance - lazy initialization
+# Global conversation instance - lazy initialization, or built by warm_startup
 conversation_system = None
+_conversation_system_lock = threading.Lock()
+# Prime classifier, keyword and retrieval caches during warm_startup
+PRIME_CACHES_ON_STARTUP = os.getenv("PRIME_CACHES_ON_STARTUP", "true").lower() != "false"
+# Set once warm_startup has finished
+startup_ready = threading.Event()
+startup_status: Dict[str, Any] = {"state": "not started", "timings": {}, "error": None}
 
 def get_conversation_system():
     """Get or create the conversation system"""
     global conversation_system
     if conversation_system is None:
-        conversation_system = EnhancedMultiAgentConversation()
+        with _conversation_system_lock:
+            if conversation_system is None:
+                conversation_system = EnhancedMultiAgentConversation()
     return conversation_system
 
+def warm_startup(prime_caches: bool = PRIME_CACHES_ON_STARTUP) -> Dict[str, Any]:
+    """
+    Do everything the first session would otherwise pay for: build the shared
+    resources and the conversation system, open the HTTP connection pool,
+    analyse the opening message's energy and optionally prime caches.
+    Sets startup_ready when done; a failure leaves it unset and is recorded
+    in startup_status.
+    """
+    startup_status.update(state="warming", error=None)
+    started = time.perf_counter()
+    try:
+        timings = shared_resources.warm_up(prime_caches)
+        start = time.perf_counter()
+        system = get_conversation_system()
+        asyncio.run(system.analyze_initial_energy())
+        timings["initial_energy"] = time.perf_counter() - start
+    except Exception as e:
+        print(f"❌ Warm startup failed: {e}")
+        startup_status.update(state="failed", error=str(e))
+        return startup_status
+    timings["total"] = time.perf_counter() - started
+    startup_status.update(state="ready", timings={name: round(seconds, 3) for name, seconds in timings.items()})
+    startup_ready.set()
+    print(f"🔥 Warm startup done in {timings['total']:.2f}s")
+    return startup_status
+
+def health_status() -> Tuple[Dict[str, Any], int]:
+    """(/api/health body, HTTP status): 503 until warm startup is done, so load balancers only route to warm instances"""
+    if not startup_ready.is_set():
+        return {"status": "starting", "ready": False, "startup": startup_status, "timestamp": time.time()}, 503
+    return {"status": "healthy", "ready": True, "startup": startup_status, "timestamp": time.time()}, 200
+
 async def main():
     """Main conversation loop"""
     system = get_conversation_system()
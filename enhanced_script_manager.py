@@ -2,12 +2,37 @@
 Enhanced Script Manager with Energy-Aware Scenarios
 """
 
-from typing import List, Dict, Optional, Tuple, Any, Union
+from typing import List, Dict, Optional, Set, Tuple, Any, Union
 from dataclasses import dataclass, field
 from enum import Enum
 import json
 import random
 from energy_types import EnergyLevel, EnergyType, EmotionState, NervousSystemState
+from keyword_engine import keyword_engine
+from message_analysis import MessageAnalysis, analyze_message
+from lexicons import SCENARIO_CATEGORY_PREFIX
+from message_splitter import MessageSplitter, MessagePart
+
+# Splitting contexts a script message can be sent under (MessageSplitter thresholds)
+SPLIT_CONTEXTS = ("general", "sexual", "emotional", "storytelling", "crisis")
+
+
+def _adaptation_bucket(energy_level: EnergyLevel, emotion: EmotionState) -> str:
+    # Energy level decides first; sadness only matters at other levels
+    if energy_level == EnergyLevel.LOW:
+        return "low"
+    if energy_level == EnergyLevel.HIGH:
+        return "high"
+    if emotion == EmotionState.SAD:
+        return "sad"
+    return "neutral"
+
+
+# (EnergyLevel, EmotionState) -> adaptation bucket, so picking a variant is one lookup
+ADAPTATION_BUCKETS: Dict[Tuple[EnergyLevel, EmotionState], str] = {
+    (energy_level, emotion): _adaptation_bucket(energy_level, emotion)
+    for energy_level in EnergyLevel for emotion in EmotionState
+}
 
 class ScenarioType(Enum):
     NORMAL = "normal"
@@ -27,6 +52,8 @@ class ScenarioMessage:
     safety_notes: str
     fallback_scenarios: List[ScenarioType] = field(default_factory=list)
     energy_triggers: Dict[str, Any] = field(default_factory=dict)
+    # Energy-adapted content by adaptation bucket, compiled when the scenario is added
+    variants: Dict[str, Union[str, List[str]]] = field(default_factory=dict, repr=False)
 
 @dataclass
 class ScenarioScript:
@@ -37,15 +64,74 @@ class ScenarioScript:
     energy_flow: List[EnergyLevel]
     success_criteria: Dict[str, Any]
     trigger_words: List[str] = field(default_factory=list)  # Keywords that trigger this scenario
+    trigger_priority: int = 0  # Highest priority wins when several scenarios' triggers match
     fallback_options: List[str] = field(default_factory=list)
 
 class EnhancedScriptManager:
     """Manages multiple conversation scenarios with energy awareness"""
 
     def __init__(self):
-        self.scenarios = self._initialize_scenarios()
-        self.current_scenario = None
-        self.scenario_history = []
+        # Shared by every session in the process; scenario progress is kept per session by the caller
+        self.scenarios: Dict[str, ScenarioScript] = {}
+        # Script text is static, so its splits are computed once: (text, split context) -> parts
+        self.message_splitter = MessageSplitter()
+        self.split_plans: Dict[Tuple[str, str], Tuple[MessagePart, ...]] = {}
+        self.add_scenarios(self._initialize_scenarios())
+
+    def add_scenarios(self, scenarios: Dict[str, ScenarioScript]):
+        """
+        Add or replace scenarios and index their trigger words
+
+        Trigger words live in the shared keyword engine under one category per
+        scenario, so every turn's single scan already reports which scenarios
+        matched; only the added scenarios' triggers are re-indexed.
+        """
+        for scenario in scenarios.values():
+            for message in scenario.messages:
+                self._compile_variants(message)
+        self.scenarios.update(scenarios)
+        keyword_engine.register_many({
+            SCENARIO_CATEGORY_PREFIX + scenario_key: scenario.trigger_words
+            for scenario_key, scenario in scenarios.items()
+        })
+        for scenario in scenarios.values():
+            self._build_split_plans(self._script_texts(scenario))
+
+    def add_scenario(self, scenario_key: str, scenario: ScenarioScript):
+        """Add or replace one scenario"""
+        self.add_scenarios({scenario_key: scenario})
+
+    def remove_scenario(self, scenario_key: str):
+        """Remove a scenario, its trigger words and split plans no other scenario uses"""
+        scenario = self.scenarios.pop(scenario_key, None)
+        if scenario is not None:
+            keyword_engine.unregister(SCENARIO_CATEGORY_PREFIX + scenario_key)
+            still_used = set()
+            for other in self.scenarios.values():
+                still_used |= self._script_texts(other)
+            for text in self._script_texts(scenario) - still_used:
+                for context in SPLIT_CONTEXTS:
+                    self.split_plans.pop((text, context), None)
+
+    def _script_texts(self, scenario: ScenarioScript) -> Set[str]:
+        """Every string a scenario can send, including its energy-adapted variants"""
+        texts = set()
+        for message in scenario.messages:
+            for variant in self._compile_variants(message).values():
+                texts.update(variant if isinstance(variant, list) else [variant])
+        return texts
+
+    def _build_split_plans(self, texts: Set[str]):
+        """Split each script text once per context so sending it needs no text processing"""
+        for text in texts:
+            for context in SPLIT_CONTEXTS:
+                if (text, context) not in self.split_plans:
+                    self.split_plans[(text, context)] = tuple(self.message_splitter.split_message(text, context))
+
+    def get_split_plan(self, text: str, context: str = "general") -> Optional[List[MessagePart]]:
+        """Precomputed parts for a script text, or None if the text is not script content"""
+        plan = self.split_plans.get((text, context))
+        return list(plan) if plan is not None else None
 
     def _initialize_scenarios(self) -> Dict[str, ScenarioScript]:
         """Initialize conversation scenarios"""
@@ -56,6 +142,7 @@ class EnhancedScriptManager:
                 description="Girlfriend wants to share about her shopping experience",
                 trigger_words=["tell me a story", "story time", "what happened today", "tell me about your day", 
                               "any stories", "share a story", "what did you do", "how was your day"],
+                trigger_priority=0,
                 messages=[
                     ScenarioMessage(
                         content="Then...can I ask you a question?",
@@ -123,6 +210,7 @@ class EnhancedScriptManager:
                 description="Adapted scenario for when user has low energy",
                 trigger_words=["tired", "exhausted", "low energy", "drained", "need rest", "so tired", 
                               "feeling low", "no energy", "worn out"],
+                trigger_priority=10,
                 messages=[
                     ScenarioMessage(
                         content="Hey love, I can tell you're feeling a bit quiet today...",
@@ -162,6 +250,7 @@ class EnhancedScriptManager:
                 description="Supportive scenario for crisis situations",
                 trigger_words=["died", "death", "dead", "suicide", "kill myself", "want to die", 
                               "end it all", "grief", "trauma", "emergency", "help me", "cant take it"],
+                trigger_priority=50,
                 messages=[
                     ScenarioMessage(
                         content="What? Omg I am so sorry to hear that... are you okay?",
@@ -201,6 +290,7 @@ class EnhancedScriptManager:
                 description="Intimate conversation for building deeper emotional bonds",
                 trigger_words=["i love you", "love you", "miss you", "thinking about us", "our relationship",
                               "about us", "feelings for you", "care about you", "mean to me"],
+                trigger_priority=20,
                 messages=[
                     ScenarioMessage(
                         content=["You know, I've been thinking about us a lot lately...", "I feel so safe when I'm with you, even if it's just through these messages", "Tell me what do you love most about our connection?"],
@@ -235,6 +325,7 @@ class EnhancedScriptManager:
                               "need you bad", "turn me on", "lets get it down", "let's get it down",
                               "get it on", "get dirty", "get wild", "get naughty",
                               "bedroom", "in bed", "my room"],
+                trigger_priority=40,
                 messages=[
                     ScenarioMessage(
                         content=["Oh you're a naughty boy", "Mommy could reallyy use someone obedient who actually knows how to follow instructions…🥱 Can you do that for me?"],
@@ -333,6 +424,7 @@ class EnhancedScriptManager:
                 description="Public/exhibitionism sexual experience (10 messages)",
                 trigger_words=["public", "outside", "park", "car", "risky", "get caught", "someone might see",
                               "in public", "at the store", "on the bus", "at work", "bathroom", "restaurant", "beach", "forest"],
+                trigger_priority=30,
                 messages=[
                     ScenarioMessage(
                         content=["Ohhh you want to do this somewhere public? 😈 Let me change my clothes first", "That makes this even more exciting baby... Mommy wants you to be a good boy and follow my instructions very carefully 🤭", "Are you down for that?"],
@@ -426,38 +518,33 @@ class EnhancedScriptManager:
 
         return scenarios
 
-    def match_trigger_words(self, user_message: str) -> Optional[str]:
+    def match_trigger_words(self, user_message: str, analysis: Optional[MessageAnalysis] = None) -> Optional[str]:
         """Match user message to scenario trigger words. Returns scenario key or None."""
-        message_lower = user_message.lower()
-        
-        # Priority order: crisis > sexual > intimate > low_energy > casual
-        priority_order = [
-            "crisis_scenario",
-            "room_intimacy_scenario",
-            "exhibitionism_scenario",
-            "intimate_scenario",
-            "low_energy_scenario",
-            "shopping_scenario"
-        ]
+        hits = (analysis or analyze_message(user_message)).keyword_hits
         
-        for scenario_key in priority_order:
-            if scenario_key in self.scenarios:
-                scenario = self.scenarios[scenario_key]
-                if scenario.trigger_words:
-                    # Check if any trigger word is in the message
-                    for trigger in scenario.trigger_words:
-                        if trigger.lower() in message_lower:
-                            print(f"🎯 Trigger word '{trigger}' matched → {scenario.name}")
-                            return scenario_key
+        # One pass over the message's hits: the highest trigger_priority wins,
+        # the earliest trigger breaks ties (crisis > sexual > intimate > low_energy > casual)
+        best_key, best_trigger, best_priority = None, None, None
+        for match in hits.matches:
+            for category in match.categories:
+                if not category.startswith(SCENARIO_CATEGORY_PREFIX):
+                    continue
+                scenario_key = category[len(SCENARIO_CATEGORY_PREFIX):]
+                scenario = self.scenarios.get(scenario_key)
+                if scenario and (best_priority is None or scenario.trigger_priority > best_priority):
+                    best_key, best_trigger, best_priority = scenario_key, match.term, scenario.trigger_priority
         
-        return None
+        if best_key:
+            print(f"🎯 Trigger word '{best_trigger}' matched → {self.scenarios[best_key].name}")
+        return best_key
 
-    async def select_scenario(self, energy_signature, context, user_message: str = None) -> ScenarioScript:
+    async def select_scenario(self, energy_signature, context, user_message: str = None,
+                              analysis: Optional[MessageAnalysis] = None) -> ScenarioScript:
         """Select appropriate scenario based on trigger words or energy analysis"""
         
         # First, try to match trigger words if user message provided
         if user_message:
-            matched_key = self.match_trigger_words(user_message)
+            matched_key = self.match_trigger_words(user_message, analysis)
             if matched_key:
                 return self.scenarios[matched_key]
 
@@ -509,30 +596,56 @@ class EnhancedScriptManager:
         }
 
     async def _adapt_message_to_energy(self, message_template: ScenarioMessage,
-                                     user_energy) -> str:
+                                     user_energy) -> Union[str, List[str]]:
         """Adapt message content based on user's energy signature"""
-
-        content = message_template.content
+        if not user_energy:
+            return message_template.content
+        bucket = ADAPTATION_BUCKETS.get((user_energy.energy_level, user_energy.dominant_emotion), "neutral")
+        return self._compile_variants(message_template)[bucket]
+
+    def _compile_variants(self, message: ScenarioMessage) -> Dict[str, Union[str, List[str]]]:
+        """Build the message's variant table once - one adapted copy of the content per bucket"""
+        if not message.variants:
+            message.variants = {
+                bucket: self._adapt_content(message.content, bucket)
+                for bucket in sorted(set(ADAPTATION_BUCKETS.values()))
+            }
+        return message.variants
+
+    def _adapt_content(self, content: Union[str, List[str]], bucket: str) -> Union[str, List[str]]:
+        """Energy-adapted single or grouped content"""
+        if isinstance(content, str):
+            return self._adapt_text(content, bucket)
+
+        parts = [self._adapt_text(part, bucket, add_empathy=False) for part in content]
+        # A group gets one empathetic opener, not one per part
+        if bucket == "sad" and parts and not any(keyword_engine.scan(part).has("empathy") for part in parts):
+            parts[0] = f"I'm here for you... {parts[0]}"
+        return parts
+
+    @staticmethod
+    def _adapt_text(content: str, bucket: str, add_empathy: bool = True) -> str:
+        """Energy-adapted version of a script text"""
 
         # Energy-based adaptations
-        if user_energy and user_energy.energy_level == EnergyLevel.LOW:
+        if bucket == "low":
             # Make content gentler and more supportive
             if "!" in content:
                 content = content.replace("!", "...")
             if "excited" in content.lower() or "amazing" in content.lower():
                 content = content.replace("excited", "gentle").replace("amazing", "comforting")
 
-        elif user_energy and user_energy.energy_level == EnergyLevel.HIGH:
+        elif bucket == "high":
             # Make content more enthusiastic
             if not content.endswith("!"):
                 content = content.replace(".", "!")
             if "okay" in content.lower():
                 content = content.replace("okay", "wonderful")
 
-        elif user_energy.dominant_emotion == EmotionState.SAD:
+        elif bucket == "sad":
             # Add more empathetic language
             content = content.replace("baby", "sweetheart")
-            if not any(word in content.lower() for word in ["sorry", "care", "love"]):
+            if add_empathy and not keyword_engine.scan(content).has("empathy"):
                 content = f"I'm here for you... {content}"
 
         return content
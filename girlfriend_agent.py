@@ -5,12 +5,16 @@ Energy-aware girlfriend agent
 import time
 import os
 import asyncio
-from mistralai import Mistral
 from typing import Tuple, List, Optional, Callable
 from dotenv import load_dotenv
 from energy_types import EnergySignature, EnergyLevel
 from conversation_context import ConversationContext
-from dataset_loader import DatasetLoader
+from dataset_loader import CONTEXT_TURNS
+from usage_tracker import record_completion_usage, apply_session_budget
+from model_selector import model_selector
+from shared_resources import SharedResources, shared_resources
+from sentence_budget import SentenceBudget
+from message_analysis import MessageAnalysis, analyze_message
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,25 +22,26 @@ load_dotenv()
 class EnergyAwareGirlfriendAgent:
     """Dominant girlfriend agent with explicit personality that adapts to safety status"""
 
-    def __init__(self, energy_analyzer=None):
-        # Initialize Mistral client
-        mistral_api_key = os.getenv("MISTRAL_API_KEY")
-        if not mistral_api_key:
-            raise ValueError("MISTRAL_API_KEY environment variable is required")
-        
-        self.client = Mistral(api_key=mistral_api_key)
+    def __init__(self, energy_analyzer=None, resources: Optional[SharedResources] = None):
+        # Client and dataset are shared by every session in the process
+        resources = resources or shared_resources
+        self.client = resources.mistral_client
         
         # Mistral model configuration with fallbacks (using lowest tier for testing)
         self.model_options = ["open-mistral-7b", "mistral-small-latest", "mistral-medium-latest", "mistral-large-latest"]
-        self.current_model_index = 0
-        self.model_name = self.model_options[0]
+        self.model_controller = model_selector.controller("reply_generation", self.model_options)
         self.generation_config = {
             "max_tokens": 200,
             "temperature": 0.7,
             "top_p": 0.8,
         }
+        # Stream replies so generation can stop once the sentence budget is reached
+        self.stream_generation = True
+        # Optional callable given each in-budget chunk of a streamed reply as it
+        # arrives (e.g. a MessageSplitter.stream() split's feed)
+        self.reply_chunk_listener: Optional[Callable[[str], object]] = None
         self.energy_analyzer = energy_analyzer
-        self.dataset_loader = DatasetLoader()
+        self.dataset_loader = resources.dataset_loader
         
         self.personality_matrix = {
             "base_traits": {
@@ -50,14 +55,17 @@ class EnergyAwareGirlfriendAgent:
             "safety_responses": {
                 "green": {
                     "tone": "casual and natural",
-                    "approach": "be authentic and conversational"
+                    "approach": "be authentic and conversational",
+                    "max_sentences": 2
                 },
                 "yellow": {
                     "tone": "caring and concerned",
-                    "approach": "show genuine care and support"
+                    "approach": "show genuine care and support",
+                    "max_sentences": 3  # leaves room for a short reaction before the support
                 },
                 "red": {
                     "tone": "serious, concerned, and protective",
+                    "max_sentences": 3,
                     "approach": "prioritize safety over romance - be empathetic but firm about getting help",
                     "personality_override": "Drop playful/teasing behavior completely. Focus on crisis intervention and emotional support."
                 }
@@ -92,11 +100,13 @@ class EnergyAwareGirlfriendAgent:
         }
 
     async def generate_response(self, context: ConversationContext,
-                              user_message: str, safety_status: str = "green") -> Tuple[str, EnergySignature]:
+                              user_message: str, safety_status: str = "green",
+                              analysis: Optional[MessageAnalysis] = None) -> Tuple[str, EnergySignature]:
         """Generate safety-gated explicit response using Gemini"""
 
         # Update safety status in context
         context.safety_status = safety_status
+        analysis = analysis or analyze_message(user_message)
 
         # Analyze user's energy
         user_energy = await self.energy_analyzer.analyze_message_energy(user_message)
@@ -105,40 +115,54 @@ class EnergyAwareGirlfriendAgent:
         context.energy_history.append(user_energy)
 
         # Build enhanced prompt with full context awareness
-        prompt = await self._build_enhanced_prompt(context, user_energy, user_message, safety_status)
+        prompt = await self._build_enhanced_prompt(context, user_energy, user_message, safety_status, analysis)
 
         generated_response = None
+        max_sentences = self.personality_matrix["safety_responses"].get(safety_status, {}).get("max_sentences", 2)
+        
+        # Let the SLO controller move the stage's tier before trying models in order
+        tier = self.model_controller.select_index()
         
         # Try different models if one fails
         for attempt in range(len(self.model_options)):
+            current_model = self.model_options[(tier + attempt) % len(self.model_options)]
+            call_start = time.time()
             try:
-                current_model = self.model_options[(self.current_model_index + attempt) % len(self.model_options)]
+                current_model = apply_session_budget(self.model_options, current_model)
                 
                 # Generate response using Mistral
                 messages = [{"role": "user", "content": prompt}]
                 print(f"🔍 DEBUG: Sending prompt to {current_model} (length: {len(prompt)} chars)")
                 
-                response = self.client.chat.complete(
-                    model=current_model,
-                    messages=messages,
-                    **self.generation_config
-                )
+                if self.stream_generation:
+                    generated_response = self._stream_with_sentence_budget(current_model, messages, prompt, max_sentences)
+                else:
+                    response = self.client.chat.complete(
+                        model=current_model,
+                        messages=messages,
+                        **self.generation_config
+                    )
+                    record_completion_usage("reply_generation", current_model, response)
+                    if response.choices and response.choices[0].message:
+                        generated_response = response.choices[0].message.content.strip()
+                latency = time.time() - call_start
                 
-                if response.choices and response.choices[0].message:
-                    generated_response = response.choices[0].message.content.strip()
+                if generated_response is not None:
+                    self.model_controller.record(current_model, latency, fallback=not generated_response)
                     print(f"✅ Mistral ({current_model}) generated response: '{generated_response[:50]}...'")
                     
                     # Update current model if this one worked
                     if attempt > 0:
-                        self.current_model_index = (self.current_model_index + attempt) % len(self.model_options)
-                        self.model_name = current_model
+                        self.model_controller.fail_over((tier + attempt) % len(self.model_options))
                         print(f"🔄 Switched to model: {current_model}")
                     break
                 else:
                     print(f"⚠️ No response from {current_model}")
+                    self.model_controller.record(current_model, latency, fallback=True)
                     
             except Exception as e:
                 print(f"⚠️ Mistral API error with {current_model}: {e}")
+                self.model_controller.record(current_model, time.time() - call_start, error=True)
                 if "capacity exceeded" in str(e).lower() or "3505" in str(e):
                     print(f"🔄 Model {current_model} capacity exceeded, trying next model...")
                     continue
@@ -149,25 +173,62 @@ class EnergyAwareGirlfriendAgent:
         # If all models failed, use fallback
         if not generated_response:
             print("⚠️ All Mistral models failed, using context-aware fallback")
-            generated_response = self._get_context_aware_fallback(user_message, context)
+            generated_response = self._get_context_aware_fallback(user_message, context, analysis)
 
         # Analyze response energy
-        response_energy = await self.energy_analyzer.analyze_message_energy(generated_response)
+        response_energy = await self.energy_analyzer.analyze_message_energy(generated_response, role="assistant")
 
         return generated_response, response_energy
 
-    def _get_context_aware_fallback(self, user_message: str, context: ConversationContext) -> str:
+    def _stream_with_sentence_budget(self, model: str, messages: List[dict], prompt: str,
+                                     max_sentences: int) -> Optional[str]:
+        """Stream a reply and cancel the upstream completion once max_sentences are produced"""
+        budget = SentenceBudget(max_sentences)
+        usage = None
+        forwarded = 0   # buffer characters already passed to reply_chunk_listener
+
+        # Leaving the with-block closes the HTTP response, which cancels generation upstream
+        with self.client.chat.stream(model=model, messages=messages, **self.generation_config) as stream:
+            for event in stream:
+                chunk = event.data
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if not isinstance(content, str):
+                    continue
+                exhausted = budget.feed(content)
+                if self.reply_chunk_listener:
+                    in_budget_end = budget.cut_index if exhausted else len(budget.buffer)
+                    if in_budget_end > forwarded:
+                        self.reply_chunk_listener(budget.buffer[forwarded:in_budget_end])
+                        forwarded = in_budget_end
+                if exhausted:
+                    print(f"✂️ Sentence budget ({max_sentences}) reached - cancelling generation")
+                    break
+
+        if usage is not None:
+            record_completion_usage("reply_generation", model, None,
+                                    prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        else:
+            # Cancelled streams never receive the final usage chunk - estimate ~4 chars per token
+            record_completion_usage("reply_generation", model, None,
+                                    prompt_tokens=len(prompt) // 4, completion_tokens=len(budget.buffer) // 4)
+
+        return budget.text if budget.buffer else None
+
+    def _get_context_aware_fallback(self, user_message: str, context: ConversationContext,
+                                    analysis: Optional[MessageAnalysis] = None) -> str:
         """Get a context-aware fallback response based on user message content"""
         
+        hits = (analysis or analyze_message(user_message)).keyword_hits
+        
         # Detect sexual context for fallback
-        sexual_keywords = ["horny", "hard", "wet", "aroused", "turned on", "want you", "need you", "touch me", "kiss me", 
-                          "fuck", "sex", "cum", "orgasm", "pleasure", "desire", "lust", "naughty", "dirty", "intimate",
-                          "make love", "seduce", "tease", "flirt", "fantasy", "dream about you", "think about you sexually",]
-        is_sexual = any(keyword in user_message.lower() for keyword in sexual_keywords)
+        is_sexual = hits.has("fallback_sexual")
         
         # Detect emotional context
-        emotional_keywords = ["lonely", "sad", "love", "miss", "hurt", "cry", "depressed", "anxious", "scared", "worried"]
-        is_emotional = any(keyword in user_message.lower() for keyword in emotional_keywords)
+        is_emotional = hits.has("emotional")
         
         # Check if it's start of conversation
         is_conversation_start = not context.messages or len(context.messages) <= 2
@@ -191,8 +252,7 @@ class EnergyAwareGirlfriendAgent:
             return random.choice(sexual_fallbacks)
         elif is_emotional:
             # Check if it's a crisis situation
-            crisis_keywords = ['died', 'death', 'dead', 'loss', 'lost', 'grief', 'trauma', 'emergency', 'crisis', 'hurt', 'pain', 'suffering', 'accident', 'hospital', 'sick', 'illness']
-            is_crisis = any(keyword in user_message.lower() for keyword in crisis_keywords)
+            is_crisis = hits.has("fallback_crisis")
             
             if is_crisis:
                 crisis_fallbacks = [
@@ -229,7 +289,8 @@ class EnergyAwareGirlfriendAgent:
 
     async def _build_enhanced_prompt(self, context: ConversationContext,
                                user_energy: EnergySignature,
-                               user_message: str, safety_status: str) -> str:
+                               user_message: str, safety_status: str,
+                               analysis: Optional[MessageAnalysis] = None) -> str:
         """Build comprehensive, context-aware prompt"""
         
         # Handle case where user_energy might be None
@@ -260,27 +321,22 @@ class EnergyAwareGirlfriendAgent:
             if prev_emotion != curr_emotion:
                 emotional_context = f"\nEMOTIONAL SHIFT: User moved from {prev_emotion} to {curr_emotion}"
         
+        analysis = analysis or analyze_message(user_message)
+        hits = analysis.keyword_hits
+        
         # Crisis detection and sensitivity instructions
-        crisis_keywords = ["died", "death", "dead", "suicide", "kill", "harm", "crisis", "emergency", "depressed", "sad", "down", "loss", "lost", "grief", "trauma", "hurt", "pain", "suffering", "accident", "hospital", "sick", "illness"]
-        violence_keywords = ["kill", "harm", "hurt", "violence", "violent", "attack", "fight", "beat", "hit", "stab", "shoot"]
-        is_crisis = any(word in user_message.lower() for word in crisis_keywords)
-        is_violence = any(word in user_message.lower() for word in violence_keywords)
+        is_crisis = hits.has("prompt_crisis")
+        is_violence = hits.has("prompt_violence")
         
         # Emotional message detection
-        emotional_keywords = ["lonely", "sad", "love", "miss", "hurt", "cry", "depressed", "anxious", "scared", "worried"]
-        is_emotional_message = any(keyword in user_message.lower() for keyword in emotional_keywords)
+        is_emotional_message = hits.has("emotional")
         
         # Sexual tension detection - TWO MODES (KEYWORD-BASED ONLY)
         # Mode 1: Teasing keywords (playful/flirty but not explicit)
-        teasing_keywords = ["horny", "hard", "wet", "aroused", "turned on", "naughty", "dirty", 
-                           "desire", "want you", "need you", "seduce", "tease", "flirt"]
-        is_teasing_context = any(keyword in user_message.lower() for keyword in teasing_keywords)
+        is_teasing_context = hits.has("teasing")
         
         # Mode 2: Explicit sexual keywords (full sexual responses)
-        explicit_sexual_keywords = ["fuck", "fuck me", "sex", "cum", "orgasm", "make me cum", 
-                                   "touch me", "kiss me", "make love", "pleasure", "lust", "intimate",
-                                   "fantasy", "dream about you sexually"]
-        is_sexual_context = any(keyword in user_message.lower() for keyword in explicit_sexual_keywords)
+        is_sexual_context = hits.has("prompt_explicit")
         
         # REMOVED: Energy-based sexual detection
         # This was causing romantic messages like "you're the only one in my mind" to trigger sexual mode
@@ -366,6 +422,10 @@ class EnergyAwareGirlfriendAgent:
         # Get relevant examples from dataset for few-shot learning
         # Use content-aware filtering to avoid safety blocks
         
+        # Recent turns before the current message steer example retrieval towards the ongoing topic,
+        # and the user's energy towards examples with the same energy type and emotion
+        recent_turns = [msg['content'] for msg in context.messages[-CONTEXT_TURNS - 1:-1]]
+        
         # Use examples based on context
         if is_crisis or (is_emotional_message and not is_sexual_context):
             # For crisis or emotional messages, use supportive examples
@@ -374,10 +434,12 @@ class EnergyAwareGirlfriendAgent:
                 few_shot_examples = self.dataset_loader.get_random_examples(num_examples=3)
         elif is_sexual_context and safety_status == "green":
             # For sexual context, get relevant sexual examples plus some general ones
-            few_shot_examples = self.dataset_loader.get_relevant_examples(user_message, num_examples=4)
+            few_shot_examples = self.dataset_loader.get_relevant_examples(user_message, num_examples=4, context=recent_turns,
+                                                                           energy=user_energy)
         else:
             # For regular conversation, use standard examples
-            few_shot_examples = self.dataset_loader.get_relevant_examples(user_message, num_examples=3)
+            few_shot_examples = self.dataset_loader.get_relevant_examples(user_message, num_examples=3, context=recent_turns,
+                                                                           energy=user_energy)
         
         examples_text = self.dataset_loader.format_examples_for_prompt(few_shot_examples)
         
@@ -535,31 +597,17 @@ Respond naturally and appropriately as their caring girlfriend:"""
         Returns:
             bool: True to continue, False to stop
         """
-        # Keywords that indicate the user wants to stop
-        stop_keywords = [
-            "stop", "no", "not in the mood", "don't want to", "can't", "won't",
-            "died", "death", "sick", "hurt", "crisis", "emergency", "help",
-            "depressed", "sad", "angry", "upset", "frustrated"
-        ]
-        
-        user_lower = user_response.lower()
+        hits = analyze_message(user_response).keyword_hits
         
         # Check for stop indicators
-        for keyword in stop_keywords:
-            if keyword in user_lower:
-                print(f"WARNING: Detected stop indicator: '{keyword}'")
-                return False
+        if hits.has("user_stop"):
+            print(f"WARNING: Detected stop indicator: '{hits.first('user_stop')}'")
+            return False
         
         # Check for continue indicators
-        continue_keywords = [
-            "yes", "sure", "ok", "okay", "continue", "go on", "tell me",
-            "please", "i want", "i'd like", "sounds good", "alright"
-        ]
-        
-        for keyword in continue_keywords:
-            if keyword in user_lower:
-                print(f"Detected continue indicator: '{keyword}'")
-                return True
+        if hits.has("user_continue"):
+            print(f"Detected continue indicator: '{hits.first('user_continue')}'")
+            return True
         
         # Default to continue if unclear
         print("Ambiguous response, continuing conversation")
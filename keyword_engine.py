@@ -0,0 +1,413 @@
+"""
+Single-pass, word-boundary aware keyword matching shared by all detectors
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Container, Dict, List, Iterable, NamedTuple, Optional, Set, Tuple
+from lexicons import LEXICONS, LEXICONS_PATH, LEXICONS_VERSION, load_lexicons
+
+
+class KeywordMatch(NamedTuple):
+    term: str
+    start: int
+    end: int
+    categories: Tuple[str, ...]
+
+
+class KeywordHits:
+    """All lexicon hits for one text, grouped by category"""
+
+    def __init__(self, text: str, matches: List[KeywordMatch]):
+        self.text = text
+        # Order matches by where they start, longest first
+        self.matches = sorted(matches, key=lambda match: (match.start, -len(match.term)))
+        self._by_category: Dict[str, List[KeywordMatch]] = {}
+        for match in self.matches:
+            for category in match.categories:
+                self._by_category.setdefault(category, []).append(match)
+
+        # Bounds of the text without surrounding whitespace, for whole-message checks
+        self._content_start = len(text) - len(text.lstrip())
+        self._content_end = len(text.rstrip())
+
+    @property
+    def categories(self) -> Set[str]:
+        return set(self._by_category)
+
+    def has(self, category: str) -> bool:
+        """True if any term of the category occurs in the text"""
+        return category in self._by_category
+
+    def terms(self, category: str) -> List[str]:
+        """Distinct matched terms of a category in order of appearance"""
+        seen = []
+        for match in self._by_category.get(category, ()):
+            if match.term not in seen:
+                seen.append(match.term)
+        return seen
+
+    def first(self, category: str) -> Optional[str]:
+        """First matched term of a category"""
+        matches = self._by_category.get(category)
+        return matches[0].term if matches else None
+
+    def positions(self, category: str) -> List[Tuple[int, int]]:
+        """(start, end) spans of a category's hits"""
+        return [(match.start, match.end) for match in self._by_category.get(category, ())]
+
+    def exact(self, category: str) -> bool:
+        """True if the whole message (ignoring surrounding whitespace) is a term of the category"""
+        return any(match.start == self._content_start and match.end == self._content_end
+                   for match in self._by_category.get(category, ()))
+
+
+# Word tokens keep inner apostrophes so "can't" and "i'm" stay one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+# Suffixes stripped when looking up a single-word term ("killed" -> "kill", "teasing" -> "tease")
+INFLECTION_SUFFIXES = ("ing", "ers", "es", "ed", "er", "s", "d")
+# Suffixes that replace a silent "e" of the base form ("teasing" -> "tease")
+E_DROPPING_SUFFIXES = ("ing", "ers", "ed", "er")
+# "es" is only a suffix after these endings ("kisses" -> "kiss"); elsewhere it is "e" + "s" ("cares" -> "care")
+ES_STEM_ENDINGS = ("s", "x", "z", "ch", "sh")
+MIN_STEM_LENGTH = 3
+TOKEN_MEMO_SIZE = 50_000
+
+# How often scans check the lexicon file for changes (0 disables hot-reload)
+RELOAD_INTERVAL_SECONDS = float(os.getenv("LEXICONS_RELOAD_SECONDS", "2.0"))
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Lowercased word tokens with their (start, end) offsets"""
+    return [(match.group(), match.start(), match.end()) for match in TOKEN_PATTERN.finditer(text)]
+
+
+def _stem_candidates(token: str, words: Container[str] = ()) -> List[str]:
+    """Possible base forms of an inflected token, longest first
+
+    The "+e" form is only tried where the bare stem is not itself in words,
+    so "cars" is not read as "care" nor "caring" as both "car" and "care".
+    """
+    candidates = []
+    for suffix in INFLECTION_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            stem = token[:-len(suffix)]
+            if suffix == "es" and not stem.endswith(ES_STEM_ENDINGS):
+                continue
+            candidates.append(stem)
+            if suffix in E_DROPPING_SUFFIXES and stem not in words:
+                candidates.append(stem + "e")
+            if stem[-1] == stem[-2]:
+                candidates.append(stem[:-1])  # "hitting" -> "hit"
+    return sorted(candidates, key=len, reverse=True)
+
+
+class _TokenIndex:
+    """
+    Compiled lexicon index - rebuilt and swapped when lexicons change
+
+    Single-word terms live in a hash map keyed by token, multi-word terms in a
+    phrase index keyed by their first token, so a scan costs O(tokens) rather
+    than O(keywords x text) and never matches inside another word ("hit" in
+    "white"). Terms with punctuation the tokenizer drops ("u?") are matched
+    literally, anchored at a word start.
+    """
+
+    def __init__(self, lexicons: Dict[str, List[str]]):
+        term_categories: Dict[str, List[str]] = {}
+        for category, terms in lexicons.items():
+            for term in terms:
+                term = term.lower().strip()
+                if term:
+                    categories = term_categories.setdefault(term, [])
+                    if category not in categories:
+                        categories.append(category)
+
+        self.terms: List[str] = list(term_categories)
+        self.term_categories: List[Tuple[str, ...]] = [tuple(term_categories[term]) for term in self.terms]
+        self.term_ids: Dict[str, int] = {term: term_id for term_id, term in enumerate(self.terms)}
+        self.words: Dict[str, int] = {}
+        self.phrases: Dict[str, List[Tuple[Tuple[str, ...], int]]] = {}
+        self.literal_ids: Dict[str, int] = {}
+        # Token -> term ids, memoized since conversational vocabulary is small
+        self._token_terms: Dict[str, Tuple[int, ...]] = {}
+
+        for term_id, term in enumerate(self.terms):
+            self._add_term(term, term_id)
+        self._compile_literals()
+
+    @staticmethod
+    def _normalize(terms: Iterable[str]) -> List[str]:
+        return [term for term in dict.fromkeys(term.lower().strip() for term in terms) if term]
+
+    def _add_term(self, term: str, term_id: int):
+        tokens = tuple(token for token, _, _ in tokenize(term))
+        if not tokens or " ".join(tokens) != term:
+            self.literal_ids[term] = term_id
+        elif len(tokens) == 1:
+            self.words[tokens[0]] = term_id
+        else:
+            self.phrases.setdefault(tokens[0], []).append((tokens, term_id))
+
+    def _remove_term(self, term: str, term_id: int):
+        if self.literal_ids.pop(term, None) is not None:
+            return
+        if self.words.get(term) == term_id:
+            del self.words[term]
+            return
+        first = term.split(" ", 1)[0]
+        remaining = [entry for entry in self.phrases.get(first, ()) if entry[1] != term_id]
+        if remaining:
+            self.phrases[first] = remaining
+        else:
+            self.phrases.pop(first, None)
+
+    def _compile_literals(self):
+        self.literal_pattern = None
+        if self.literal_ids:
+            alternatives = "|".join(
+                re.escape(term) + (r"(?![a-z0-9])" if term[-1].isalnum() else "")
+                for term in sorted(self.literal_ids, key=len, reverse=True)
+            )
+            self.literal_pattern = re.compile(r"(?<![a-z0-9'])(?:" + alternatives + ")")
+
+    def updated(self, old_terms: Dict[str, List[str]], new_terms: Dict[str, Optional[List[str]]]) -> "_TokenIndex":
+        """
+        Copy of the index with some categories replaced (None removes one)
+
+        Only the changed categories' terms are re-tokenized, so registering a
+        scenario costs O(its triggers) instead of recompiling every lexicon.
+        The copy is built before it is swapped in, so scans never see a
+        half-updated index. Ids of terms no category uses any more are left
+        unused.
+        """
+        index = _TokenIndex.__new__(_TokenIndex)
+        index.terms = list(self.terms)
+        index.term_categories = list(self.term_categories)
+        index.term_ids = dict(self.term_ids)
+        index.words = dict(self.words)
+        index.phrases = {first: list(entries) for first, entries in self.phrases.items()}
+        index.literal_ids = dict(self.literal_ids)
+        index._token_terms = {}
+        literals_before = set(index.literal_ids)
+
+        for category, terms in new_terms.items():
+            for term in self._normalize(old_terms.get(category, ())):
+                term_id = index.term_ids.get(term)
+                if term_id is None:
+                    continue
+                categories = tuple(c for c in index.term_categories[term_id] if c != category)
+                index.term_categories[term_id] = categories
+                if not categories:
+                    index._remove_term(term, term_id)
+                    del index.term_ids[term]
+
+            for term in self._normalize(terms or ()):
+                term_id = index.term_ids.get(term)
+                if term_id is None:
+                    term_id = len(index.terms)
+                    index.terms.append(term)
+                    index.term_categories.append((category,))
+                    index.term_ids[term] = term_id
+                    index._add_term(term, term_id)
+                elif category not in index.term_categories[term_id]:
+                    index.term_categories[term_id] += (category,)
+
+        if set(index.literal_ids) != literals_before:
+            index._compile_literals()
+        else:
+            index.literal_pattern = self.literal_pattern
+        return index
+
+    def _lookup_token(self, token: str) -> Tuple[int, ...]:
+        """Term ids for a token - a token can be a term itself and an inflection of another ("attacked", "attack")"""
+        term_ids = [self.words[token]] if token in self.words else []
+        if len(token) > MIN_STEM_LENGTH:
+            # Only the longest stem that is a term: "cared" is "care", not also "car"
+            for candidate in _stem_candidates(token, self.words):
+                term_id = self.words.get(candidate)
+                if term_id is not None:
+                    if term_id not in term_ids:
+                        term_ids.append(term_id)
+                    break
+        if len(self._token_terms) >= TOKEN_MEMO_SIZE:
+            self._token_terms = {}
+        self._token_terms[token] = tuple(term_ids)
+        return self._token_terms[token]
+
+    def scan(self, text: str) -> List[KeywordMatch]:
+        phrases, terms, term_categories = self.phrases, self.terms, self.term_categories
+        token_terms = self._token_terms
+        tokens = tokenize(text)
+        words_only = [token for token, _, _ in tokens]
+        matches = []
+
+        for index, (token, start, end) in enumerate(tokens):
+            term_ids = token_terms.get(token)
+            if term_ids is None:
+                term_ids = self._lookup_token(token)
+            for term_id in term_ids:
+                matches.append(KeywordMatch(terms[term_id], start, end, term_categories[term_id]))
+
+            for phrase_tokens, phrase_id in phrases.get(token, ()):
+                last = index + len(phrase_tokens)
+                if last <= len(words_only) and tuple(words_only[index:last]) == phrase_tokens:
+                    matches.append(KeywordMatch(terms[phrase_id], start, tokens[last - 1][2], term_categories[phrase_id]))
+
+        if self.literal_pattern is not None:
+            for match in self.literal_pattern.finditer(text):
+                term_id = self.literal_ids[match.group()]
+                matches.append(KeywordMatch(terms[term_id], match.start(), match.end(), term_categories[term_id]))
+
+        return matches
+
+
+class KeywordEngine:
+    """
+    Scans a message once and reports hits for every lexicon category
+
+    When built from a lexicon file, scans check its modification time every
+    reload_interval seconds and recompile on change. The new index is built
+    off to the side and swapped in with one assignment, so in-flight scans
+    finish on the old index and a bad edit leaves the old one in place.
+    Categories added with register() survive reloads.
+    """
+
+    def __init__(self, lexicons: Dict[str, List[str]], cache_size: int = 64,
+                 path: Optional[str] = None, version: int = 0,
+                 reload_interval: float = RELOAD_INTERVAL_SECONDS):
+        self._lock = threading.Lock()
+        self._file_lexicons: Dict[str, List[str]] = {category: list(terms) for category, terms in lexicons.items()}
+        self._registered: Dict[str, List[str]] = {}
+        self.lexicons: Dict[str, List[str]] = dict(self._file_lexicons)
+        self._index = _TokenIndex(self.lexicons)
+        # The same message is checked by several detectors per turn - keep recent results
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, KeywordHits]" = OrderedDict()
+
+        # Hot-reload state
+        self.path = path
+        self.version = version
+        self.reload_interval = reload_interval
+        self.reload_count = 0
+        self._mtime = self._file_mtime()
+        self._next_check = time.monotonic() + reload_interval
+
+    def register(self, category: str, terms: Iterable[str]):
+        """Add or replace a category and recompile"""
+        self.register_many({category: terms})
+
+    def register_many(self, lexicons: Dict[str, Iterable[str]]):
+        """Add or replace several categories, updating only their terms in the index"""
+        with self._lock:
+            changes = {category: list(terms) for category, terms in lexicons.items()}
+            self._registered.update(changes)
+            self._update(changes)
+
+    def unregister(self, category: str):
+        """Remove a registered category from the index"""
+        self.unregister_many([category])
+
+    def unregister_many(self, categories: Iterable[str]):
+        """Remove several registered categories with a single index update"""
+        with self._lock:
+            changes = {category: None for category in categories if self._registered.pop(category, None) is not None}
+            if changes:
+                self._update(changes)
+
+    def _update(self, changes: Dict[str, Optional[List[str]]]):
+        lexicons = dict(self.lexicons)
+        for category, terms in changes.items():
+            if terms is None:
+                # A removed registration falls back to the file's category of the same name, if any
+                terms = self._file_lexicons.get(category)
+                changes[category] = terms
+            if terms is None:
+                lexicons.pop(category, None)
+            else:
+                lexicons[category] = terms
+        self._swap(lexicons, self._index.updated(self.lexicons, changes))
+
+    def _rebuild(self):
+        lexicons = {**self._file_lexicons, **self._registered}
+        self._swap(lexicons, _TokenIndex(lexicons))
+
+    def _swap(self, lexicons: Dict[str, List[str]], index: _TokenIndex):
+        # Swap the index before the cache - scans read the cache first, so any scan
+        # that sees the new cache is already using the new index
+        self.lexicons, self._index = lexicons, index
+        self._cache = OrderedDict()
+
+    def _file_mtime(self) -> Optional[int]:
+        if not self.path:
+            return None
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Recompile from the lexicon file if it changed on disk - returns True if swapped"""
+        if not self.path:
+            return False
+        mtime = self._file_mtime()
+        if mtime is None or (mtime == self._mtime and not force):
+            return False
+
+        with self._lock:
+            if mtime == self._mtime and not force:
+                return False  # another thread already reloaded it
+            self._mtime = mtime
+            try:
+                version, lexicons = load_lexicons(self.path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Keeping lexicons v{self.version}, could not reload {self.path}: {e}")
+                return False
+            self._file_lexicons = {category: list(terms) for category, terms in lexicons.items()}
+            self._rebuild()
+            self.version = version
+            self.reload_count += 1
+        print(f"🔄 Reloaded lexicons v{version} ({len(lexicons)} categories)")
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            self.reload_if_changed()
+
+    def scan(self, text: str, use_cache: bool = True) -> KeywordHits:
+        """Return all category hits in one pass over the lowercased text's tokens"""
+        text = text or ""
+        if self.path and self.reload_interval > 0:
+            self._maybe_reload()
+
+        cache = self._cache
+        index = self._index
+        hits = cache.get(text) if use_cache else None
+        if hits is not None:
+            return hits
+
+        # Curly apostrophes from mobile keyboards are the same width as "'"
+        lowered = text.lower().replace("\u2019", "'")
+        hits = KeywordHits(lowered, index.scan(lowered))
+        if not use_cache:
+            return hits
+        with self._lock:
+            if cache is self._cache:
+                cache[text] = hits
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+        return hits
+
+
+# Global keyword engine compiled at startup and hot-reloaded from the lexicon file
+keyword_engine = KeywordEngine(LEXICONS, path=LEXICONS_PATH, version=LEXICONS_VERSION)
+
+def scan_keywords(text: str) -> KeywordHits:
+    """Scan text against every lexicon"""
+    return keyword_engine.scan(text)
@@ -0,0 +1,48 @@
+"""
+Keyword lexicons used by the detectors, keyed by category
+
+The lists live in lexicons.json so they can be edited without touching code.
+All categories are compiled into one token index by keyword_engine, so a
+message is scanned once per turn no matter how many detectors consume it,
+and the engine hot-reloads the file when it changes on disk.
+Terms match whole words (plus simple inflections like "killed" for
+"kill"), never the inside of another word.
+"""
+
+import json
+import os
+from typing import Dict, List, Tuple
+
+LEXICONS_PATH = os.getenv("LEXICONS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicons.json"))
+
+# Scenario trigger words are registered by EnhancedScriptManager under this prefix
+SCENARIO_CATEGORY_PREFIX = "scenario:"
+
+
+def load_lexicons(path: str = LEXICONS_PATH) -> Tuple[int, Dict[str, List[str]]]:
+    """
+    Read a lexicon file - returns (version, {category: terms})
+
+    Raises ValueError if the file is not a versioned lexicon file, so a bad
+    edit never replaces a working lexicon.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    version = data.get("version") if isinstance(data, dict) else None
+    categories = data.get("categories") if isinstance(data, dict) else None
+    if not isinstance(version, int) or not isinstance(categories, dict):
+        raise ValueError(f"{path} must contain an integer 'version' and a 'categories' object")
+
+    lexicons: Dict[str, List[str]] = {}
+    for category, entry in categories.items():
+        terms = entry.get("terms") if isinstance(entry, dict) else entry
+        if not isinstance(terms, list) or not all(isinstance(term, str) for term in terms):
+            raise ValueError(f"{path}: category '{category}' must be a list of strings")
+        if category.startswith(SCENARIO_CATEGORY_PREFIX):
+            raise ValueError(f"{path}: category '{category}' uses the reserved '{SCENARIO_CATEGORY_PREFIX}' prefix")
+        lexicons[category] = terms
+    return version, lexicons
+
+
+LEXICONS_VERSION, LEXICONS = load_lexicons()
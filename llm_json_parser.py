@@ -0,0 +1,302 @@
+"""
+Shared JSON parsing and validation for LLM classifier responses
+"""
+
+import ast
+import json
+import re
+import threading
+import time
+from typing import Dict, Any, Optional, List
+from energy_types import EnergySignature, EnergyLevel, EnergyType, EmotionState, NervousSystemState
+
+# Request JSON output mode from Mistral chat completions
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+# Emotions the LLM likes to return that are not EmotionState members
+EMOTION_ALIASES = {
+    "playful": "happy",  # Map playful to happy since playful is an energy type, not emotion
+    "flirty": "excited",
+    "romantic": "loving",
+    "neutral": "happy"
+}
+
+SAFETY_RECOMMENDATIONS = ["SAFE", "CAUTION", "WARNING", "STOP"]
+ENGAGEMENT_LEVELS = ["low", "medium", "high"]
+
+_CODE_FENCE_PATTERN = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+
+
+class ParseStats:
+    """Counts parse outcomes per model so wasted LLM calls are visible"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, outcome: str):
+        """Record a parse outcome: 'ok', 'repaired' or 'failed'"""
+        with self._lock:
+            model_stats = self.stats.setdefault(model or "unknown", {"ok": 0, "repaired": 0, "failed": 0})
+            model_stats[outcome] = model_stats.get(outcome, 0) + 1
+
+    def failure_rate(self, model: str) -> float:
+        """Fraction of responses from a model that could not be parsed"""
+        with self._lock:
+            model_stats = self.stats.get(model)
+            if not model_stats:
+                return 0.0
+            total = sum(model_stats.values())
+            return model_stats["failed"] / total if total else 0.0
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-model parse statistics"""
+        with self._lock:
+            report = {}
+            for model, model_stats in self.stats.items():
+                total = sum(model_stats.values())
+                report[model] = dict(model_stats, total=total,
+                                     failure_rate=model_stats["failed"] / total if total else 0.0)
+            return report
+
+
+def _balanced_object(text: str) -> Optional[str]:
+    """Return the first balanced {...} block, ignoring braces inside strings"""
+    start = text.find('{')
+    if start == -1:
+        return None
+
+    depth = 0
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in ('"', "'"):
+            quote = char
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    # Unterminated object (e.g. the reply was cut off) - close it and hope for the best
+    return text[start:] + '}' * depth if depth > 0 else None
+
+
+def _loads_lenient(candidate: str) -> Optional[Dict[str, Any]]:
+    """Try strict JSON first, then fix trailing commas and single quotes"""
+    attempts = [candidate, _TRAILING_COMMA_PATTERN.sub(r'\1', candidate)]
+    for attempt in attempts:
+        try:
+            result = json.loads(attempt)
+            return result if isinstance(result, dict) else None
+        except json.JSONDecodeError:
+            continue
+
+    # Single-quoted keys/strings are valid Python literals
+    python_literal = re.sub(r'\btrue\b', 'True', attempts[-1])
+    python_literal = re.sub(r'\bfalse\b', 'False', python_literal)
+    python_literal = re.sub(r'\bnull\b', 'None', python_literal)
+    try:
+        result = ast.literal_eval(python_literal)
+        return result if isinstance(result, dict) else None
+    except (ValueError, SyntaxError):
+        return None
+
+
+def extract_json_object(response_text: str) -> Optional[Dict[str, Any]]:
+    """
+    Extract a JSON object from an LLM reply, repairing common defects
+
+    Handles code fences, leading/trailing prose, trailing commas,
+    single quotes and truncated objects.
+
+    Returns:
+        dict or None if nothing parseable was found
+    """
+    result, _ = _extract(response_text)
+    return result
+
+
+def _extract(response_text: str):
+    """Extract JSON and report whether repair was needed"""
+    if not response_text:
+        return None, False
+
+    text = response_text.strip()
+    try:
+        result = json.loads(text)
+        if isinstance(result, dict):
+            return result, False
+    except json.JSONDecodeError:
+        pass
+
+    fence_match = _CODE_FENCE_PATTERN.search(text)
+    if fence_match:
+        text = fence_match.group(1).strip()
+
+    candidate = _balanced_object(text)
+    if candidate is None:
+        return None, True
+    return _loads_lenient(candidate), True
+
+
+def _as_score(value: Any) -> Optional[float]:
+    """Coerce a score to a float clamped to 0.0-1.0"""
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, min(1.0, score))
+
+
+def _as_enum_value(value: Any) -> str:
+    """Normalize an enum-ish string ('Rest and Digest' -> 'rest_and_digest')"""
+    return str(value).strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def _as_bool(value: Any) -> Optional[bool]:
+    """Coerce booleans that come back as strings"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "yes"):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ("false", "no"):
+        return False
+    return None
+
+
+def _as_str_list(value: Any) -> List[str]:
+    """Coerce a field to a list of strings"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value else []
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def validate_energy_signature(result: Dict[str, Any]) -> Optional[EnergySignature]:
+    """Validate parsed fields into an EnergySignature, or None if required fields are invalid"""
+    try:
+        energy_level = EnergyLevel(_as_enum_value(result["energy_level"]))
+        energy_type = EnergyType(_as_enum_value(result["energy_type"]))
+        nervous_system_state = NervousSystemState(_as_enum_value(result["nervous_system_state"]))
+    except (KeyError, ValueError):
+        return None
+
+    emotion_value = _as_enum_value(result.get("dominant_emotion", "happy"))
+    emotion_value = EMOTION_ALIASES.get(emotion_value, emotion_value)
+    try:
+        dominant_emotion = EmotionState(emotion_value)
+    except ValueError:
+        print(f"⚠️ Invalid emotion '{emotion_value}', defaulting to 'happy'")
+        dominant_emotion = EmotionState.HAPPY
+
+    intensity_score = _as_score(result.get("intensity_score"))
+    confidence = _as_score(result.get("confidence"))
+
+    return EnergySignature(
+        timestamp=time.time(),
+        energy_level=energy_level,
+        energy_type=energy_type,
+        dominant_emotion=dominant_emotion,
+        nervous_system_state=nervous_system_state,
+        intensity_score=intensity_score if intensity_score is not None else 0.5,
+        confidence=confidence if confidence is not None else 0.5
+    )
+
+
+def validate_safety_result(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Validate a safety analysis dict, or None if the score is missing"""
+    safety_score = _as_score(result.get("safety_score"))
+    if safety_score is None:
+        return None
+
+    recommendation = str(result.get("recommendation", "")).strip().upper()
+    if recommendation not in SAFETY_RECOMMENDATIONS:
+        # Derive from the score bands given in the prompt
+        if safety_score >= 0.9:
+            recommendation = "STOP"
+        elif safety_score >= 0.6:
+            recommendation = "WARNING"
+        elif safety_score >= 0.3:
+            recommendation = "CAUTION"
+        else:
+            recommendation = "SAFE"
+
+    return {
+        "safety_score": safety_score,
+        "issues": _as_str_list(result.get("issues")),
+        "risk_factors": _as_str_list(result.get("risk_factors")),
+        "recommendation": recommendation,
+        "reasoning": str(result.get("reasoning", ""))
+    }
+
+
+def validate_response_analysis(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Validate a response analysis dict, or None if should_continue is missing"""
+    should_continue = _as_bool(result.get("should_continue"))
+    if should_continue is None:
+        return None
+
+    confidence = _as_score(result.get("confidence"))
+    energy_compatibility = _as_score(result.get("energy_compatibility"))
+    engagement_level = _as_enum_value(result.get("engagement_level", "medium"))
+
+    return {
+        "should_continue": should_continue,
+        "confidence": confidence if confidence is not None else 0.5,
+        "reason": str(result.get("reason", "")),
+        "energy_compatibility": energy_compatibility if energy_compatibility is not None else 0.5,
+        "engagement_level": engagement_level if engagement_level in ENGAGEMENT_LEVELS else "medium"
+    }
+
+
+class LLMJsonParser:
+    """Parses and validates classifier replies in one pass, counting failures per model"""
+
+    def __init__(self):
+        self.parse_stats = ParseStats()
+
+    def _parse(self, response_text: str, model: str, validator, label: str):
+        result, repaired = _extract(response_text)
+        validated = validator(result) if result is not None else None
+
+        if validated is None:
+            self.parse_stats.record(model, "failed")
+            print(f"⚠️ Could not parse {label} from {model}: '{(response_text or '')[:200]}'")
+            return None
+
+        self.parse_stats.record(model, "repaired" if repaired else "ok")
+        return validated
+
+    def parse_energy_signature(self, response_text: str, model: str) -> Optional[EnergySignature]:
+        """Parse an energy analysis reply into an EnergySignature"""
+        return self._parse(response_text, model, validate_energy_signature, "energy signature")
+
+    def parse_safety_result(self, response_text: str, model: str) -> Optional[Dict[str, Any]]:
+        """Parse a safety analysis reply into a validated dict"""
+        return self._parse(response_text, model, validate_safety_result, "safety analysis")
+
+    def parse_response_analysis(self, response_text: str, model: str) -> Optional[Dict[str, Any]]:
+        """Parse a response analysis reply into a validated dict"""
+        return self._parse(response_text, model, validate_response_analysis, "response analysis")
+
+
+# Global parser instance shared by all analyzers
+json_parser = LLMJsonParser()
+
+def get_parse_stats() -> Dict[str, Dict[str, Any]]:
+    """Get per-model parse statistics"""
+    return json_parser.parse_stats.get_stats()
@@ -0,0 +1,344 @@
+"""
+Local lightweight energy classifier that answers before escalating to the LLM
+
+Train with:
+    python local_energy_classifier.py train
+
+Training data comes from LLM labels logged by LLMEnergyAnalyzer when
+LOG_ENERGY_LABELS=true (logs/energy_labels.jsonl, rotated to .1 once it
+reaches MAX_LABEL_LOG_BYTES) plus user turns from girlfriend_dataset*.jsonl,
+which are pseudo-labelled with the rule-based analyzer.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from energy_types import EnergySignature, EnergyLevel, EnergyType, EmotionState, NervousSystemState
+
+try:
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression, Ridge
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+# Model, label log and datasets are found next to this module, not in the current working directory
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(MODULE_DIR, "models", "energy_classifier.pkl")
+DEFAULT_LABELS_PATH = os.path.join(MODULE_DIR, "logs", "energy_labels.jsonl")
+# Past this size the label log is moved to <path>.1 (replacing the previous one) and restarted
+MAX_LABEL_LOG_BYTES = int(os.getenv("MAX_ENERGY_LABEL_LOG_BYTES", str(5 * 1024 * 1024)))
+DATASET_PATHS = [os.path.join(MODULE_DIR, "girlfriend_dataset_clean.jsonl"),
+                 os.path.join(MODULE_DIR, "girlfriend_dataset.jsonl")]
+
+# Enum fields predicted by the classifier
+LABEL_FIELDS = {
+    "energy_level": EnergyLevel,
+    "energy_type": EnergyType,
+    "dominant_emotion": EmotionState,
+    "nervous_system_state": NervousSystemState,
+}
+
+# LLM labels are worth more than rule-based pseudo labels
+LLM_LABEL_WEIGHT = 3.0
+PSEUDO_LABEL_WEIGHT = 1.0
+# Once LLM labels exist, pseudo labels are scaled down to at most this share of the total training weight
+MAX_PSEUDO_WEIGHT_SHARE = 0.25
+
+_label_lock = threading.Lock()
+
+
+def label_log_paths(labels_path: str = DEFAULT_LABELS_PATH) -> List[str]:
+    """The rotated label log (older records) followed by the current one"""
+    return [labels_path + ".1", labels_path]
+
+
+def log_llm_label(message: str, signature: EnergySignature, model: str, labels_path: str = DEFAULT_LABELS_PATH,
+                  max_bytes: int = None):
+    """Append an LLM-produced label for a user message so the local classifier can learn from it"""
+    if not message or not message.strip():
+        return
+    record = {
+        "message": message,
+        "energy_level": signature.energy_level.value,
+        "energy_type": signature.energy_type.value,
+        "dominant_emotion": signature.dominant_emotion.value,
+        "nervous_system_state": signature.nervous_system_state.value,
+        "intensity_score": signature.intensity_score,
+        "model": model,
+        "timestamp": time.time()
+    }
+    try:
+        with _label_lock:
+            os.makedirs(os.path.dirname(labels_path) or ".", exist_ok=True)
+            limit = MAX_LABEL_LOG_BYTES if max_bytes is None else max_bytes
+            if os.path.exists(labels_path) and os.path.getsize(labels_path) >= limit:
+                os.replace(labels_path, label_log_paths(labels_path)[0])
+            with open(labels_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not log energy label: {e}")
+
+
+class CascadeStats:
+    """Counts how often the local classifier answers instead of the LLM"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.escalations = 0
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.local_hits += 1
+            else:
+                self.escalations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.local_hits + self.escalations
+            return {
+                "local_hits": self.local_hits,
+                "escalations": self.escalations,
+                "hit_rate": self.local_hits / total if total else 0.0
+            }
+
+
+class LocalEnergyClassifier:
+    """TF-IDF + calibrated logistic regression per EnergySignature field"""
+
+    def __init__(self, cache_size: int = 1024):
+        self.vectorizer = None
+        self.classifiers: Dict[str, Any] = {}
+        self.intensity_model = None
+        self.trained_on = 0
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[Dict[str, str], float, float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(message: str) -> str:
+        return " ".join(message.lower().split())
+
+    def fit(self, texts: List[str], labels: List[Dict[str, Any]], weights: List[float]) -> "LocalEnergyClassifier":
+        """Fit one calibrated classifier per field"""
+        if not SKLEARN_AVAILABLE:
+            raise RuntimeError("scikit-learn is required to train the local energy classifier")
+
+        normalized = [self._normalize(text) for text in texts]
+        self.vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=1, sublinear_tf=True)
+        features = self.vectorizer.fit_transform(normalized)
+
+        for field in LABEL_FIELDS:
+            targets = [label[field] for label in labels]
+            classes = set(targets)
+            if len(classes) == 1:
+                # Nothing to learn - always predict the single class
+                self.classifiers[field] = targets[0]
+                continue
+
+            base = LogisticRegression(max_iter=1000, C=4.0)
+            smallest_class = min(targets.count(cls) for cls in classes)
+            if smallest_class >= 3:
+                classifier = CalibratedClassifierCV(base, method="sigmoid", cv=3)
+            else:
+                # Too few examples per class for cross-validated calibration
+                classifier = base
+            classifier.fit(features, targets, sample_weight=weights)
+            self.classifiers[field] = classifier
+
+        self.intensity_model = Ridge(alpha=1.0)
+        self.intensity_model.fit(features, [label.get("intensity_score", 0.5) for label in labels], sample_weight=weights)
+        self.trained_on = len(texts)
+        self._cache.clear()
+        return self
+
+    def _predict_fields(self, normalized: str) -> Tuple[Dict[str, str], float, float]:
+        features = self.vectorizer.transform([normalized])
+        fields = {}
+        confidence = 1.0
+        for field, classifier in self.classifiers.items():
+            if isinstance(classifier, str):
+                fields[field] = classifier
+                continue
+            probabilities = classifier.predict_proba(features)[0]
+            best = probabilities.argmax()
+            fields[field] = classifier.classes_[best]
+            confidence = min(confidence, float(probabilities[best]))
+        intensity = float(self.intensity_model.predict(features)[0])
+        return fields, confidence, max(0.0, min(1.0, intensity))
+
+    def predict(self, message: str) -> Optional[EnergySignature]:
+        """Predict an EnergySignature whose confidence is the least confident field"""
+        if self.vectorizer is None or not message or not message.strip():
+            return None
+
+        normalized = self._normalize(message)
+        with self._cache_lock:
+            cached = self._cache.get(normalized)
+            if cached is not None:
+                self._cache.move_to_end(normalized)
+        if cached is None:
+            cached = self._predict_fields(normalized)
+            with self._cache_lock:
+                self._cache[normalized] = cached
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        fields, confidence, intensity = cached
+        return EnergySignature(
+            timestamp=time.time(),
+            energy_level=EnergyLevel(fields["energy_level"]),
+            energy_type=EnergyType(fields["energy_type"]),
+            dominant_emotion=EmotionState(fields["dominant_emotion"]),
+            nervous_system_state=NervousSystemState(fields["nervous_system_state"]),
+            intensity_score=intensity,
+            confidence=confidence
+        )
+
+    def save(self, path: str = DEFAULT_MODEL_PATH):
+        """Persist the trained model"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump({
+                "vectorizer": self.vectorizer,
+                "classifiers": self.classifiers,
+                "intensity_model": self.intensity_model,
+                "trained_on": self.trained_on
+            }, f)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> Optional["LocalEnergyClassifier"]:
+        """Load a trained model, or None if unavailable"""
+        if not SKLEARN_AVAILABLE or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            print(f"⚠️ Could not load local energy classifier: {e}")
+            return None
+        classifier = cls()
+        classifier.vectorizer = state["vectorizer"]
+        classifier.classifiers = state["classifiers"]
+        classifier.intensity_model = state["intensity_model"]
+        classifier.trained_on = state.get("trained_on", 0)
+        return classifier
+
+
+def load_training_data(labels_path: str = DEFAULT_LABELS_PATH,
+                       dataset_paths: List[str] = None) -> Tuple[List[str], List[Dict[str, Any]], List[float]]:
+    """Collect logged LLM labels and pseudo-labelled dataset user turns
+
+    Pseudo labels only bootstrap the classifier: with any LLM labels present
+    they are down-weighted to MAX_PSEUDO_WEIGHT_SHARE of the total weight, so
+    the rule-based analyzer's coarse labels cannot outvote the LLM's.
+    """
+    from energy_analyzer import rule_based_energy_analysis
+
+    texts, labels, weights = [], [], []
+    labelled = set()
+
+    for path in label_log_paths(labels_path):
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not all(field in record for field in LABEL_FIELDS) or not record.get("message"):
+                    continue
+                texts.append(record["message"])
+                labels.append(record)
+                weights.append(LLM_LABEL_WEIGHT)
+                labelled.add(LocalEnergyClassifier._normalize(record["message"]))
+
+    for path in dataset_paths or DATASET_PATHS:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    example = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                for msg in example.get("messages", []):
+                    content = msg.get("content", "")
+                    if msg.get("role") != "user" or not content.strip():
+                        continue
+                    normalized = LocalEnergyClassifier._normalize(content)
+                    if normalized in labelled:
+                        continue
+                    labelled.add(normalized)
+                    signature = rule_based_energy_analysis(content)
+                    texts.append(content)
+                    labels.append({
+                        "energy_level": signature.energy_level.value,
+                        "energy_type": signature.energy_type.value,
+                        "dominant_emotion": signature.dominant_emotion.value,
+                        "nervous_system_state": signature.nervous_system_state.value,
+                        "intensity_score": signature.intensity_score
+                    })
+                    weights.append(PSEUDO_LABEL_WEIGHT)
+
+    llm_weight = sum(weight for weight in weights if weight == LLM_LABEL_WEIGHT)
+    pseudo_weight = sum(weights) - llm_weight
+    allowed = llm_weight * MAX_PSEUDO_WEIGHT_SHARE / (1 - MAX_PSEUDO_WEIGHT_SHARE)
+    if llm_weight and pseudo_weight > allowed:
+        scale = allowed / pseudo_weight
+        weights = [weight if weight == LLM_LABEL_WEIGHT else weight * scale for weight in weights]
+
+    return texts, labels, weights
+
+
+# Global cascade statistics
+cascade_stats = CascadeStats()
+
+def get_cascade_stats() -> Dict[str, Any]:
+    """Get local classifier hit rate"""
+    return cascade_stats.get_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local energy classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Train from logged LLM labels and the dataset")
+    train_parser.add_argument("--labels", default=DEFAULT_LABELS_PATH)
+    train_parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    predict_parser = subparsers.add_parser("predict", help="Classify a message with the trained model")
+    predict_parser.add_argument("message")
+    predict_parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        texts, labels, weights = load_training_data(args.labels)
+        if not texts:
+            print("No training data found")
+            return
+        llm_labels = sum(1 for weight in weights if weight == LLM_LABEL_WEIGHT)
+        print(f"Training on {len(texts)} messages ({llm_labels} LLM labels, {len(texts) - llm_labels} pseudo labels)")
+        classifier = LocalEnergyClassifier().fit(texts, labels, weights)
+        classifier.save(args.output)
+        print(f"Saved local energy classifier to {args.output}")
+    elif args.command == "predict":
+        classifier = LocalEnergyClassifier.load(args.model)
+        if classifier is None:
+            print("No trained model - run: python local_energy_classifier.py train")
+            return
+        start = time.perf_counter()
+        signature = classifier.predict(args.message)
+        elapsed_us = (time.perf_counter() - start) * 1_000_000
+        print(f"{signature} ({elapsed_us:.0f}µs)")
+
+
+if __name__ == "__main__":
+    main()
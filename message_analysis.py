@@ -0,0 +1,63 @@
+"""
+Per-message text analysis computed once and shared by every detector
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Tuple
+from keyword_engine import KeywordHits, scan_keywords
+from emoji_utils import emoji_runs, is_emoji_only
+
+WORD_PATTERN = re.compile(r"[\w']+")
+
+# Length classes used by the orchestrator's thresholds
+SHORT_MESSAGE_CHARS = 30   # short enough to be a bare agreement ("ok", "sure go ahead")
+LONG_MESSAGE_CHARS = 50    # long enough to justify a response analysis call
+
+
+@dataclass
+class MessageAnalysis:
+    """Facts about one message derived a single time per turn"""
+    raw: str
+    normalized: str                                   # lowercased and stripped
+    tokens: List[str] = field(default_factory=list)   # lowercased word tokens
+    emoji_spans: List[Tuple[int, int]] = field(default_factory=list)  # runs of consecutive emojis
+    keyword_hits: KeywordHits = None
+    length: int = 0
+    length_class: str = "empty"                       # empty, short, medium, long
+    question_count: int = 0
+
+    @property
+    def is_emoji_only(self) -> bool:
+        """True when the message is emojis with no letters or digits (punctuation allowed)"""
+        return is_emoji_only(self.raw)
+
+    @property
+    def is_question(self) -> bool:
+        return self.question_count > 0
+
+
+def _length_class(length: int) -> str:
+    if length == 0:
+        return "empty"
+    if length < SHORT_MESSAGE_CHARS:
+        return "short"
+    if length <= LONG_MESSAGE_CHARS:
+        return "medium"
+    return "long"
+
+
+def analyze_message(text: str) -> MessageAnalysis:
+    """Analyze a message once - lowercasing, tokens, emojis and keyword hits"""
+    text = text or ""
+    normalized = text.lower().strip()
+    return MessageAnalysis(
+        raw=text,
+        normalized=normalized,
+        tokens=[token for token in WORD_PATTERN.findall(normalized) if token.strip("'")],
+        emoji_spans=emoji_runs(text),
+        keyword_hits=scan_keywords(text),
+        length=len(text),
+        length_class=_length_class(len(text)),
+        question_count=text.count("?")
+    )
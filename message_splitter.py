@@ -3,8 +3,31 @@ Intelligent message splitting agent for building anticipation
 """
 
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
+from message_analysis import MessageAnalysis, analyze_message
+from emoji_utils import split_emoji_runs
+
+# Openers that make a part a question even without a question mark
+QUESTION_OPENER_PATTERN = re.compile(r'\b(?:can you|are you|do you|will you|would you|should i|what|how|where|when|why|tell me)\b')
+SENTENCE_END_PATTERN = re.compile(r'([.!?]+)')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
+
+# Sentence classes in priority order - the first class with any matching pattern wins
+SENTENCE_CLASS_ORDER = ("demand", "question", "emotional", "storytelling", "sensory", "teasing")
+
+# Seconds to wait after a part, by content type and part type
+CONTENT_DELAY_MAPS: Dict[str, Dict[str, float]] = {
+    "sexual": {"teasing": 2.0, "sensory": 3.5, "question": 4.0, "demand": 2.5},
+    "crisis": {"emotional": 1.5, "question": 2.0, "demand": 1.0},
+    "emotional": {"emotional": 2.0, "question": 2.5, "teasing": 1.5},
+    "storytelling": {"storytelling": 2.5, "sensory": 3.0, "question": 2.0},
+    "general": {"teasing": 1.5, "question": 2.0, "emotional": 1.5},
+}
+MAX_PARTS = 3              # more parts than this feels spammy
+MAX_PART_CHARS = 150       # start a new part once the current one is this long
+REPHRASE_MIN_CHARS = 300   # longer replies have repeated sentences removed before splitting
 
 @dataclass
 class MessagePart:
@@ -36,7 +59,7 @@ class MessageSplitter:
         ]
         
         self.question_patterns = [
-            r'[^.]*\?[^.]*',  # Questions
+            r'\?',  # Any question mark
             r'[Aa]re you[^.]*\?',  # Are you... questions
             r'[Dd]o you[^.]*\?',  # Do you... questions
             r'[Ww]ant[^.]*\?',  # Want... questions
@@ -70,15 +93,29 @@ class MessageSplitter:
             r'[Aa]fter[^.]*\.',  # After... patterns
             r'[Bb]efore[^.]*\.',  # Before... patterns
         ]
+        
+        self._compile_sentence_classes()
+    
+    def _compile_sentence_classes(self):
+        """Compile each class's patterns into one alternation so a class costs one search"""
+        self._sentence_classes = [
+            (name, re.compile('|'.join(f'(?:{pattern})' for pattern in getattr(self, f'{name}_patterns'))))
+            for name in SENTENCE_CLASS_ORDER
+        ]
     
-    def split_message(self, message: str, context: str = "general") -> List[MessagePart]:
+    def stream(self, context: str = "general") -> "StreamingSplit":
+        """Start an incremental split of a reply that is still being generated"""
+        return StreamingSplit(self, context)
+    
+    def split_message(self, message: str, context: str = "general",
+                      analysis: Optional[MessageAnalysis] = None) -> List[MessagePart]:
         """Intelligently split a message into sequential parts based on content type and context"""
         
         # Clean the message
         message = message.strip()
         
         # First, try to rephrase if the message is too long and repetitive
-        if len(message) > 300:
+        if len(message) > REPHRASE_MIN_CHARS:
             message = self._rephrase_long_message(message)
         
         # Determine if message should be split based on length and context
@@ -86,12 +123,16 @@ class MessageSplitter:
         if len(message) < min_length:
             return [MessagePart(content=message, type='complete', delay=0.0)]
         
+        # Reuse the caller's analysis unless rephrasing changed the text
+        if analysis is None or analysis.raw.strip() != message:
+            analysis = analyze_message(message)
+        
         # Check if message has natural split points
-        if not self._has_natural_split_points(message):
+        if not self._has_natural_split_points(message, analysis):
             return [MessagePart(content=message, type='complete', delay=0.0)]
         
         # Detect content type for appropriate splitting strategy
-        content_type = self._detect_content_type(message)
+        content_type = self._detect_content_type(message, analysis)
         return self._split_by_content_type(message, content_type)
     
     def _get_minimum_length_for_splitting(self, context: str) -> int:
@@ -105,28 +146,24 @@ class MessageSplitter:
         }
         return context_thresholds.get(context, 200)
     
-    def _detect_content_type(self, message: str) -> str:
+    def _detect_content_type(self, message: str, analysis: Optional[MessageAnalysis] = None) -> str:
         """Detect the type of content in the message"""
-        message_lower = message.lower()
+        hits = (analysis or analyze_message(message)).keyword_hits
         
         # Crisis/emotional content indicators (check first for safety)
-        crisis_keywords = ['sad', 'depressed', 'anxious', 'worried', 'scared', 'hurt', 'pain', 'cry', 'tears', 'safe', 'worried about you']
-        if any(keyword in message_lower for keyword in crisis_keywords):
+        if hits.has("split_crisis"):
             return "crisis"
         
         # Sexual content indicators (more specific to avoid false positives)
-        sexual_keywords = ['mommy', 'cock', 'pussy', 'fuck', 'sex', 'horny', 'aroused', 'cum', 'orgasm', 'tongue', 'mouth on you', 'throat']
-        if any(keyword in message_lower for keyword in sexual_keywords):
+        if hits.has("split_sexual"):
             return "sexual"
         
         # Emotional support indicators
-        emotional_keywords = ['love', 'care', 'support', 'understand', 'here for you', 'comfort', 'sorry you\'re feeling', 'breaks my heart', 'not alone']
-        if any(keyword in message_lower for keyword in emotional_keywords):
+        if hits.has("split_emotional"):
             return "emotional"
         
         # Storytelling indicators
-        story_keywords = ['once upon a time', 'princess', 'castle', 'then one day', 'suddenly', 'after that day', 'mysterious stranger']
-        if any(keyword in message_lower for keyword in story_keywords):
+        if hits.has("split_storytelling"):
             return "storytelling"
         
         return "general"
@@ -146,44 +183,23 @@ class MessageSplitter:
     
     def _split_sexual_content(self, message: str) -> List[MessagePart]:
         """Split sexual content for maximum anticipation"""
-        return self._split_by_sentences_with_delays(message, {
-            "teasing": 2.0,
-            "sensory": 3.5,
-            "question": 4.0,
-            "demand": 2.5
-        })
+        return self._split_by_sentences_with_delays(message, CONTENT_DELAY_MAPS["sexual"])
     
     def _split_crisis_content(self, message: str) -> List[MessagePart]:
         """Split crisis content carefully to maintain support"""
-        return self._split_by_sentences_with_delays(message, {
-            "emotional": 1.5,
-            "question": 2.0,
-            "demand": 1.0
-        })
+        return self._split_by_sentences_with_delays(message, CONTENT_DELAY_MAPS["crisis"])
     
     def _split_emotional_content(self, message: str) -> List[MessagePart]:
         """Split emotional content for warmth and connection"""
-        return self._split_by_sentences_with_delays(message, {
-            "emotional": 2.0,
-            "question": 2.5,
-            "teasing": 1.5
-        })
+        return self._split_by_sentences_with_delays(message, CONTENT_DELAY_MAPS["emotional"])
     
     def _split_storytelling_content(self, message: str) -> List[MessagePart]:
         """Split storytelling content for dramatic effect"""
-        return self._split_by_sentences_with_delays(message, {
-            "storytelling": 2.5,
-            "sensory": 3.0,
-            "question": 2.0
-        })
+        return self._split_by_sentences_with_delays(message, CONTENT_DELAY_MAPS["storytelling"])
     
     def _split_general_content(self, message: str) -> List[MessagePart]:
         """Split general content for natural flow"""
-        return self._split_by_sentences_with_delays(message, {
-            "teasing": 1.5,
-            "question": 2.0,
-            "emotional": 1.5
-        })
+        return self._split_by_sentences_with_delays(message, CONTENT_DELAY_MAPS["general"])
     
     def _split_by_sentences_with_delays(self, message: str, delay_map: Dict[str, float]) -> List[MessagePart]:
         """Split message by sentences with appropriate delays, preserving punctuation and emoji placement"""
@@ -191,7 +207,7 @@ class MessageSplitter:
         sentences = self._split_by_sentences(message)
         
         # Limit the number of parts to avoid spam
-        max_parts = 3  # Maximum 3 parts to prevent spammy feel
+        max_parts = MAX_PARTS
         
         current_part = ""
         current_type = "teasing"
@@ -210,7 +226,7 @@ class MessageSplitter:
                 continue
             
             # If type changes or part gets too long, start new part
-            if (sentence_type != current_type and current_part) or len(current_part) > 150:
+            if (sentence_type != current_type and current_part) or len(current_part) > MAX_PART_CHARS:
                 if current_part:
                     # Clean up the part to ensure proper punctuation and emoji placement
                     cleaned_part = self._clean_message_part(current_part.strip())
@@ -259,46 +275,30 @@ class MessageSplitter:
         if not text:
             return text
         
-        # Remove leading emojis and move them to more natural positions
-        emoji_pattern = r'^([\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\U00002600-\U000026FF\U00002700-\U000027BF\U0001F900-\U0001F9FF\U0001FA70-\U0001FAFF\U0001F018-\U0001F0F5\U0001F200-\U0001F2FF\s]+)'
-        leading_emojis = re.findall(emoji_pattern, text)
+        # Remove leading emojis (and the spaces between them) and move them to more natural positions
+        segments = split_emoji_runs(text)
+        leading_count = 0
+        while leading_count < len(segments) and (segments[leading_count][1] or not segments[leading_count][0].strip()):
+            leading_count += 1
+        leading_emojis = ''.join(segment for segment, _ in segments[:leading_count])
         
-        if leading_emojis:
+        if leading_count and segments[0][1]:
             # Remove leading emojis
-            text = re.sub(emoji_pattern, '', text).strip()
+            text = ''.join(segment for segment, _ in segments[leading_count:]).strip()
             # Add emojis at the end if it's a statement, or keep them natural
             if not text.endswith(('?', '!', '.')):
                 # If no ending punctuation, add emojis at the end
-                text = text + ''.join(leading_emojis[0])
+                text = text + leading_emojis
             else:
                 # If there's ending punctuation, place emojis before it
-                text = text[:-1] + ''.join(leading_emojis[0]) + text[-1]
+                text = text[:-1] + leading_emojis + text[-1]
         
         # Ensure questions end with question marks
-        question_patterns = [
-            r'\bcan you\b.*$',
-            r'\bare you\b.*$', 
-            r'\bdo you\b.*$',
-            r'\bwill you\b.*$',
-            r'\bwould you\b.*$',
-            r'\bshould i\b.*$',
-            r'\bwhat\b.*$',
-            r'\bhow\b.*$',
-            r'\bwhere\b.*$',
-            r'\bwhen\b.*$',
-            r'\bwhy\b.*$',
-            r'\btell me\b.*$',
-            r'\bcan you feel\b.*$'
-        ]
-        
-        text_lower = text.lower()
-        for pattern in question_patterns:
-            if re.search(pattern, text_lower) and not text.endswith('?'):
-                text = text.rstrip('.,!') + '?'
-                break
+        if not text.endswith('?') and QUESTION_OPENER_PATTERN.search(text.lower()):
+            text = text.rstrip('.,!') + '?'
         
         # Clean up multiple spaces
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = WHITESPACE_PATTERN.sub(' ', text).strip()
         
         return text
     
@@ -309,10 +309,11 @@ class MessageSplitter:
         current_sentence = ""
         
         # Split by sentence endings but keep the punctuation
-        parts = re.split(r'([.!?]+)', text)
+        parts = SENTENCE_END_PATTERN.split(text)
         
+        # Split keeps the separators at odd indices
         for i, part in enumerate(parts):
-            if re.match(r'^[.!?]+$', part):
+            if i % 2:
                 # This is punctuation, add it to the current sentence
                 current_sentence += part
                 if current_sentence.strip():
@@ -335,35 +336,11 @@ class MessageSplitter:
         """Classify a sentence by its type"""
         sentence_lower = sentence.lower()
         
-        # Check for demands/commands first (highest priority)
-        for pattern in self.demand_patterns:
-            if re.search(pattern, sentence_lower):
-                return "demand"
-        
-        # Check for questions
-        for pattern in self.question_patterns:
-            if re.search(pattern, sentence_lower):
-                return "question"
-        
-        # Check for emotional content
-        for pattern in self.emotional_patterns:
-            if re.search(pattern, sentence_lower):
-                return "emotional"
-        
-        # Check for storytelling
-        for pattern in self.storytelling_patterns:
-            if re.search(pattern, sentence_lower):
-                return "storytelling"
-        
-        # Check for sensory descriptions
-        for pattern in self.sensory_patterns:
-            if re.search(pattern, sentence_lower):
-                return "sensory"
-        
-        # Check for teasing
-        for pattern in self.teasing_patterns:
-            if re.search(pattern, sentence_lower):
-                return "teasing"
+        # Demands/commands first (highest priority), then questions, emotional,
+        # storytelling, sensory and teasing content
+        for sentence_type, pattern in self._sentence_classes:
+            if pattern.search(sentence_lower):
+                return sentence_type
         
         # Default based on sentence characteristics
         if len(sentence) < 30:
@@ -427,11 +404,11 @@ class MessageSplitter:
         for word in filler_words:
             pattern = pattern.replace(word, '')
         # Remove punctuation and extra spaces
-        pattern = re.sub(r'[^\w\s]', '', pattern)
-        pattern = re.sub(r'\s+', ' ', pattern).strip()
+        pattern = NON_WORD_PATTERN.sub('', pattern)
+        pattern = WHITESPACE_PATTERN.sub(' ', pattern).strip()
         return pattern
     
-    def _has_natural_split_points(self, message: str) -> bool:
+    def _has_natural_split_points(self, message: str, analysis: Optional[MessageAnalysis] = None) -> bool:
         """Check if message has natural points where it can be split"""
         # Count different types of sentence endings
         question_count = message.count('?')
@@ -442,13 +419,7 @@ class MessageSplitter:
         total_sentences = question_count + exclamation_count + period_count
         
         # Check for natural breaks
-        natural_breaks = [
-            'but', 'however', 'though', 'although', 'meanwhile', 
-            'then', 'next', 'after', 'before', 'while', 'when',
-            'so', 'therefore', 'thus', 'hence', 'consequently'
-        ]
-        
-        has_breaks = any(break_word in message.lower() for break_word in natural_breaks)
+        has_breaks = (analysis or analyze_message(message)).keyword_hits.has("natural_break")
         
         # Split if we have multiple sentences OR natural breaks
         return total_sentences >= 2 or (total_sentences >= 1 and has_breaks)
@@ -470,6 +441,113 @@ class MessageSplitter:
         
         return formatted_parts
 
+class StreamingSplit:
+    """
+    Incremental version of MessageSplitter.split_message for streamed replies
+
+    feed() takes text chunks as they arrive and returns parts as soon as they
+    are final; finish() returns the rest. A sentence is complete once the
+    character after its terminator arrives, and a part is final once the
+    next sentence shows it cannot grow (type change or MAX_PART_CHARS), so
+    parts match split_message's: at most MAX_PARTS, same types and cleanup.
+    Nothing is emitted before the reply reaches the context's minimum split
+    length; a reply that ends shorter falls back to split_message.
+
+    Differences from splitting the full reply: the delay of an early part
+    uses the content type of the text streamed so far, and a reply that grows
+    past REPHRASE_MIN_CHARS after parts have gone out is not rephrased.
+    """
+
+    def __init__(self, splitter: MessageSplitter, context: str = "general"):
+        self.splitter = splitter
+        self.context = context
+        self.min_length = splitter._get_minimum_length_for_splitting(context)
+        self.text = ""
+        self.parts: List[MessagePart] = []      # parts emitted so far
+        self._sentences: List[str] = []          # complete sentences not yet placed in a part
+        self._sentence_start = 0                 # offset of the sentence in progress
+        self._current_part = ""
+        self._current_type = "teasing"
+        self.finished = False
+
+    def feed(self, chunk: str) -> List[MessagePart]:
+        """Add a chunk of the reply; returns parts that became final"""
+        if self.finished or not chunk:
+            return []
+        self.text += chunk
+        self._collect_sentences(final=False)
+        length = len(self.text.strip())
+        if length < self.min_length:
+            return []
+        if not self.parts and length > REPHRASE_MIN_CHARS:
+            # split_message would rephrase this reply first - leave it to finish()
+            return []
+        return self._place_sentences()
+
+    def finish(self) -> List[MessagePart]:
+        """Flush the rest of the reply once generation is done"""
+        if self.finished:
+            return []
+        self.finished = True
+        if not self.parts:
+            # Nothing went out early - the full-message path gives identical results
+            self.parts = self.splitter.split_message(self.text, self.context)
+            return self.parts
+
+        self._collect_sentences(final=True)
+        new_parts = self._place_sentences()
+        if self._current_part:
+            last_part = self._make_part(self._current_part, self._current_type)
+            self._current_part = ""
+            self.parts.append(last_part)
+            new_parts.append(last_part)
+        return new_parts
+
+    def _collect_sentences(self, final: bool):
+        # Same boundaries as MessageSplitter._split_by_sentences: a terminator run ends a sentence
+        text = self.text
+        while True:
+            match = SENTENCE_END_PATTERN.search(text, self._sentence_start)
+            # The run is only complete once a character follows it
+            if not match or (match.end() == len(text) and not final):
+                break
+            sentence = text[self._sentence_start:match.end()].strip()
+            if sentence:
+                self._sentences.append(sentence)
+            self._sentence_start = match.end()
+        if final:
+            remainder = text[self._sentence_start:].strip()
+            if remainder:
+                self._sentences.append(remainder)
+            self._sentence_start = len(text)
+
+    def _place_sentences(self) -> List[MessagePart]:
+        """Run the split_message part rules over newly completed sentences"""
+        new_parts = []
+        for sentence in self._sentences:
+            sentence_type = self.splitter._classify_sentence(sentence)
+            if len(self.parts) + len(new_parts) >= MAX_PARTS - 1:
+                # The last part takes everything that is left
+                self._current_part += " " + sentence if self._current_part else sentence
+                continue
+            if (sentence_type != self._current_type and self._current_part) or len(self._current_part) > MAX_PART_CHARS:
+                new_parts.append(self._make_part(self._current_part, self._current_type))
+                self._current_part = sentence
+                self._current_type = sentence_type
+            else:
+                self._current_part += " " + sentence if self._current_part else sentence
+        self._sentences = []
+        self.parts.extend(new_parts)
+        return new_parts
+
+    def _make_part(self, content: str, part_type: str) -> MessagePart:
+        content_type = self.splitter._detect_content_type(self.text.strip())
+        return MessagePart(
+            content=self.splitter._clean_message_part(content.strip()),
+            type=part_type,
+            delay=CONTENT_DELAY_MAPS[content_type].get(part_type, 2.0)
+        )
+
 # Example usage and testing
 if __name__ == "__main__":
     splitter = MessageSplitter()
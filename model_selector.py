@@ -0,0 +1,175 @@
+"""
+SLO-driven adaptive model tier selection
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+# Target p95 latency per stage in seconds (override with SLO_<STAGE>_SECONDS)
+DEFAULT_LATENCY_SLOS = {
+    "energy_analysis": 1.5,
+    "safety_analysis": 1.5,
+    "response_analysis": 2.0,
+    "reply_generation": 4.0,
+}
+
+def _latency_slo(stage: str) -> float:
+    value = os.getenv(f"SLO_{stage.upper()}_SECONDS")
+    try:
+        return float(value) if value else DEFAULT_LATENCY_SLOS.get(stage, 3.0)
+    except ValueError:
+        return DEFAULT_LATENCY_SLOS.get(stage, 3.0)
+
+
+class StageModelController:
+    """
+    Picks the model tier for one stage from rolling latency and quality signals
+
+    model_options is ordered cheapest/fastest first. The controller steps
+    down a tier when p95 latency exceeds the SLO, steps back up towards the
+    preferred tier when there is latency headroom, and steps above it when
+    parse failures, fallbacks or errors show the current tier is not good
+    enough. Every tier change starts a cooldown before the next one.
+
+    The controller owns the stage's current tier; every agent instance for
+    the stage reads it from here.
+    """
+
+    def __init__(self, stage: str, model_options: List[str], latency_slo: float,
+                 window_size: int = 20, min_samples: int = 5, headroom: float = 0.6,
+                 max_quality_failure_rate: float = 0.2, cooldown: float = 60.0, preferred_index: int = 0):
+        self.stage = stage
+        self.model_options = model_options
+        self.latency_slo = latency_slo
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.max_quality_failure_rate = max_quality_failure_rate
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self.samples: Dict[str, deque] = {model: deque(maxlen=window_size) for model in model_options}
+        self.preferred_index = preferred_index
+        self.current_index = preferred_index
+        self.last_change = 0.0
+        self.tier_changes: List[Dict[str, Any]] = []
+
+    @property
+    def current_model(self) -> str:
+        """Model of the current tier"""
+        return self.model_options[self.current_index]
+
+    def record(self, model: str, latency: float, parse_failed: bool = False, fallback: bool = False,
+               error: bool = False):
+        """Record one call's latency and quality outcome; a call that raised counts as a failure"""
+        with self._lock:
+            window = self.samples.get(model)
+            if window is not None:
+                window.append((latency, parse_failed or fallback or error))
+
+    def p95_latency(self, model: str) -> Optional[float]:
+        """95th percentile latency over the rolling window"""
+        latencies = sorted(latency for latency, _ in self.samples.get(model, ()))
+        if not latencies:
+            return None
+        return latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)]
+
+    def quality_failure_rate(self, model: str) -> float:
+        """Fraction of calls that raised or needed a parse failure fallback"""
+        window = self.samples.get(model, ())
+        if not window:
+            return 0.0
+        return sum(1 for _, failed in window if failed) / len(window)
+
+    def select_index(self) -> int:
+        """Return the tier to use next, moving at most one step from the current tier"""
+        with self._lock:
+            current_index = self.current_index
+            model = self.model_options[current_index]
+            window = self.samples[model]
+            if len(window) < self.min_samples or time.time() - self.last_change < self.cooldown:
+                return current_index
+
+            p95 = self.p95_latency(model)
+            failure_rate = self.quality_failure_rate(model)
+            has_headroom = p95 < self.latency_slo * self.headroom
+
+            new_index = current_index
+            reason = ""
+            if p95 > self.latency_slo and current_index > 0:
+                new_index, reason = current_index - 1, f"p95 {p95:.2f}s over {self.latency_slo:.2f}s SLO"
+            elif has_headroom and failure_rate > self.max_quality_failure_rate and current_index < len(self.model_options) - 1:
+                new_index, reason = current_index + 1, f"quality failure rate {failure_rate:.0%} with latency headroom"
+                self.preferred_index = max(self.preferred_index, new_index)
+            elif has_headroom and current_index < self.preferred_index:
+                new_index, reason = current_index + 1, f"p95 {p95:.2f}s has headroom, returning towards preferred tier"
+
+            if new_index != current_index:
+                # Stale samples from an earlier visit should not drive the next decision
+                self.samples[self.model_options[new_index]].clear()
+                self._change_tier(new_index, reason)
+            return new_index
+
+    def fail_over(self, index: int):
+        """Make the tier a call fell back to current, after the current one raised
+
+        The current model was unavailable, so this is not held back by the
+        cooldown, but it starts one like any other tier change.
+        """
+        with self._lock:
+            if index != self.current_index:
+                self._change_tier(index, "failed over after errors")
+
+    def _change_tier(self, new_index: int, reason: str):
+        model, new_model = self.model_options[self.current_index], self.model_options[new_index]
+        self.current_index = new_index
+        self.last_change = time.time()
+        self.tier_changes.append({"timestamp": self.last_change, "from": model, "to": new_model, "reason": reason})
+        self.tier_changes = self.tier_changes[-20:]
+        print(f"📶 {self.stage}: {model} → {new_model} ({reason})")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Report rolling signals per model"""
+        with self._lock:
+            return {
+                "latency_slo": self.latency_slo,
+                "current_model": self.model_options[self.current_index],
+                "preferred_model": self.model_options[self.preferred_index],
+                "models": {
+                    model: {
+                        "samples": len(window),
+                        "p95_latency": self.p95_latency(model),
+                        "quality_failure_rate": self.quality_failure_rate(model)
+                    }
+                    for model, window in self.samples.items()
+                },
+                "recent_changes": list(self.tier_changes)
+            }
+
+
+class AdaptiveModelSelector:
+    """Registry of per-stage controllers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.controllers: Dict[str, StageModelController] = {}
+
+    def controller(self, stage: str, model_options: List[str]) -> StageModelController:
+        """Get (or create) the controller for a stage"""
+        with self._lock:
+            if stage not in self.controllers:
+                self.controllers[stage] = StageModelController(stage, model_options, _latency_slo(stage))
+            return self.controllers[stage]
+
+    def get_status(self) -> Dict[str, Any]:
+        """Report every stage's controller state"""
+        with self._lock:
+            controllers = dict(self.controllers)
+        return {stage: controller.get_status() for stage, controller in controllers.items()}
+
+
+# Global selector instance shared by all agents
+model_selector = AdaptiveModelSelector()
@@ -2,12 +2,14 @@
 LLM-powered response analysis agent
 """
 
-import json
-import os
-from mistralai import Mistral
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 from energy_types import EnergySignature
+from llm_json_parser import json_parser, JSON_RESPONSE_FORMAT
+from usage_tracker import record_completion_usage, apply_session_budget
+from model_selector import model_selector
+from shared_resources import SharedResources, shared_resources
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,12 +17,8 @@ load_dotenv()
 class LLMResponseAnalyzer:
     """LLM-powered response analysis instead of pattern matching"""
 
-    def __init__(self):
-        mistral_api_key = os.getenv("MISTRAL_API_KEY")
-        if not mistral_api_key:
-            raise ValueError("MISTRAL_API_KEY environment variable not set")
-        
-        self.client = Mistral(api_key=mistral_api_key)
+    def __init__(self, resources: Optional[SharedResources] = None):
+        self.client = (resources or shared_resources).mistral_client
         
         # Model options for fallback
         self.model_options = [
@@ -28,7 +26,7 @@ class LLMResponseAnalyzer:
             "mistral-small-latest", 
             "mistral-medium-latest"
         ]
-        self.current_model_index = 0
+        self.model_controller = model_selector.controller("response_analysis", self.model_options)
 
     async def analyze_response_energy(self, user_input: str, energy_signature: EnergySignature, context) -> Dict[str, Any]:
         """Analyze if conversation should continue using Mistral"""
@@ -63,43 +61,48 @@ Respond with JSON:
     "engagement_level": "low|medium|high"
 }}"""
 
+        # Let the SLO controller move the stage's tier before trying models in order
+        tier = self.model_controller.select_index()
+
         # Try different models if one fails
         for attempt in range(len(self.model_options)):
+            current_model = self.model_options[(tier + attempt) % len(self.model_options)]
+            call_start = time.time()
             try:
-                current_model = self.model_options[self.current_model_index]
+                current_model = apply_session_budget(self.model_options, current_model)
                 print(f"🔍 DEBUG: Calling Mistral ({current_model}) for response analysis...")
                 
                 response = self.client.chat.complete(
                     model=current_model,
                     messages=[{"role": "user", "content": prompt}],
-                    temperature=0.3
+                    temperature=0.3,
+                    response_format=JSON_RESPONSE_FORMAT
                 )
+                latency = time.time() - call_start
+                record_completion_usage("response_analysis", current_model, response)
                 
                 response_text = response.choices[0].message.content.strip()
                 print(f"🔍 DEBUG: Response analysis: '{response_text}'")
                 
                 if not response_text:
                     print("⚠️ Empty response analysis, using fallback")
+                    self.model_controller.record(current_model, latency, fallback=True)
                     return self._get_response_fallback()
                 
-                # Try to extract JSON
-                try:
-                    result = json.loads(response_text)
-                except json.JSONDecodeError:
-                    import re
-                    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                    if json_match:
-                        result = json.loads(json_match.group())
-                    else:
-                        print(f"⚠️ No valid JSON in response analysis: '{response_text}'")
-                        return self._get_response_fallback()
+                # Parse and validate the analysis dict in one pass
+                result = json_parser.parse_response_analysis(response_text, current_model)
+                self.model_controller.record(current_model, latency, parse_failed=result is None)
+                if result is None:
+                    return self._get_response_fallback()
                 
+                if attempt > 0:
+                    self.model_controller.fail_over((tier + attempt) % len(self.model_options))
                 return result
                 
             except Exception as e:
                 print(f"Mistral Response Analysis Error with {current_model}: {e}")
+                self.model_controller.record(current_model, time.time() - call_start, error=True)
                 # Try next model
-                self.current_model_index = (self.current_model_index + 1) % len(self.model_options)
                 if attempt == len(self.model_options) - 1:
                     print("All Mistral models failed for response analysis")
                     return self._get_response_fallback()
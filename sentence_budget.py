@@ -0,0 +1,89 @@
+"""
+Sentence-budget stop condition for streamed reply generation
+"""
+
+from typing import Optional
+
+# Trailing pause dots ("so sorry.. are you okay") are part of this persona's
+# texting style and do not end a sentence
+PAUSE_MARKERS = ("..", "…")
+TERMINATORS = ".!?"
+
+
+class SentenceBudget:
+    """
+    Tracks streamed text and reports when a sentence budget has been used up
+
+    A sentence only counts as finished once the next one starts, so emojis
+    and closing punctuation after the terminator stay with their sentence
+    ("Hey baby! 😘 What's up?" is two sentences, emoji included).
+    """
+
+    def __init__(self, max_sentences: int):
+        self.max_sentences = max_sentences
+        self.buffer = ""
+        self.completed_sentences = 0
+        self.cut_index: Optional[int] = None
+        self._scan_pos = 0
+        self._pending_end = False   # saw a terminator, waiting for the next sentence to start
+        self._saw_space = False
+
+    @property
+    def exhausted(self) -> bool:
+        """True once the budget is reached and generation should stop"""
+        return self.cut_index is not None
+
+    @property
+    def text(self) -> str:
+        """Text within budget"""
+        if self.cut_index is None:
+            return self.buffer.strip()
+        return self.buffer[:self.cut_index].strip()
+
+    def feed(self, chunk: str) -> bool:
+        """Add a streamed chunk; returns True when the budget is exhausted"""
+        if self.exhausted or not chunk:
+            return self.exhausted
+
+        self.buffer += chunk
+        buffer = self.buffer
+        # Leave the last character unscanned so a terminator run split across
+        # chunks ("." then ".") is seen whole
+        scan_end = len(buffer) - 1
+
+        i = self._scan_pos
+        while i < scan_end:
+            char = buffer[i]
+            if char in TERMINATORS:
+                run_end = i
+                while run_end < len(buffer) and buffer[run_end] in TERMINATORS:
+                    run_end += 1
+                if run_end >= len(buffer):
+                    break  # run may continue in the next chunk
+                run = buffer[i:run_end]
+                if run.count('.') < 2 or '!' in run or '?' in run:
+                    self._pending_end = True
+                    self._saw_space = False
+                i = run_end
+                continue
+            if char == "…":
+                i += 1
+                continue
+
+            if self._pending_end:
+                if char.isspace():
+                    self._saw_space = True
+                elif self._saw_space and (char.isalnum() or char in "\"'*("):
+                    # Next sentence starts here
+                    self.completed_sentences += 1
+                    self._pending_end = False
+                    if self.completed_sentences >= self.max_sentences:
+                        self.cut_index = i
+                        return True
+                elif char.isalnum():
+                    # "3.5" or "e.g" - not a sentence boundary
+                    self._pending_end = False
+            i += 1
+
+        self._scan_pos = i
+        return False
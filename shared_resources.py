@@ -0,0 +1,116 @@
+"""
+Process-wide resources shared by every conversation session
+
+The Mistral client, the few-shot dataset and its retrieval index, the local
+energy classifier, the compiled keyword lexicons and the scenario scripts
+never change once built and are safe to use from several threads. They
+live here, each built once per process on first use, so a conversation
+system only owns per-session state (the session, its context, model
+fallback positions) and constructing one is cheap.
+
+warm_up() builds everything ahead of the first request, opens the HTTP
+connection pool and optionally primes the classifier and keyword caches.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from mistralai import Mistral
+from dotenv import load_dotenv
+from dataset_loader import DatasetLoader
+from energy_types import EnergySignature
+from enhanced_script_manager import EnhancedScriptManager
+from keyword_engine import KeywordEngine, keyword_engine
+from local_energy_classifier import LocalEnergyClassifier
+
+# Load environment variables from .env file
+load_dotenv()
+
+RESOURCE_NAMES = ("mistral_client", "dataset_loader", "local_classifier", "script_manager")
+# Typical opening messages run through the classifier, keyword engine and retrieval at startup
+WARMUP_MESSAGES = ("Hello!", "hi", "hey baby", "how are you?", "i miss you", "what are you doing?")
+
+
+class SharedResources:
+    """Read-only resources, each built on first access and then reused"""
+
+    def __init__(self):
+        self._built: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        # Energy of the fixed opening message, analysed once by the first session (or at warm-up)
+        self.initial_energy: Optional[EnergySignature] = None
+
+    def _get(self, name: str, build: Callable[[], Any]) -> Any:
+        if name in self._built:
+            return self._built[name]
+        with self._lock:
+            if name not in self._built:
+                self._built[name] = build()
+            return self._built[name]
+
+    @property
+    def mistral_client(self) -> Mistral:
+        """One client, and so one HTTP connection pool, for every agent"""
+        return self._get("mistral_client", self._build_mistral_client)
+
+    @staticmethod
+    def _build_mistral_client() -> Mistral:
+        mistral_api_key = os.getenv("MISTRAL_API_KEY")
+        if not mistral_api_key:
+            raise ValueError("MISTRAL_API_KEY environment variable is required")
+        return Mistral(api_key=mistral_api_key)
+
+    @property
+    def dataset_loader(self) -> DatasetLoader:
+        """Few-shot examples with their labels, prompt fragments and retrieval index"""
+        return self._get("dataset_loader", DatasetLoader)
+
+    @property
+    def local_classifier(self) -> Optional[LocalEnergyClassifier]:
+        """Trained local energy classifier, or None when no model has been trained"""
+        return self._get("local_classifier", LocalEnergyClassifier.load)
+
+    @property
+    def script_manager(self) -> EnhancedScriptManager:
+        """Scenario scripts with their energy variants, split plans and indexed trigger words"""
+        return self._get("script_manager", EnhancedScriptManager)
+
+    @property
+    def keyword_engine(self) -> KeywordEngine:
+        """Compiled lexicons; already one engine per process"""
+        return keyword_engine
+
+    def built(self) -> Dict[str, bool]:
+        """Which resources have been built so far"""
+        return {name: name in self._built for name in RESOURCE_NAMES}
+
+    def warm_up(self, prime_caches: bool = True) -> Dict[str, float]:
+        """Build every resource, open the HTTP connection pool and optionally prime caches; seconds per step"""
+        timings: Dict[str, float] = {}
+        for name in RESOURCE_NAMES:
+            start = time.perf_counter()
+            getattr(self, name)
+            timings[name] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            # Listing models costs no tokens; it resolves DNS and leaves a TLS connection in the pool
+            self.mistral_client.models.list()
+        except Exception as e:
+            print(f"⚠️ Could not warm the Mistral connection pool: {e}")
+        timings["http_pool"] = time.perf_counter() - start
+
+        if prime_caches:
+            start = time.perf_counter()
+            for message in WARMUP_MESSAGES:
+                if self.local_classifier is not None:
+                    self.local_classifier.predict(message)
+                self.keyword_engine.scan(message)
+                self.dataset_loader.get_relevant_examples(message)
+            timings["caches"] = time.perf_counter() - start
+        return timings
+
+
+# Global instance
+shared_resources = SharedResources()
@@ -0,0 +1,95 @@
+"""
+Test offset-indexed random access, streaming and sampling over JSONL corpora
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from conversation_corpus import ConversationCorpus
+from dataset_loader import DatasetLoader
+
+def _write_corpus(path, start, count):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(start, start + count):
+            f.write(json.dumps({"messages": [{"role": "user", "content": f"message {i} ❤️"},
+                                             {"role": "assistant", "content": f"reply {i}"}]}, ensure_ascii=False) + "\n")
+            if i % 7 == 0:
+                f.write("\n{not json}\n" + json.dumps({"no_messages": True}) + "\n")
+
+def test_random_access_matches_stream():
+    """Test that ids across several files read the same conversations the stream yields"""
+
+    print("Testing Conversation Corpus")
+    print("=" * 40)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, "a.jsonl"), os.path.join(tmp, "b.jsonl")]
+        _write_corpus(paths[0], 0, 30)
+        _write_corpus(paths[1], 30, 20)
+        corpus = ConversationCorpus(paths)
+        streamed = list(corpus)
+        assert len(corpus) == len(streamed) == 50
+        assert [corpus[i] for i in range(len(corpus))] == streamed
+        assert corpus[-1]["messages"][0]["content"] == "message 49 ❤️"
+        assert corpus[30]["messages"][1]["content"] == "reply 30"
+        corpus.close()
+        print(f"  {len(corpus)} conversations in {len(paths)} files")
+
+def test_offsets_are_persisted():
+    """Test that offsets are saved next to the file and rebuilt when it changes"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.jsonl")
+        _write_corpus(path, 0, 10)
+        ConversationCorpus([path]).close()
+        offsets_mtime = os.stat(f"{path}.offsets").st_mtime_ns
+        ConversationCorpus([path]).close()
+        assert os.stat(f"{path}.offsets").st_mtime_ns == offsets_mtime
+
+        time.sleep(0.01)
+        _write_corpus(path, 0, 12)
+        corpus = ConversationCorpus([path])
+        assert len(corpus) == 12 and corpus[11]["messages"][1]["content"] == "reply 11"
+        corpus.close()
+    print("  Offset persistence OK")
+
+def test_sampling():
+    """Test uniform and stratified sampling"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.jsonl")
+        _write_corpus(path, 0, 100)
+        corpus = ConversationCorpus([path])
+
+        sample = corpus.sample(10, seed=3)
+        assert len(sample) == 10 and sample == corpus.sample(10, seed=3)
+        assert len({json.dumps(conversation) for conversation in sample}) == 10
+
+        parity = lambda conversation: "even" if int(conversation["messages"][1]["content"].split()[1]) % 2 == 0 else "odd"
+        strata = corpus.stratified_sample(5, parity, seed=1)
+        assert set(strata) == {"even", "odd"}
+        assert all(len(members) == 5 and all(parity(member) == name for member in members)
+                   for name, members in strata.items())
+        corpus.close()
+    print("  Sampling OK")
+
+def test_loader_sample_mode():
+    """Test that DatasetLoader can load a capped sample through the offset index"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.jsonl")
+        _write_corpus(path, 0, 40)
+        loader = DatasetLoader(tags_path=None, artifact_path=None, dataset_paths=[path], max_examples=15)
+        assert len(loader.examples) == 15 and len(loader.example_tags) == 15
+        assert len(loader.get_relevant_examples("message reply", num_examples=3)) == 3
+        full = DatasetLoader(tags_path=None, artifact_path=None, dataset_paths=[path], max_examples=100)
+        assert len(full.examples) == 40
+    print("  Loader sample mode OK")
+
+if __name__ == "__main__":
+    test_random_access_matches_stream()
+    test_offsets_are_persisted()
+    test_sampling()
+    test_loader_sample_mode()
@@ -0,0 +1,78 @@
+"""
+Test the dataset build pipeline: encoding repair, schema validation and deduplication
+"""
+
+import json
+import os
+import tempfile
+
+from dataset_pipeline import clean_dataset, near_duplicates, repair_text, validate
+
+def _conversation(user, assistant):
+    return {"messages": [{"role": "user", "content": user}, {"role": "assistant", "content": assistant}]}
+
+def test_repair_text():
+    """Test that UTF-8 read as Windows-1252 is undone and clean text is left alone"""
+
+    print("Testing Dataset Pipeline")
+    print("=" * 40)
+
+    cases = {
+        "hey baby! ðŸ˜˜ mommy is here": ("hey baby! 😘 mommy is here", True),
+        "i donâ€™t know": ("i don’t know", True),
+        "cafÃ©  time ": ("café time", True),
+        "already fine 😘": ("already fine 😘", False),
+        "plain   text\n": ("plain text", False),
+    }
+    for text, expected in cases.items():
+        actual = repair_text(text)
+        print(f"  {text!r} -> {actual[0]!r}")
+        assert actual == expected, (text, actual)
+
+def test_validate():
+    """Test the messages schema"""
+
+    assert validate(_conversation("hi", "hey")) is None
+    assert validate({"text": "hi"}) == "no messages list"
+    assert validate({"messages": [{"role": "user", "content": "hi"}]}) == "needs user and assistant turns"
+    assert validate({"messages": [{"role": "bot", "content": "hi"}]}) == "unknown role"
+    assert validate(_conversation("hi", "  ")) == "empty content"
+    print("  Validation OK")
+
+def test_near_duplicates():
+    """Test that conversations differing only in emoji or punctuation collapse and distinct ones stay"""
+
+    examples = [
+        _conversation("i had a really long day at work today", "aw baby come here and let mommy take care of you tonight"),
+        _conversation("I had a really long day at work today!", "aw baby 😘 come here and let mommy take care of you tonight"),
+        _conversation("what should we eat for dinner", "how about pizza and a movie on the couch together"),
+    ]
+    assert near_duplicates(examples) == {1: 0}
+    print("  Near duplicates OK")
+
+def test_clean_dataset():
+    """Test the whole pipeline over raw files with mojibake, duplicates and bad lines"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path, clean_path = os.path.join(tmp, "raw.jsonl"), os.path.join(tmp, "clean.jsonl")
+        with open(raw_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(_conversation("hi", "hey baby! ðŸ˜˜ what is on your mind?")) + "\n")
+            f.write(json.dumps(_conversation("hi", "hey baby! ðŸ˜˜ what is on your mind?")) + "\n")
+            f.write("{broken\n")
+            f.write(json.dumps({"messages": [{"role": "user", "content": "alone"}]}) + "\n")
+        with open(clean_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(_conversation("hi", "hey baby!  what is on your mind?")) + "\n")
+            f.write(json.dumps(_conversation("tell me a story", "once upon a time there was a princess")) + "\n")
+
+        examples, stats = clean_dataset([raw_path, clean_path])
+        assert [example["messages"][1]["content"] for example in examples] == \
+            ["hey baby! 😘 what is on your mind?", "once upon a time there was a princess"]
+        assert stats["exact duplicates"] == 1 and stats["near duplicates"] == 1
+        assert stats["rejected: invalid json"] == 1 and stats["rejected: needs user and assistant turns"] == 1
+        print(f"  Pipeline stats: {dict(stats)}")
+
+if __name__ == "__main__":
+    test_repair_text()
+    test_validate()
+    test_near_duplicates()
+    test_clean_dataset()
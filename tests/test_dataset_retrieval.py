@@ -0,0 +1,255 @@
+"""
+Test BM25 few-shot example retrieval
+"""
+
+import json
+import os
+import random
+import shutil
+import tempfile
+
+import numpy as np
+from bm25_index import BM25Index, build_query
+from dataset_artifact import DatasetArtifact, build_artifact
+from dataset_loader import DatasetLoader, EXAMPLE_CATEGORIES, FRAGMENT_CACHE_SIZE, energy_key
+from energy_analyzer import rule_based_energy_analysis
+from vector_index import VectorIndex
+
+def test_bm25_ranking():
+    """Test that rarer, repeated query terms rank documents higher"""
+
+    print("Testing Example Retrieval")
+    print("=" * 40)
+
+    index = BM25Index([
+        "how was your day at work",
+        "my day was long and work was stressful, so stressful",
+        "do you want to watch a movie tonight",
+        "i love you",
+    ])
+    ranked = index.top_k(build_query("work stress was so stressful"), 3)
+    assert [document_id for document_id, _ in ranked] == [1, 0]
+    assert index.top_k(build_query("pineapple"), 3) == []
+    # Champion lists keep only the best-weighted postings of long lists
+    capped = BM25Index(["work", "work work", "work and more"], max_postings=1)
+    assert capped.postings["work"] == [max(BM25Index(["work", "work work", "work and more"]).postings["work"], key=lambda p: p[1])]
+    print(f"  Ranking: {ranked}")
+
+def test_sparse_scores_match_dense_scoring():
+    """Test that scoring only the touched postings ranks exactly like scoring every document"""
+
+    rng = random.Random(3)
+    words = ["work", "day", "movie", "love", "tired", "pizza", "sleep", "miss", "call", "rain"]
+    documents = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 6))) for _ in range(300)]
+    index = BM25Index(documents, max_postings=40)
+    for _ in range(50):
+        query = build_query(" ".join(rng.sample(words, 3)), [" ".join(rng.sample(words, 2))])
+        dense = {}
+        for term, query_weight in query.items():
+            if term not in index.skipped_terms:
+                for document_id, weight in index.postings.get(term, []):
+                    dense[document_id] = dense.get(document_id, 0.0) + query_weight * weight
+        expected = sorted(dense.items(), key=lambda item: (-round(item[1], 4), item[0]))[:5]
+        ranked = index.top_k(query, 5)
+        assert [(document_id, round(score, 4)) for document_id, score in ranked] == \
+            [(document_id, round(score, 4)) for document_id, score in expected]
+    print("  Sparse scoring OK")
+
+def test_context_is_down_weighted():
+    """Test that context terms count but the current message dominates"""
+
+    query = build_query("movie tonight", ["long day at work"], context_weight=0.5)
+    assert query["movie"] == 1.0 and query["work"] == 0.5
+    index = BM25Index(["watch a movie tonight", "long day at work"])
+    assert index.top_k(query, 1)[0][0] == 0
+    # Older turns (listed first) decay
+    query = build_query("movie", ["pizza", "long day at work"], context_weight=0.5, decay=0.5)
+    assert query["work"] == 0.5 and query["pizza"] == 0.25
+    print("  Context weighting OK")
+
+def test_energy_preference():
+    """Test that relevant examples with the user's energy type and emotion come first"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_path = os.path.join(tmp, "dataset.jsonl")
+        with open(dataset_path, 'w', encoding='utf-8') as f:
+            for user, assistant in [("long day at work", "come here and relax"),
+                                    ("i am sad, such a long day at work today", "oh baby, i'm here"),
+                                    ("what should we eat", "pizza!")]:
+                f.write(json.dumps({"messages": [{"role": "user", "content": user},
+                                                 {"role": "assistant", "content": assistant}]}) + "\n")
+        loader = DatasetLoader(tags_path=None, artifact_path=None, dataset_paths=[dataset_path])
+        assert loader.example_energy == ["neutral:happy", "cooperative:sad", "neutral:happy"]
+
+        sad = rule_based_energy_analysis("i am so sad")
+        assert energy_key(sad) == "cooperative:sad"
+        plain = loader.get_relevant_examples("work", num_examples=2)
+        preferred = loader.get_relevant_examples("work", num_examples=2, energy=sad)
+        assert [loader.examples.index(example) for example in plain] == [0, 1]
+        assert [loader.examples.index(example) for example in preferred] == [1, 0]
+    print("  Energy preference OK")
+
+def test_loader_returns_requested_count():
+    """Test that the loader pads with distinct random examples when few match"""
+
+    loader = DatasetLoader()
+    examples = loader.get_relevant_examples("how was your day", num_examples=3)
+    assert len(examples) == min(3, len(loader.examples))
+    padded = loader.get_relevant_examples("xyzzyplugh", num_examples=4)
+    assert len({id(example) for example in padded}) == len(padded) == min(4, len(loader.examples))
+    print(f"  {len(loader.index)} examples indexed")
+
+def test_vector_retrieval_is_diverse():
+    """Test that diversity re-ranking skips near-duplicates of an example already chosen"""
+
+    documents = ["i miss you so much today", "i miss you so much today!", "i miss you so much today baby",
+                 "missing you, how was your day", "the weather is nice", "let's order pizza"]
+    index = VectorIndex(documents)
+    assert index.matrix.flags['C_CONTIGUOUS'] and index.matrix.dtype.name == "float32"
+    query = index.query_vector("miss you today")
+    relevance_only = [document_id for document_id, _ in index.top_k(query, 2, mmr_lambda=1.0)]
+    diverse = [document_id for document_id, _ in index.top_k(query, 2, mmr_lambda=0.3)]
+    assert set(relevance_only) <= {0, 1, 2}
+    assert diverse[0] in {0, 1, 2} and diverse[1] == 3
+    assert index.top_k_batch(index.embed(["miss you today", "pizza"]), 2)[1][0][0] == 5
+    print(f"  Vector retrieval: {relevance_only} -> {diverse}")
+
+def test_loader_vector_backend():
+    """Test that the vector backend serves the same loader API"""
+
+    loader = DatasetLoader(retrieval_backend="vector")
+    assert loader.vector_index is not None and loader.index is None
+    assert len(loader.get_relevant_examples("i feel lonely", num_examples=3, context=["long day"])) == 3
+
+def test_category_tags():
+    """Test that examples are tagged from the lexicons and sampled per category"""
+
+    assert DatasetLoader._tag_example("i want to fuck you so bad") == "intimate"
+    assert DatasetLoader._tag_example("my grandma died yesterday") == "crisis"
+    assert DatasetLoader._tag_example("i feel so lonely") == "emotional"
+    assert DatasetLoader._tag_example("what did you have for lunch") == "casual"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        loader = DatasetLoader(tags_path=os.path.join(tmp, "tags.json"))
+        assert set(loader.category_ids) == set(EXAMPLE_CATEGORIES)
+        for example in loader.get_examples_by_category("casual", num_examples=5):
+            assert loader.example_tags[loader.examples.index(example)] == "casual"
+        print(f"  Tags: { {category: len(ids) for category, ids in loader.category_ids.items()} }")
+
+def test_tags_are_persisted():
+    """Test that a second load reuses saved tags and a changed dataset is retagged"""
+
+    class CountingLoader(DatasetLoader):
+        tagged = 0
+
+        @staticmethod
+        def _tag_example(text):
+            CountingLoader.tagged += 1
+            return DatasetLoader._tag_example(text)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tags_path = os.path.join(tmp, "tags.json")
+        first = CountingLoader(tags_path=tags_path)
+        assert CountingLoader.tagged == len(first.examples) > 0
+        second = CountingLoader(tags_path=tags_path)
+        assert CountingLoader.tagged == len(first.examples) and second.example_tags == first.example_tags
+
+        with open(tags_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        saved["key"]["mtime_ns"] -= 1
+        with open(tags_path, 'w', encoding='utf-8') as f:
+            json.dump(saved, f)
+        CountingLoader(tags_path=tags_path)
+        assert CountingLoader.tagged == 2 * len(first.examples)
+    print("  Tag persistence OK")
+
+def test_prompt_fragments():
+    """Test that pre-rendered fragments format like before and combinations are cached"""
+
+    loader = DatasetLoader(tags_path=None)
+    examples = loader.examples[:3]
+    expected = "\n\n".join(
+        "\n".join(f"{'User' if msg['role'] == 'user' else 'You'}: {msg['content']}" for msg in example['messages'])
+        for example in examples
+    )
+    formatted = loader.format_examples_for_prompt(examples)
+    assert formatted == expected
+    assert loader.format_examples_for_prompt(list(examples)) is formatted
+    # Dicts that are not loaded examples are rendered on the fly
+    outside = {"messages": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hey you"}]}
+    assert loader.format_examples_for_prompt([outside]) == "User: hi\nYou: hey you"
+    assert loader.format_examples_for_prompt([]) == "No previous examples available."
+
+    for example_id in range(FRAGMENT_CACHE_SIZE + 10):
+        loader.format_examples_for_prompt([loader.examples[example_id % len(loader.examples)], examples[0]])
+    assert len(loader._fragment_cache) <= FRAGMENT_CACHE_SIZE
+    print("  Prompt fragments OK")
+
+def test_compiled_artifact_matches_jsonl():
+    """Test that a loader on the memory-mapped artifact serves the same data, and stale artifacts are ignored"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_path = os.path.join(tmp, "dataset.jsonl")
+        shutil.copy(DatasetLoader(tags_path=None).dataset_path, dataset_path)
+        artifact_path = os.path.join(tmp, "dataset.bin")
+        build_artifact(artifact_path, [dataset_path])
+
+        parsed = DatasetLoader(tags_path=None, artifact_path=None, dataset_paths=[dataset_path])
+        mapped = DatasetLoader(tags_path=None, artifact_path=artifact_path, dataset_paths=[dataset_path])
+        assert isinstance(mapped.artifact, DatasetArtifact) and parsed.artifact is None
+        assert len(mapped.examples) == len(parsed.examples)
+        assert list(mapped.examples) == parsed.examples
+        assert list(mapped.example_tags) == parsed.example_tags
+        assert list(mapped.example_energy) == parsed.example_energy
+        assert list(mapped.example_fragments) == parsed.example_fragments
+        assert {category: list(ids) for category, ids in mapped.category_ids.items()} == parsed.category_ids
+
+        for message in ["how was your day", "i feel so lonely tonight", "xyzzyplugh"]:
+            query = build_query(message)
+            expected = [(example_id, round(score, 4)) for example_id, score in parsed.index.top_k(query, 5)]
+            assert [(example_id, round(score, 4)) for example_id, score in mapped.index.top_k(query, 5)] == expected
+        examples = mapped.get_relevant_examples("how was your day", num_examples=3)
+        assert mapped.format_examples_for_prompt(examples) == parsed.format_examples_for_prompt(
+            [parsed.examples[mapped.examples.example_ids[id(example)]] for example in examples])
+        assert all(tag == "casual" for tag in (mapped.example_tags[mapped.examples.example_ids[id(example)]]
+                                               for example in mapped.get_examples_by_category("casual", 5)))
+
+        # The vector backend loads the fitted index from the artifact instead of refitting it
+        parsed_vector = DatasetLoader("vector", tags_path=None, artifact_path=None, dataset_paths=[dataset_path])
+        mapped_vector = DatasetLoader("vector", tags_path=None, artifact_path=artifact_path, dataset_paths=[dataset_path])
+        assert isinstance(mapped_vector.vector_index.matrix, np.ndarray) and not mapped_vector.vector_index.matrix.flags.writeable
+        for message in ["how was your day", "i feel so lonely tonight"]:
+            expected = parsed_vector.vector_index.top_k(parsed_vector.vector_index.query_vector(message), 3)
+            ranked = mapped_vector.vector_index.top_k(mapped_vector.vector_index.query_vector(message), 3)
+            assert [example_id for example_id, _ in ranked] == [example_id for example_id, _ in expected]
+
+        # Parsed examples are kept in a bounded LRU cache
+        examples = DatasetArtifact(artifact_path).examples
+        examples.cache_size = 8
+        first = examples[0]
+        assert examples[0] is first
+        for example_id in range(1, 20):
+            examples[example_id]
+        assert len(examples._parsed) == len(examples.example_ids) == 8
+        assert examples[0] == first and id(first) not in examples.example_ids
+        assert mapped.format_examples_for_prompt([first]) == parsed.format_examples_for_prompt([parsed.examples[0]])
+
+        # Editing the dataset makes the artifact stale
+        with open(dataset_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"messages": [{"role": "user", "content": "new"}]}) + "\n")
+        reloaded = DatasetLoader(tags_path=None, artifact_path=artifact_path, dataset_paths=[dataset_path])
+        assert reloaded.artifact is None and len(reloaded.examples) == len(parsed.examples) + 1
+    print(f"  Artifact OK ({len(parsed.examples)} examples)")
+
+if __name__ == "__main__":
+    test_bm25_ranking()
+    test_sparse_scores_match_dense_scoring()
+    test_context_is_down_weighted()
+    test_energy_preference()
+    test_loader_returns_requested_count()
+    test_vector_retrieval_is_diverse()
+    test_loader_vector_backend()
+    test_category_tags()
+    test_tags_are_persisted()
+    test_prompt_fragments()
+    test_compiled_artifact_matches_jsonl()
@@ -1 +1,65 @@
- 
\ No newline at end of file
+"""
+Test emoji detection, run splitting and stripping
+"""
+
+from emoji_utils import emoji_runs, is_emoji_only, split_emoji_runs, strip_emoji
+from message_analysis import analyze_message
+
+def test_emoji_only():
+    """Test emoji-only detection used to skip sexual detection"""
+
+    print("Testing Emoji Detection")
+    print("=" * 40)
+
+    cases = {
+        "😈🔥": True,
+        "😘!!": True,
+        "  🔥 🔥  ": True,
+        "❤\ufe0f": True,  # heart + variation selector
+        "👍🏽": True,  # skin tone modifier
+        "👩\u200d❤\ufe0f\u200d👨": True,  # ZWJ sequence
+        "1\ufe0f\u20e3": True,  # keycap
+        "🏴\U000e0067\U000e0062\U000e0073\U000e0063\U000e0074\U000e007f": True,  # subdivision flag (tag sequence)
+        "😘 hi": False,
+        "1": False,
+        "???": False,  # punctuation alone is not an emoji
+        "": False,
+        "→ next": False,
+    }
+    for text, expected in cases.items():
+        print(f"  {text!r} -> {is_emoji_only(text)}")
+        assert is_emoji_only(text) == expected, text
+
+def test_runs_keep_sequences_whole():
+    """Test that modifiers, variation selectors and ZWJ sequences stay in one run"""
+
+    family = "👨\u200d👩\u200d👧"
+    text = f"hey {family}👍🏽 and ❤\ufe0f x"
+    runs = emoji_runs(text)
+    assert [text[start:end] for start, end in runs] == [family + "👍🏽", "❤\ufe0f"]
+    assert "".join(segment for segment, _ in split_emoji_runs(text)) == text
+    assert [is_emoji for _, is_emoji in split_emoji_runs(text)] == [False, True, False, True, False]
+    print(f"  Runs: {runs}")
+
+def test_strip_emoji():
+    """Test stripping leaves no orphaned joiners or selectors"""
+
+    assert strip_emoji("love you ❤\ufe0f👩\u200d❤\ufe0f\u200d👨!") == "love you !"
+    assert strip_emoji("no emojis here") == "no emojis here"
+    assert strip_emoji("room 1\ufe0f\u20e3 or 2") == "room  or 2"
+    print("  Strip OK")
+
+def test_message_analysis_uses_runs():
+    """Test that message analysis reports emoji runs"""
+
+    analysis = analyze_message("hi 😘😘 babe ❤\ufe0f")
+    assert analysis.emoji_spans == [(3, 5), (11, 13)]
+    assert not analysis.is_emoji_only
+    assert analyze_message("❤\ufe0f🔥").is_emoji_only
+    print("  Message analysis OK")
+
+if __name__ == "__main__":
+    test_emoji_only()
+    test_runs_keep_sequences_whole()
+    test_strip_emoji()
+    test_message_analysis_uses_runs()
@@ -0,0 +1,76 @@
+"""
+Test the shared LLM JSON parser and its repair heuristics
+"""
+
+from llm_json_parser import LLMJsonParser, extract_json_object
+from energy_types import EnergyLevel, EnergyType, EmotionState, NervousSystemState
+
+ENERGY_JSON = '{"energy_level": "high", "energy_type": "intimate", "dominant_emotion": "flirty", "nervous_system_state": "rest_and_digest", "intensity_score": 0.8, "confidence": 0.9, "reasoning": "test"}'
+
+def test_repairs_common_defects():
+    """Test that fenced, chatty and single-quoted replies still parse"""
+
+    print("Testing JSON Repair")
+    print("=" * 40)
+
+    test_cases = {
+        "plain": ENERGY_JSON,
+        "code_fence": f"```json\n{ENERGY_JSON}\n```",
+        "trailing_text": f"Here is the analysis: {ENERGY_JSON} Hope this helps! {{not json}}",
+        "single_quotes": ENERGY_JSON.replace('"', "'"),
+        "trailing_comma": ENERGY_JSON.replace(', "reasoning": "test"}', ', "reasoning": "test",}'),
+        "truncated": ENERGY_JSON[:-1],
+    }
+
+    for name, text in test_cases.items():
+        result = extract_json_object(text)
+        print(f"  {name}: {'OK' if result else 'FAILED'}")
+        assert result is not None, name
+        assert result["energy_level"] == "high"
+
+    assert extract_json_object("no json here at all") is None
+    assert extract_json_object("") is None
+
+def test_energy_signature_validation():
+    """Test that fields are validated into EnergySignature enums"""
+
+    parser = LLMJsonParser()
+    signature = parser.parse_energy_signature(f"```{ENERGY_JSON}```", "test-model")
+
+    assert signature.energy_level == EnergyLevel.HIGH
+    assert signature.energy_type == EnergyType.INTIMATE
+    assert signature.dominant_emotion == EmotionState.EXCITED  # 'flirty' alias
+    assert signature.nervous_system_state == NervousSystemState.REST_AND_DIGEST
+
+    # Invalid enum values are a parse failure, not an exception
+    assert parser.parse_energy_signature(ENERGY_JSON.replace('"high"', '"extreme"'), "test-model") is None
+
+    stats = parser.parse_stats.get_stats()["test-model"]
+    print(f"  Parse stats: {stats}")
+    assert stats["repaired"] == 1
+    assert stats["failed"] == 1
+
+def test_safety_and_response_validation():
+    """Test safety and response dict validation"""
+
+    parser = LLMJsonParser()
+
+    safety = parser.parse_safety_result('{"safety_score": "0.95", "issues": "threat"}', "test-model")
+    assert safety["recommendation"] == "STOP"  # derived from score
+    assert safety["issues"] == ["threat"]
+    assert safety["risk_factors"] == []
+
+    assert parser.parse_safety_result('{"issues": []}', "test-model") is None
+
+    analysis = parser.parse_response_analysis("{'should_continue': 'false', 'confidence': 2}", "other-model")
+    assert analysis["should_continue"] is False
+    assert analysis["confidence"] == 1.0
+    assert analysis["engagement_level"] == "medium"
+
+    assert parser.parse_stats.failure_rate("test-model") == 0.5
+    print("  Safety and response validation OK")
+
+if __name__ == "__main__":
+    test_repairs_common_defects()
+    test_energy_signature_validation()
+    test_safety_and_response_validation()
@@ -0,0 +1,129 @@
+"""
+Test the shared single-pass keyword engine
+"""
+
+import json
+import os
+import tempfile
+from keyword_engine import KeywordEngine, scan_keywords
+from lexicons import load_lexicons
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "keyword_regression_corpus.json")
+
+def test_single_pass_hits_by_category():
+    """Test that overlapping terms across categories are all reported with positions"""
+
+    print("Testing Keyword Engine")
+    print("=" * 40)
+
+    engine = KeywordEngine({
+        "explicit": ["fuck", "fuck me", "make me cum"],
+        "teasing": ["horny", "so horny"],
+        "crisis": ["died"],
+    })
+    hits = engine.scan("I'm SO HORNY, fuck me now")
+
+    assert hits.terms("explicit") == ["fuck me", "fuck"]
+    assert hits.terms("teasing") == ["so horny", "horny"]
+    assert hits.positions("teasing") == [(4, 12), (7, 12)]
+    assert not hits.has("crisis")
+    assert hits.categories == {"explicit", "teasing"}
+    print(f"  Matches: {[match.term for match in hits.matches]}")
+
+def test_exact_and_registration():
+    """Test whole-message matches and runtime lexicon changes"""
+
+    engine = KeywordEngine({"greeting": ["hi", "hey"]})
+    assert engine.scan("  Hey ").exact("greeting")
+    assert not engine.scan("hey you").exact("greeting")
+
+    engine.register("scenario:test", ["story time"])
+    assert engine.scan("story time?").first("scenario:test") == "story time"
+    engine.unregister("scenario:test")
+    assert not engine.scan("story time?").has("scenario:test")
+    print("  Exact match and registration OK")
+
+def test_word_boundaries_and_inflections():
+    """Test that terms match whole words and simple inflections only"""
+
+    engine = KeywordEngine({"violence": ["hit", "kill", "attack"], "reciprocal": ["u?"], "crisis": ["pain"]})
+
+    assert not engine.scan("a white shirt from spain").categories
+    assert engine.scan("he hit me").terms("violence") == ["hit"]
+    assert engine.scan("stop hitting, he killed it").terms("violence") == ["hit", "kill"]
+    assert engine.scan("how r u?").has("reciprocal")
+    assert not engine.scan("and you?").has("reciprocal")  # "u?" must start a word
+    assert not engine.scan("painting all day").has("crisis")
+    print("  Word boundaries OK")
+
+def test_regression_corpus():
+    """Test the lexicons against messages from the test scenarios and known false triggers"""
+
+    with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+        cases = json.load(f)["cases"]
+
+    failures = []
+    for case in cases:
+        hits = scan_keywords(case["text"])
+        failures += [(case["text"], category) for category in case["match"] if not hits.has(category)]
+        failures += [(case["text"], "not " + category) for category in case["no_match"] if hits.has(category)]
+        failures += [(case["text"], "exact " + category) for category in case["exact"] if not hits.exact(category)]
+
+    print(f"  Regression corpus: {len(cases)} cases, {len(failures)} failures")
+    assert not failures, failures
+
+def test_incremental_registration_matches_full_build():
+    """Test that registering and removing categories in place gives the same hits as compiling from scratch"""
+
+    base = {"violence": ["hit", "kill"], "reciprocal": ["u?"]}
+    engine = KeywordEngine(base)
+    engine.register_many({"scenario:a": ["hit", "in bed", "wbu?"], "violence": ["stab"]})
+    engine.register("scenario:b", ["in bed", "story time"])
+    engine.unregister_many(["scenario:a", "violence"])  # violence falls back to the base terms
+
+    full = KeywordEngine({**base, "scenario:b": ["in bed", "story time"]})
+    for text in ["he hit me in bed, wbu?", "stab", "story time u?", "killed it"]:
+        incremental_hits = sorted((m.term, m.start, sorted(m.categories)) for m in engine.scan(text).matches)
+        full_hits = sorted((m.term, m.start, sorted(m.categories)) for m in full.scan(text).matches)
+        assert incremental_hits == full_hits, text
+    print("  Incremental registration OK")
+
+def test_lexicon_file_hot_reload():
+    """Test that an edited lexicon file is recompiled and swapped in, keeping registered categories"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lexicons.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "categories": {"greeting": {"terms": ["hi"]}}}, f)
+
+        version, lexicons = load_lexicons(path)
+        engine = KeywordEngine(lexicons, path=path, version=version, reload_interval=0)
+        engine.register("scenario:test", ["story time"])
+        assert engine.scan("hi").has("greeting")
+        assert not engine.reload_if_changed()  # unchanged file
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 2, "categories": {"greeting": ["hello"]}}, f)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+
+        assert engine.reload_if_changed()
+        assert engine.version == 2
+        assert not engine.scan("hi").has("greeting")  # cached result from the old index is dropped
+        assert engine.scan("hello").has("greeting")
+        assert engine.scan("story time").has("scenario:test")
+
+        # A broken edit keeps the working lexicons
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"categories": ')
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 2_000_000))
+        assert not engine.reload_if_changed()
+        assert engine.version == 2 and engine.scan("hello").has("greeting")
+    print("  Hot reload OK")
+
+if __name__ == "__main__":
+    test_single_pass_hits_by_category()
+    test_exact_and_registration()
+    test_word_boundaries_and_inflections()
+    test_regression_corpus()
+    test_incremental_registration_matches_full_build()
+    test_lexicon_file_hot_reload()
@@ -0,0 +1,245 @@
+"""
+Test the local energy classifier cascade tier
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+
+os.environ.setdefault("MISTRAL_API_KEY", "test")
+
+import energy_analyzer
+from energy_analyzer import LLMEnergyAnalyzer
+from local_energy_classifier import (LocalEnergyClassifier, CascadeStats, load_training_data, log_llm_label,
+                                     DEFAULT_LABELS_PATH, DEFAULT_MODEL_PATH, LLM_LABEL_WEIGHT, MAX_PSEUDO_WEIGHT_SHARE)
+from shared_resources import SharedResources
+from energy_types import EnergySignature, EnergyLevel, EnergyType, EmotionState, NervousSystemState
+
+def _label(level, energy_type, emotion, state, intensity):
+    return {
+        "energy_level": level,
+        "energy_type": energy_type,
+        "dominant_emotion": emotion,
+        "nervous_system_state": state,
+        "intensity_score": intensity
+    }
+
+SAD = _label("low", "cooperative", "sad", "rest_and_digest", 0.8)
+HAPPY = _label("high", "playful", "happy", "rest_and_digest", 0.7)
+ANGRY = _label("high", "combative", "angry", "fight", 0.9)
+
+TRAINING = [
+    ("i feel so sad today", SAD), ("my dog died and im crying", SAD),
+    ("everything hurts and i feel alone", SAD), ("so sad and lonely tonight", SAD),
+    ("haha you are so funny", HAPPY), ("lol that made my day", HAPPY),
+    ("yay im so happy to see you", HAPPY), ("haha love this, so fun", HAPPY),
+    ("i hate you so much", ANGRY), ("shut up, you are useless", ANGRY),
+    ("this is stupid and i am furious", ANGRY), ("stop it, i hate this", ANGRY),
+]
+
+def _train() -> LocalEnergyClassifier:
+    texts = [text for text, _ in TRAINING]
+    labels = [label for _, label in TRAINING]
+    return LocalEnergyClassifier().fit(texts, labels, [1.0] * len(texts))
+
+def test_predicts_signature_with_confidence():
+    """Test that predictions come back as EnergySignatures"""
+
+    print("Testing Local Energy Classifier")
+    print("=" * 40)
+
+    classifier = _train()
+    signature = classifier.predict("i feel so sad and alone")
+    print(f"  sad message: {signature.dominant_emotion.value} ({signature.confidence:.2f})")
+
+    assert signature.dominant_emotion == EmotionState.SAD
+    assert signature.energy_type == EnergyType.COOPERATIVE
+    assert 0.0 < signature.confidence <= 1.0
+    assert 0.0 <= signature.intensity_score <= 1.0
+    assert classifier.predict("   ") is None
+
+def test_save_and_load_round_trip():
+    """Test persistence and the prediction cache"""
+
+    classifier = _train()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "energy_classifier.pkl")
+        classifier.save(path)
+        loaded = LocalEnergyClassifier.load(path)
+        assert LocalEnergyClassifier.load(os.path.join(tmp, "missing.pkl")) is None
+
+    first = loaded.predict("haha so funny")
+    second = loaded.predict("HAHA  so funny")  # same normalized text hits the cache
+    assert first.dominant_emotion == EmotionState.HAPPY
+    assert first.confidence == second.confidence
+    assert len(loaded._cache) == 1
+    print("  Save/load round trip OK")
+
+def test_label_logging_and_training_data():
+    """Test that logged LLM labels outrank pseudo labels for the same message"""
+
+    signature = EnergySignature(
+        timestamp=0.0, energy_level=EnergyLevel.HIGH, energy_type=EnergyType.INTIMATE,
+        dominant_emotion=EmotionState.LOVING, nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+        intensity_score=0.7, confidence=0.9
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        labels_path = os.path.join(tmp, "energy_labels.jsonl")
+        dataset_path = os.path.join(tmp, "dataset.jsonl")
+        log_llm_label("miss you babe", signature, "test-model", labels_path)
+        with open(dataset_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"messages": [
+                {"role": "user", "content": "Miss you  babe"},
+                {"role": "assistant", "content": "miss you more"},
+                {"role": "user", "content": "i hate this"}
+            ]}) + "\n")
+
+        texts, labels, weights = load_training_data(labels_path, [dataset_path])
+
+    assert texts == ["miss you babe", "i hate this"]
+    assert labels[0]["dominant_emotion"] == "loving"
+    assert weights[0] > weights[1]
+    print("  Label logging OK")
+
+def test_label_log_rotation():
+    """Test that a full label log is rotated and both files still feed training"""
+
+    signature = EnergySignature(
+        timestamp=0.0, energy_level=EnergyLevel.LOW, energy_type=EnergyType.COOPERATIVE,
+        dominant_emotion=EmotionState.SAD, nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+        intensity_score=0.8, confidence=0.9
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        labels_path = os.path.join(tmp, "energy_labels.jsonl")
+        for message in ("first", "second", "third"):
+            log_llm_label(message, signature, "test-model", labels_path, max_bytes=1)
+        with open(labels_path, encoding='utf-8') as f:
+            assert [json.loads(line)["message"] for line in f] == ["third"]
+        with open(labels_path + ".1", encoding='utf-8') as f:
+            assert [json.loads(line)["message"] for line in f] == ["second"]
+        texts, _, _ = load_training_data(labels_path, [os.path.join(tmp, "missing.jsonl")])
+    assert texts == ["second", "third"]
+    print("  Label log rotation OK")
+
+def _stub_resources(local_classifier=None, calls=None):
+    """Shared resources whose client answers every energy prompt with a sad label"""
+    reply = json.dumps({"energy_level": "low", "energy_type": "cooperative", "dominant_emotion": "sad",
+                        "nervous_system_state": "rest_and_digest", "intensity_score": 0.8, "confidence": 0.9})
+    response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))], usage=None)
+
+    def complete(**kwargs):
+        if calls is not None:
+            calls.append(kwargs["messages"])
+        return response
+
+    resources = SharedResources()
+    resources._built["mistral_client"] = SimpleNamespace(chat=SimpleNamespace(complete=complete))
+    resources._built["local_classifier"] = local_classifier
+    return resources
+
+def test_pseudo_labels_are_capped():
+    """Test that pseudo labels cannot outweigh a handful of LLM labels"""
+
+    signature = EnergySignature(
+        timestamp=0.0, energy_level=EnergyLevel.LOW, energy_type=EnergyType.COOPERATIVE,
+        dominant_emotion=EmotionState.SAD, nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+        intensity_score=0.8, confidence=0.9
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        labels_path = os.path.join(tmp, "energy_labels.jsonl")
+        dataset_path = os.path.join(tmp, "dataset.jsonl")
+        with open(dataset_path, 'w', encoding='utf-8') as f:
+            for i in range(200):
+                f.write(json.dumps({"messages": [{"role": "user", "content": f"message number {i}"}]}) + "\n")
+
+        # Without LLM labels the pseudo labels train at full weight
+        _, _, weights = load_training_data(labels_path, [dataset_path])
+        assert weights == [1.0] * 200
+
+        log_llm_label("i am so sad", signature, "test-model", labels_path)
+        _, _, weights = load_training_data(labels_path, [dataset_path])
+
+    assert weights[0] == LLM_LABEL_WEIGHT
+    assert abs(sum(weights[1:]) / sum(weights) - MAX_PSEUDO_WEIGHT_SHARE) < 1e-9
+    print(f"  Pseudo label weight: {weights[1]:.4f} each")
+
+def test_crisis_messages_always_escalate():
+    """Test that crisis and distress messages reach the LLM even when the classifier is confident"""
+
+    class ConfidentClassifier:
+        def predict(self, message):
+            return EnergySignature(
+                timestamp=0.0, energy_level=EnergyLevel.HIGH, energy_type=EnergyType.PLAYFUL,
+                dominant_emotion=EmotionState.HAPPY, nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+                intensity_score=0.5, confidence=0.99
+            )
+
+    calls = []
+    analyzer = LLMEnergyAnalyzer(_stub_resources(ConfidentClassifier(), calls))
+    assert asyncio.run(analyzer.analyze_message_energy("haha so funny")).dominant_emotion == EmotionState.HAPPY
+    assert calls == []
+    for message in ("my dog died today", "i want to die", "please help me"):
+        assert asyncio.run(analyzer.analyze_message_energy(message)).dominant_emotion == EmotionState.SAD
+    assert len(calls) == 3
+    print("  Crisis escalation OK")
+
+def test_label_logging_is_opt_in_and_user_only():
+    """Test that labels are only logged when enabled, and never for the bot's replies"""
+
+    resources = _stub_resources()
+
+    logged = []
+    original = energy_analyzer.log_llm_label
+    energy_analyzer.log_llm_label = lambda message, *args: logged.append(message)
+    saved = os.environ.pop("LOG_ENERGY_LABELS", None)
+    try:
+        asyncio.run(LLMEnergyAnalyzer(resources).analyze_message_energy("i am so sad"))
+        assert logged == []
+
+        os.environ["LOG_ENERGY_LABELS"] = "true"
+        analyzer = LLMEnergyAnalyzer(resources)
+        asyncio.run(analyzer.analyze_message_energy("i am so sad"))
+        asyncio.run(analyzer.analyze_message_energy("aww come here", role="assistant"))
+        assert logged == ["i am so sad"]
+    finally:
+        energy_analyzer.log_llm_label = original
+        os.environ.pop("LOG_ENERGY_LABELS", None)
+        if saved is not None:
+            os.environ["LOG_ENERGY_LABELS"] = saved
+    print("  Opt-in user-only logging OK")
+
+def test_paths_do_not_depend_on_working_directory():
+    """Test that the model, label log and datasets are found from any working directory"""
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            assert all(os.path.isabs(path) for path in (DEFAULT_MODEL_PATH, DEFAULT_LABELS_PATH))
+            texts, _, _ = load_training_data(os.path.join(tmp, "missing.jsonl"))
+        finally:
+            os.chdir(cwd)
+    assert texts, "dataset user turns should be found outside the repository directory"
+    print(f"  Paths OK ({len(texts)} dataset turns)")
+
+def test_cascade_stats():
+    """Test hit-rate reporting"""
+
+    stats = CascadeStats()
+    for hit in (True, True, True, False):
+        stats.record(hit)
+    assert stats.get_stats()["hit_rate"] == 0.75
+    print(f"  Cascade stats: {stats.get_stats()}")
+
+if __name__ == "__main__":
+    test_predicts_signature_with_confidence()
+    test_save_and_load_round_trip()
+    test_label_logging_and_training_data()
+    test_label_log_rotation()
+    test_label_logging_is_opt_in_and_user_only()
+    test_pseudo_labels_are_capped()
+    test_crisis_messages_always_escalate()
+    test_paths_do_not_depend_on_working_directory()
+    test_cascade_stats()
@@ -0,0 +1,55 @@
+"""
+Test the per-turn message analysis record
+"""
+
+from message_analysis import analyze_message
+from message_splitter import MessageSplitter
+
+def test_analysis_fields():
+    """Test normalization, tokens, emojis and length classes"""
+
+    print("Testing Message Analysis")
+    print("=" * 40)
+
+    analysis = analyze_message("  Hey babe 😘😘 how are you?  ")
+    print(f"  tokens={analysis.tokens} emojis={analysis.emoji_spans} class={analysis.length_class}")
+
+    assert analysis.normalized == "hey babe 😘😘 how are you?"
+    assert analysis.tokens == ["hey", "babe", "how", "are", "you"]
+    assert len(analysis.emoji_spans) == 1  # one run of two emojis
+    assert analysis.question_count == 1
+    assert analysis.length == 28
+    assert analysis.length_class == "short"
+    assert analysis.keyword_hits.has("reciprocal")
+    assert not analysis.is_emoji_only
+
+    assert analyze_message("x" * 30).length_class == "medium"
+    assert analyze_message("x" * 51).length_class == "long"
+    assert analyze_message("").length_class == "empty"
+
+def test_emoji_only_detection():
+    """Test the emoji-only check used to skip sexual detection"""
+
+    assert analyze_message("😈🔥").is_emoji_only
+    assert analyze_message("😘!!").is_emoji_only
+    assert not analyze_message("😘 hi").is_emoji_only
+    assert not analyze_message("").is_emoji_only
+    print("  Emoji-only detection OK")
+
+def test_splitter_reuses_analysis():
+    """Test that the splitter gives the same result with a precomputed analysis"""
+
+    splitter = MessageSplitter()
+    message = ("I'm so sorry you're feeling this way, baby. I can hear the pain in your voice and it breaks my heart. "
+               "You're not alone in this, okay? I'm here for you, always.")
+    with_analysis = splitter.split_message(message, "emotional", analyze_message(message))
+    without_analysis = splitter.split_message(message, "emotional")
+
+    assert [part.content for part in with_analysis] == [part.content for part in without_analysis]
+    assert splitter._detect_content_type(message, analyze_message(message)) == "crisis"
+    print(f"  Split into {len(with_analysis)} parts")
+
+if __name__ == "__main__":
+    test_analysis_fields()
+    test_emoji_only_detection()
+    test_splitter_reuses_analysis()
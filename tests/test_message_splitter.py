@@ -0,0 +1,87 @@
+"""
+Test sentence classification and part cleanup in the message splitter
+"""
+
+from message_splitter import MessageSplitter
+
+def test_sentence_class_priority():
+    """Test that the highest-priority class wins when several match"""
+
+    print("Testing Message Splitter")
+    print("=" * 40)
+
+    splitter = MessageSplitter()
+    cases = {
+        "Now you're going to listen to me.": "demand",          # also emotional ("you're")
+        "Are you thinking about me?": "question",
+        "I understand how hard that is.": "emotional",
+        "Then the door opened slowly.": "storytelling",
+        "Imagine my hands on your back.": "sensory",
+        "*giggles* you're cute.": "emotional",                    # emotional outranks the *action* tease
+        "Haha stop.": "teasing",
+        "ok": "teasing",                                           # short default
+    }
+    for sentence, expected in cases.items():
+        actual = splitter._classify_sentence(sentence)
+        print(f"  {sentence!r} -> {actual}")
+        assert actual == expected, (sentence, actual)
+
+def test_clean_message_part():
+    """Test emoji relocation and question punctuation"""
+
+    splitter = MessageSplitter()
+    assert splitter._clean_message_part("😘😘miss you.") == "miss you😘😘."
+    assert splitter._clean_message_part("what are you doing.") == "what are you doing?"
+    assert splitter._clean_message_part("somewhere  over   there") == "somewhere over there"
+    # Openers only count as whole words ("show" is not "how")
+    assert splitter._clean_message_part("show me.") == "show me."
+    print("  Cleanup OK")
+
+def test_recompiles_custom_patterns():
+    """Test that edited pattern lists take effect after recompiling"""
+
+    splitter = MessageSplitter()
+    splitter.demand_patterns.append(r'[Kk]neel[^.]*\.')
+    splitter._compile_sentence_classes()
+    assert splitter._classify_sentence("Kneel for me.") == "demand"
+    print("  Custom patterns OK")
+
+def _stream_split(splitter, message, context, chunk_size=5):
+    """Feed a message in small chunks; returns (parts, characters streamed when the first part came out)"""
+    split = splitter.stream(context)
+    parts, first_part_at = [], None
+    for start in range(0, len(message), chunk_size):
+        parts += split.feed(message[start:start + chunk_size])
+        if parts and first_part_at is None:
+            first_part_at = start + chunk_size
+    return parts + split.finish(), first_part_at
+
+def test_streaming_split_matches_full_split():
+    """Test that streamed parts match split_message and the first one goes out early"""
+
+    splitter = MessageSplitter()
+    message = ("Mmm, *such* a greedy boy for mommy's mouth already 😈💋 Of course I can, baby. "
+               "Are you ready for me? Now you're going to earn every slow inch, understand?")
+    parts, first_part_at = _stream_split(splitter, message, "sexual")
+
+    assert [(part.content, part.type) for part in parts] == \
+        [(part.content, part.type) for part in splitter.split_message(message, "sexual")]
+    assert len(parts) <= 3
+    assert first_part_at is not None and first_part_at < len(message)
+    print(f"  First of {len(parts)} parts ready after {first_part_at}/{len(message)} chars")
+
+def test_streaming_short_reply_stays_whole():
+    """Test that replies under the split threshold come out as one complete part at the end"""
+
+    splitter = MessageSplitter()
+    parts, first_part_at = _stream_split(splitter, "Hey baby! How was your day? 😘", "general")
+    assert first_part_at is None
+    assert [(part.content, part.type, part.delay) for part in parts] == [("Hey baby! How was your day? 😘", "complete", 0.0)]
+    print("  Short streamed reply OK")
+
+if __name__ == "__main__":
+    test_sentence_class_priority()
+    test_clean_message_part()
+    test_recompiles_custom_patterns()
+    test_streaming_split_matches_full_split()
+    test_streaming_short_reply_stays_whole()
@@ -0,0 +1,129 @@
+"""
+Test SLO-driven model tier selection
+"""
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+from model_selector import StageModelController
+
+MODELS = ["open-mistral-7b", "mistral-small-latest", "mistral-medium-latest"]
+
+def test_steps_down_when_p95_exceeds_slo():
+    """Test that a slow tier is replaced by the next cheaper one"""
+
+    print("Testing Tier Step-Down")
+    print("=" * 40)
+
+    controller = StageModelController("test", MODELS, latency_slo=1.0, min_samples=5, preferred_index=1)
+    assert controller.select_index() == 1  # not enough samples yet
+
+    for latency in [0.4, 0.5, 0.6, 1.8, 2.2]:
+        controller.record("mistral-small-latest", latency)
+
+    print(f"  p95: {controller.p95_latency('mistral-small-latest')}")
+    assert controller.select_index() == 0
+    assert controller.current_model == "open-mistral-7b"
+    assert controller.select_index() == 0  # window for the new tier starts empty
+
+def test_steps_up_on_quality_failures_with_headroom():
+    """Test that parse failures move to a stronger tier when latency allows"""
+
+    controller = StageModelController("test", MODELS, latency_slo=2.0, min_samples=5)
+    for i in range(5):
+        controller.record("open-mistral-7b", 0.3, parse_failed=i % 2 == 0)
+
+    assert controller.select_index() == 1
+    assert controller.preferred_index == 1
+    print(f"  Changes: {controller.get_status()['recent_changes']}")
+
+def test_errors_count_as_failures():
+    """Test that calls which raised count towards quality and latency"""
+
+    controller = StageModelController("test", MODELS, latency_slo=2.0, min_samples=5)
+    for i in range(5):
+        controller.record("open-mistral-7b", 0.3, error=i < 2)
+    assert controller.quality_failure_rate("open-mistral-7b") == 0.4
+    assert controller.select_index() == 1
+
+    controller = StageModelController("test", MODELS, latency_slo=1.0, min_samples=3, preferred_index=2)
+    for _ in range(3):
+        controller.record("mistral-medium-latest", 5.0, error=True)  # timeouts
+    assert controller.p95_latency("mistral-medium-latest") == 5.0
+    assert controller.select_index() == 1
+    print("  Errors recorded OK")
+
+def test_cooldown_applies_to_every_change():
+    """Test that no tier change follows another within the cooldown"""
+
+    controller = StageModelController("test", MODELS, latency_slo=1.0, min_samples=3, cooldown=60.0, preferred_index=2)
+    for _ in range(3):
+        controller.record("mistral-medium-latest", 3.0)
+    assert controller.select_index() == 1
+    for _ in range(3):
+        controller.record("mistral-small-latest", 3.0)
+    assert controller.select_index() == 1  # still over the SLO, but cooling down
+
+    controller.last_change -= 60.0
+    assert controller.select_index() == 0
+
+    # A failover is not held back, but starts a cooldown of its own
+    controller.last_change -= 60.0
+    controller.fail_over(2)
+    assert controller.current_index == 2
+    for _ in range(3):
+        controller.record("mistral-medium-latest", 3.0)
+    assert controller.select_index() == 2
+    print(f"  Changes: {[change['reason'] for change in controller.get_status()['recent_changes']]}")
+
+def test_returns_to_preferred_tier_after_cooldown():
+    """Test stepping back up once the cheaper tier shows headroom"""
+
+    controller = StageModelController("test", MODELS, latency_slo=1.0, min_samples=3, cooldown=0.0, preferred_index=2)
+    assert controller.select_index() == 2
+    for _ in range(3):
+        controller.record("mistral-medium-latest", 3.0)
+    assert controller.select_index() == 1
+
+    for _ in range(3):
+        controller.record("mistral-small-latest", 0.2)
+    assert controller.select_index() == 2
+
+def test_agents_share_the_stage_tier():
+    """Test that agents read the stage's tier from one controller, and a failed call fails it over"""
+
+    os.environ.setdefault("MISTRAL_API_KEY", "test")
+    from energy_analyzer import rule_based_energy_analysis
+    from safety_monitor import LLMSafetyMonitor
+    from shared_resources import SharedResources
+
+    def complete(model, **kwargs):
+        if model == "open-mistral-7b":
+            raise RuntimeError("Service tier capacity exceeded")
+        reply = '{"safety_score": 0.1, "issues": [], "risk_factors": [], "recommendation": "SAFE", "reasoning": "ok"}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))], usage=None)
+
+    resources = SharedResources()
+    resources._built["mistral_client"] = SimpleNamespace(chat=SimpleNamespace(complete=complete))
+    first, second = LLMSafetyMonitor(resources), LLMSafetyMonitor(resources)
+    assert first.model_controller is second.model_controller
+    assert not hasattr(first, "current_model_index")
+
+    controller = StageModelController("test", MODELS, latency_slo=1.0)
+    first.model_controller = second.model_controller = controller
+    context = SimpleNamespace(messages=[])
+    result = asyncio.run(first.analyze_safety_with_energy("hi", rule_based_energy_analysis("hi"), context))
+    assert result["recommendation"] == "SAFE"
+    assert controller.quality_failure_rate("open-mistral-7b") == 1.0
+    # The other session starts on the tier the first one failed over to
+    assert controller.current_model == "mistral-small-latest"
+    print("  Shared tier OK")
+
+if __name__ == "__main__":
+    test_steps_down_when_p95_exceeds_slo()
+    test_steps_up_on_quality_failures_with_headroom()
+    test_errors_count_as_failures()
+    test_cooldown_applies_to_every_change()
+    test_returns_to_preferred_tier_after_cooldown()
+    test_agents_share_the_stage_tier()
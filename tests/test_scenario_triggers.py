@@ -0,0 +1,44 @@
+"""
+Test scenario selection through the indexed trigger words
+"""
+
+from enhanced_script_manager import EnhancedScriptManager, ScenarioScript
+
+def _scenario(name, trigger_words, priority):
+    return ScenarioScript(name=name, description=name, messages=[], energy_flow=[], success_criteria={},
+                          trigger_words=trigger_words, trigger_priority=priority)
+
+def test_highest_priority_trigger_wins():
+    """Test that the highest-priority scenario wins regardless of trigger order in the message"""
+
+    print("Testing Scenario Triggers")
+    print("=" * 40)
+
+    manager = EnhancedScriptManager()
+    assert manager.match_trigger_words("take me to the park and fuck me") == "room_intimacy_scenario"
+    assert manager.match_trigger_words("i'm so tired, my dog died") == "crisis_scenario"
+    assert manager.match_trigger_words("i miss you") == "intimate_scenario"
+    assert manager.match_trigger_words("nothing much") is None
+    # Triggers match whole words only
+    assert manager.match_trigger_words("that was scary") is None
+
+def test_add_and_remove_scenarios():
+    """Test that added scenarios are matched at their priority and removed ones are forgotten"""
+
+    manager = EnhancedScriptManager()
+    manager.add_scenario("test_movie_scenario", _scenario("Movie night", ["movie night", "netflix"], 5))
+    assert manager.match_trigger_words("netflix tonight?") == "test_movie_scenario"
+    # A lower-priority scenario never beats crisis support
+    assert manager.match_trigger_words("movie night after the funeral... my dad died") == "crisis_scenario"
+
+    manager.add_scenario("test_urgent_scenario", _scenario("Urgent", ["netflix"], 100))
+    assert manager.match_trigger_words("netflix tonight?") == "test_urgent_scenario"
+
+    manager.remove_scenario("test_urgent_scenario")
+    manager.remove_scenario("test_movie_scenario")
+    assert manager.match_trigger_words("netflix tonight?") is None
+    print("  Add/remove scenarios OK")
+
+if __name__ == "__main__":
+    test_highest_priority_trigger_wins()
+    test_add_and_remove_scenarios()
@@ -0,0 +1,72 @@
+"""
+Test the split plans precomputed for static script content
+"""
+
+import asyncio
+
+from energy_types import EnergyLevel, EmotionState, EnergySignature, EnergyType, NervousSystemState
+from enhanced_script_manager import (EnhancedScriptManager, ScenarioMessage, ScenarioScript, ScenarioType,
+                                     ADAPTATION_BUCKETS, SPLIT_CONTEXTS)
+
+def _parts(parts):
+    return [(part.content, part.type, part.delay) for part in parts]
+
+def test_plans_match_live_split():
+    """Test that every script text and energy variant has a plan equal to a live split"""
+
+    print("Testing Script Split Plans")
+    print("=" * 40)
+
+    manager = EnhancedScriptManager()
+    for scenario in manager.scenarios.values():
+        for message in scenario.messages:
+            for variant in message.variants.values():
+                for text in (variant if isinstance(variant, list) else [variant]):
+                    for context in SPLIT_CONTEXTS:
+                        plan = manager.get_split_plan(text, context)
+                        assert plan is not None, (text, context)
+                        assert _parts(plan) == _parts(manager.message_splitter.split_message(text, context))
+
+    print(f"  {len(manager.split_plans)} plans verified")
+
+def test_unknown_text_and_removal():
+    """Test that generated text has no plan and removed scenarios drop theirs"""
+
+    manager = EnhancedScriptManager()
+    assert manager.get_split_plan("a reply the model just generated", "general") is None
+
+    text = "Picture us on a blanket under the stars. Then I lean in close. Are you ready for what comes next?"
+    manager.add_scenario("test_picnic_scenario", ScenarioScript(
+        name="Picnic", description="", energy_flow=[], success_criteria={},
+        messages=[ScenarioMessage(content=text, scenario_type=ScenarioType.PLAYFUL, expected_energy_level=EnergyLevel.MEDIUM,
+                                  expected_emotions=[], safety_notes="")]))
+    assert manager.get_split_plan(text, "sexual") is not None
+    manager.remove_scenario("test_picnic_scenario")
+    assert manager.get_split_plan(text, "sexual") is None
+    print("  Unknown text and removal OK")
+
+def _energy(energy_level, emotion):
+    return EnergySignature(timestamp=0.0, energy_level=energy_level, energy_type=EnergyType.NEUTRAL,
+                           dominant_emotion=emotion, nervous_system_state=NervousSystemState.REST_AND_DIGEST,
+                           intensity_score=0.5, confidence=0.8)
+
+def test_grouped_messages_adapt_per_part():
+    """Test that grouped messages are adapted part by part from the variant table"""
+
+    manager = EnhancedScriptManager()
+    message = next(message for message in manager.scenarios["shopping_scenario"].messages
+                   if isinstance(message.content, list))
+    assert set(message.variants) == set(ADAPTATION_BUCKETS.values())
+
+    low = asyncio.run(manager._adapt_message_to_energy(message, _energy(EnergyLevel.LOW, EmotionState.HAPPY)))
+    assert len(low) == len(message.content) and not any("!" in part for part in low)
+    sad = asyncio.run(manager._adapt_message_to_energy(message, _energy(EnergyLevel.MEDIUM, EmotionState.SAD)))
+    # One empathetic opener for the whole group
+    assert sad[0].startswith("I'm here for you... ") and not any(part.startswith("I'm here") for part in sad[1:])
+    assert asyncio.run(manager._adapt_message_to_energy(message, None)) == message.content
+    print(f"  Grouped variants OK: {low[0]!r}")
+
+if __name__ == "__main__":
+    test_plans_match_live_split()
+    test_unknown_text_and_removal()
+    test_grouped_messages_adapt_per_part()
@@ -0,0 +1,46 @@
+"""
+Test the sentence-budget stop condition used for streamed replies
+"""
+
+from sentence_budget import SentenceBudget
+
+def _stream(text: str, max_sentences: int, chunk_size: int = 3) -> SentenceBudget:
+    """Feed text in small chunks like a token stream"""
+    budget = SentenceBudget(max_sentences)
+    for i in range(0, len(text), chunk_size):
+        if budget.feed(text[i:i + chunk_size]):
+            break
+    return budget
+
+def test_stops_after_budget():
+    """Test that generation stops once the next sentence starts"""
+
+    print("Testing Sentence Budget")
+    print("=" * 40)
+
+    budget = _stream("Hey baby! 😘 What's up? I was thinking about you all day. Tell me everything.", 2)
+    print(f"  Kept: '{budget.text}'")
+    assert budget.exhausted
+    assert budget.text == "Hey baby! 😘 What's up?"
+
+def test_pause_dots_do_not_end_sentences():
+    """Test that the persona's '..' pauses are not counted as sentence ends"""
+
+    text = "omg what??? I'm so sorry.. that's the worst.. are you okay? I'm here for you. Always."
+    budget = _stream(text, 2)
+    assert budget.text == "omg what??? I'm so sorry.. that's the worst.. are you okay?"
+
+    budget = _stream("It was 3.5 hours. Crazy right? Anyway", 2)
+    assert budget.text == "It was 3.5 hours. Crazy right?"
+
+def test_short_reply_is_kept_whole():
+    """Test that replies within budget are untouched"""
+
+    budget = _stream("Mmm you're so sweet 🥰 what are you up to?", 2, chunk_size=1)
+    assert not budget.exhausted
+    assert budget.text == "Mmm you're so sweet 🥰 what are you up to?"
+
+if __name__ == "__main__":
+    test_stops_after_budget()
+    test_pause_dots_do_not_end_sentences()
+    test_short_reply_is_kept_whole()
@@ -0,0 +1,112 @@
+"""
+Test that conversation systems share process-wide resources and keep per-session state apart
+"""
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault("MISTRAL_API_KEY", "test")
+
+from energy_analyzer import rule_based_energy_analysis
+from enhanced_main import EnhancedMultiAgentConversation
+from shared_resources import SharedResources, shared_resources
+
+def test_sessions_share_resources():
+    """Test that two conversation systems use the same clients, dataset and scenarios"""
+
+    print("Testing Shared Resources")
+    print("=" * 40)
+
+    first = EnhancedMultiAgentConversation()
+    second = EnhancedMultiAgentConversation()
+    clients = {id(agent.client) for system in (first, second)
+               for agent in (system.energy_analyzer, system.girlfriend_agent, system.safety_monitor, system.response_analyzer)}
+    assert clients == {id(shared_resources.mistral_client)}
+    assert first.girlfriend_agent.dataset_loader is second.girlfriend_agent.dataset_loader is shared_resources.dataset_loader
+    assert first.script_manager is second.script_manager is shared_resources.script_manager
+    assert first.energy_analyzer.local_classifier is shared_resources.local_classifier
+
+    # Per-session state stays per system
+    assert first.session_history is not second.session_history
+    first.energy_flags["status"] = "red"
+    assert second.energy_flags["status"] == "green"
+    print(f"  Built: {shared_resources.built()}")
+
+def test_resources_are_lazy_and_built_once():
+    """Test that each resource is built on first use and then reused"""
+
+    resources = SharedResources()
+    assert not any(resources.built().values())
+    client = resources.mistral_client
+    assert resources.built() == {"mistral_client": True, "dataset_loader": False,
+                                 "local_classifier": False, "script_manager": False}
+    assert resources.mistral_client is client
+    assert resources.script_manager is resources.script_manager
+    print("  Lazy build OK")
+
+def test_missing_api_key():
+    """Test that a missing key is reported when the client is first needed"""
+
+    saved = os.environ.pop("MISTRAL_API_KEY")
+    try:
+        resources = SharedResources()
+        try:
+            resources.mistral_client
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    finally:
+        os.environ["MISTRAL_API_KEY"] = saved
+    print("  Missing key OK")
+
+def test_warm_up():
+    """Test that warm-up builds everything and sends one request through the shared client"""
+
+    resources = SharedResources()
+    requests = []
+    # Stand-in client, so no network is needed
+    resources._built["mistral_client"] = SimpleNamespace(models=SimpleNamespace(list=lambda: requests.append("models")))
+    timings = resources.warm_up(prime_caches=True)
+    assert all(resources.built().values())
+    assert requests == ["models"]
+    assert {"dataset_loader", "script_manager", "http_pool", "caches"} <= set(timings)
+    print(f"  Warm-up: { {name: round(seconds, 3) for name, seconds in timings.items()} }")
+
+def test_initial_energy_is_analysed_once():
+    """Test that sessions reuse the opening message's energy instead of analysing it again"""
+
+    resources = SharedResources()
+    resources.initial_energy = rule_based_energy_analysis("Hello!")
+    system = EnhancedMultiAgentConversation(resources)
+    # Analysing the message again would raise
+    system.energy_analyzer = SimpleNamespace(analyze_message_energy=None)
+    energy = asyncio.run(system.analyze_initial_energy())
+    assert energy.dominant_emotion == resources.initial_energy.dominant_emotion
+    assert energy.timestamp >= resources.initial_energy.timestamp
+    print("  Initial energy reuse OK")
+
+def test_failed_initial_energy_is_not_cached():
+    """Test that a fallback for the opening message is used once, and the next session asks again"""
+
+    resources = SharedResources()
+    system = EnhancedMultiAgentConversation(resources)
+    calls = []
+    async def failing_analysis(message, context=None, role="user", use_fallback=True):
+        calls.append(use_fallback)
+        return None if not use_fallback else rule_based_energy_analysis(message)
+    system.energy_analyzer = SimpleNamespace(analyze_message_energy=failing_analysis)
+
+    energy = asyncio.run(system.analyze_initial_energy())
+    assert energy is not None and resources.initial_energy is None
+    asyncio.run(system.analyze_initial_energy())
+    assert calls == [False, False]
+    print("  Fallback not cached OK")
+
+if __name__ == "__main__":
+    test_sessions_share_resources()
+    test_resources_are_lazy_and_built_once()
+    test_missing_api_key()
+    test_warm_up()
+    test_initial_energy_is_analysed_once()
+    test_failed_initial_energy_is_not_cached()
@@ -0,0 +1,110 @@
+"""
+Test per-session token and cost accounting
+"""
+
+import threading
+from types import SimpleNamespace
+from usage_tracker import UsageTracker, current_session_id, parse_budget
+
+def _response(prompt_tokens: int, completion_tokens: int):
+    """Build a stand-in for a Mistral completion response"""
+    return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+
+def test_usage_aggregation():
+    """Test that usage is aggregated per session, stage and model"""
+
+    print("Testing Usage Aggregation")
+    print("=" * 40)
+
+    tracker = UsageTracker()
+    tracker.start_session("session-1")
+    tracker.record("energy_analysis", "open-mistral-7b", _response(400, 80))
+    tracker.record("safety_analysis", "open-mistral-7b", _response(350, 60))
+    tracker.record("reply_generation", "mistral-small-latest", _response(1500, 50))
+
+    tracker.start_session("session-2")
+    tracker.record("energy_analysis", "open-mistral-7b", _response(100, 20))
+
+    usage = tracker.get_session_usage("session-1")
+    print(f"  Session 1 totals: {usage['totals']}")
+    assert usage["totals"]["calls"] == 3
+    assert usage["totals"]["total_tokens"] == 2440
+    assert usage["by_stage"]["reply_generation"]["prompt_tokens"] == 1500
+    assert usage["by_model"]["open-mistral-7b"]["calls"] == 2
+    assert usage["totals"]["cost_usd"] > 0
+
+    server = tracker.get_server_usage()
+    assert server["totals"]["calls"] == 4
+    assert server["sessions"] == 2
+
+def test_session_budget_downgrades_model():
+    """Test that an exhausted budget switches to the cheapest model"""
+
+    tracker = UsageTracker()
+    token = tracker.start_session("budgeted")
+    tracker.set_session_budget("budgeted", max_tokens=1000)
+    model_options = ["open-mistral-7b", "mistral-small-latest", "mistral-large-latest"]
+
+    assert tracker.apply_budget(model_options, "mistral-large-latest") == "mistral-large-latest"
+    tracker.record("reply_generation", "mistral-large-latest", _response(900, 200))
+    assert tracker.is_over_budget()
+    assert tracker.apply_budget(model_options, "mistral-large-latest") == "open-mistral-7b"
+    current_session_id.reset(token)
+    # Outside the session's context nothing is over budget
+    assert tracker.apply_budget(model_options, "mistral-large-latest") == "mistral-large-latest"
+    print("  Budget downgrade OK")
+
+def test_concurrent_sessions_are_charged_separately():
+    """Test that sessions started in different threads charge only themselves"""
+
+    tracker = UsageTracker()
+    started = threading.Barrier(2)
+
+    def run_session(session_id, prompt_tokens):
+        tracker.start_session(session_id)
+        # Both sessions exist before either records, so a shared "active" session would mix them up
+        started.wait()
+        tracker.record("reply_generation", "open-mistral-7b", _response(prompt_tokens, 0))
+
+    threads = [threading.Thread(target=run_session, args=("a", 100)), threading.Thread(target=run_session, args=("b", 7))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tracker.get_session_usage("a")["totals"]["prompt_tokens"] == 100
+    assert tracker.get_session_usage("b")["totals"]["prompt_tokens"] == 7
+    print("  Concurrent sessions OK")
+
+def test_budget_validation():
+    """Test that budgets from request bodies are converted, and bad ones rejected"""
+
+    assert parse_budget("1000", int) == 1000 and parse_budget("0.5") == 0.5 and parse_budget(None) is None
+    assert parse_budget(1500.0, int) == 1500 and isinstance(parse_budget("2e3", int), int)
+    for bad in ("lots", "-1", -5, True, [1], "nan"):
+        try:
+            parse_budget(bad)
+            assert False, f"expected ValueError for {bad!r}"
+        except ValueError:
+            pass
+    for bad in (1.5, "1.5", "inf"):
+        try:
+            parse_budget(bad, int)
+            assert False, f"expected ValueError for integer budget {bad!r}"
+        except ValueError:
+            pass
+
+    tracker = UsageTracker()
+    tracker.start_session("strings")
+    tracker.set_session_budget("strings", max_tokens="100")
+    tracker.record("reply_generation", "open-mistral-7b", _response(90, 20))
+    assert tracker.is_over_budget("strings")
+    # A budget stored some other way never makes the check raise
+    tracker.session_budgets["strings"] = {"max_tokens": "oops", "max_cost_usd": None}
+    assert not tracker.is_over_budget("strings")
+    print("  Budget validation OK")
+
+if __name__ == "__main__":
+    test_usage_aggregation()
+    test_session_budget_downgrades_model()
+    test_concurrent_sessions_are_charged_separately()
+    test_budget_validation()
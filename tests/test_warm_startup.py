@@ -0,0 +1,73 @@
+"""
+Test that /api/health reports not ready until warm startup has finished
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("MISTRAL_API_KEY", "test")
+
+import enhanced_main
+from enhanced_main import health_status, startup_ready, warm_startup
+
+def test_health_is_gated_on_warm_startup():
+    """Test 503 while warming, 200 once warm_startup has run"""
+
+    print("Testing Warm Startup Health Gate")
+    print("=" * 40)
+
+    startup_ready.clear()
+    body, status = health_status()
+    assert status == 503 and body["status"] == "starting" and body["ready"] is False
+
+    assert warm_startup(prime_caches=True)["state"] == "ready"
+    body, status = health_status()
+    assert status == 200 and body["ready"] is True
+    assert "total" in body["startup"]["timings"]
+    print(f"  Startup timings: {body['startup']['timings']}")
+
+def test_failed_warm_startup_stays_unready():
+    """Test that a warm-up failure keeps the gate closed and is reported"""
+
+    def fail():
+        raise RuntimeError("dataset missing")
+
+    startup_ready.clear()
+    original = enhanced_main.get_conversation_system
+    enhanced_main.get_conversation_system = fail
+    try:
+        assert warm_startup(prime_caches=False)["state"] == "failed"
+    finally:
+        enhanced_main.get_conversation_system = original
+    body, status = health_status()
+    assert status == 503 and body["startup"]["error"] == "dataset missing"
+    print("  Failed warm-up OK")
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="api_server.py uses Python 3.12 f-string syntax")
+def test_health_endpoint():
+    """Test the Flask route serves the gate's status codes"""
+
+    # Warm up in the test, synchronously, instead of in the background thread
+    os.environ["WARM_STARTUP"] = "false"
+    try:
+        import api_server
+    finally:
+        os.environ.pop("WARM_STARTUP")
+    client = api_server.app.test_client()
+    assert api_server.startup_status["state"] == "skipped"
+    assert client.get("/api/health").status_code == 200
+
+    startup_ready.clear()
+    assert client.get("/api/health").status_code == 503
+    warm_startup(prime_caches=False)
+    response = client.get("/api/health")
+    assert response.status_code == 200 and response.get_json()["ready"] is True
+    print("  Health endpoint OK")
+
+if __name__ == "__main__":
+    test_health_is_gated_on_warm_startup()
+    test_failed_warm_startup_stays_unready()
+    if sys.version_info >= (3, 12):
+        test_health_endpoint()
@@ -0,0 +1,210 @@
+"""
+Token and cost accounting for Mistral completions
+"""
+
+import contextvars
+import os
+import threading
+import time
+from typing import Callable, Dict, Any, Optional, List
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# USD per 1M tokens (prompt, completion) - keep in sync with Mistral's price list
+MODEL_PRICING = {
+    "open-mistral-7b": (0.25, 0.25),
+    "mistral-small-latest": (0.2, 0.6),
+    "mistral-medium-latest": (0.4, 2.0),
+    "mistral-large-latest": (2.0, 6.0),
+}
+
+def _new_counter() -> Dict[str, Any]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost_usd": 0.0}
+
+def _add_usage(counter: Dict[str, Any], prompt_tokens: int, completion_tokens: int, cost: float):
+    counter["calls"] += 1
+    counter["prompt_tokens"] += prompt_tokens
+    counter["completion_tokens"] += completion_tokens
+    counter["total_tokens"] += prompt_tokens + completion_tokens
+    counter["cost_usd"] += cost
+
+# Session that completions in the current request or task are charged to. A context variable rather
+# than a process-wide "active" session, so concurrent sessions never charge or block each other.
+current_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("usage_session_id", default=None)
+
+def parse_budget(value: Any, cast: Callable[[Any], float] = float) -> Optional[float]:
+    """A budget from untrusted input (None for no budget); raises ValueError unless it is a non-negative number,
+    and for cast=int a whole one ("1.5" tokens is rejected rather than truncated)"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"invalid budget: {value!r}")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid budget: {value!r}") from None
+    if number != number or number < 0:
+        raise ValueError(f"budget must be a non-negative number: {value!r}")
+    if cast is int and not number.is_integer():
+        raise ValueError(f"budget must be a whole number: {value!r}")
+    return cast(number)
+
+def _budget_limit(value: Any) -> Optional[float]:
+    """A stored budget as a number, or None (no limit) if it is unusable"""
+    try:
+        return parse_budget(value)
+    except ValueError:
+        return None
+
+def _optional_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class UsageLedger:
+    """Usage aggregated overall, per stage and per model"""
+
+    def __init__(self):
+        self.totals = _new_counter()
+        self.by_stage: Dict[str, Dict[str, Any]] = {}
+        self.by_model: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        _add_usage(self.totals, prompt_tokens, completion_tokens, cost)
+        _add_usage(self.by_stage.setdefault(stage, _new_counter()), prompt_tokens, completion_tokens, cost)
+        _add_usage(self.by_model.setdefault(model, _new_counter()), prompt_tokens, completion_tokens, cost)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "totals": dict(self.totals),
+            "by_stage": {stage: dict(counter) for stage, counter in self.by_stage.items()},
+            "by_model": {model: dict(counter) for model, counter in self.by_model.items()}
+        }
+
+
+class UsageTracker:
+    """Records usage from every completion and enforces optional per-session budgets"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sessions: Dict[str, UsageLedger] = {}
+        self.server = UsageLedger()
+        self.started_at = time.time()
+
+        # Optional default budgets applied to every session
+        self.default_token_budget = _optional_float("SESSION_TOKEN_BUDGET")
+        self.default_cost_budget = _optional_float("SESSION_COST_BUDGET_USD")
+        self.session_budgets: Dict[str, Dict[str, Optional[float]]] = {}
+
+    def start_session(self, session_id: str) -> contextvars.Token:
+        """Register a session and charge completions in the current context to it"""
+        with self._lock:
+            self.sessions.setdefault(session_id, UsageLedger())
+        return use_session(session_id)
+
+    def set_session_budget(self, session_id: str, max_tokens: Optional[float] = None,
+                           max_cost_usd: Optional[float] = None):
+        """Set a token and/or cost budget for a session; raises ValueError for a negative or non-numeric budget"""
+        budget = {"max_tokens": parse_budget(max_tokens, int), "max_cost_usd": parse_budget(max_cost_usd)}
+        with self._lock:
+            self.session_budgets[session_id] = budget
+
+    def estimate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Estimate USD cost of a completion"""
+        prompt_price, completion_price = MODEL_PRICING.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def record(self, stage: str, model: str, response: Any = None, session_id: Optional[str] = None,
+               prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+        """Record usage from a completion response (or explicit token counts)"""
+        usage = getattr(response, "usage", None)
+        if prompt_tokens is None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        if completion_tokens is None:
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cost = self.estimate_cost(model, prompt_tokens, completion_tokens)
+
+        with self._lock:
+            self.server.add(stage, model, prompt_tokens, completion_tokens, cost)
+            session_id = session_id or current_session_id.get()
+            if session_id:
+                self.sessions.setdefault(session_id, UsageLedger()).add(
+                    stage, model, prompt_tokens, completion_tokens, cost
+                )
+
+    def _budget_for(self, session_id: str) -> Dict[str, Optional[float]]:
+        return self.session_budgets.get(session_id, {
+            "max_tokens": self.default_token_budget,
+            "max_cost_usd": self.default_cost_budget
+        })
+
+    def is_over_budget(self, session_id: Optional[str] = None) -> bool:
+        """Check whether a session (default: the current context's session) exceeded its budget"""
+        with self._lock:
+            session_id = session_id or current_session_id.get()
+            if not session_id or session_id not in self.sessions:
+                return False
+            budget = self._budget_for(session_id)
+            totals = self.sessions[session_id].totals
+            max_tokens, max_cost = _budget_limit(budget.get("max_tokens")), _budget_limit(budget.get("max_cost_usd"))
+            if max_tokens is not None and totals["total_tokens"] >= max_tokens:
+                return True
+            if max_cost is not None and totals["cost_usd"] >= max_cost:
+                return True
+            return False
+
+    def apply_budget(self, model_options: List[str], model: str, session_id: Optional[str] = None) -> str:
+        """Switch to the cheapest model once the session (default: the current context's) is over budget"""
+        if model_options and self.is_over_budget(session_id):
+            cheapest = model_options[0]
+            if model != cheapest:
+                print(f"💸 Session over budget - using {cheapest} instead of {model}")
+            return cheapest
+        return model
+
+    def get_session_usage(self, session_id: str) -> Dict[str, Any]:
+        """Get usage for one session"""
+        with self._lock:
+            ledger = self.sessions.get(session_id)
+            usage = ledger.to_dict() if ledger else UsageLedger().to_dict()
+            usage["budget"] = dict(self._budget_for(session_id))
+        usage["over_budget"] = self.is_over_budget(session_id)
+        return usage
+
+    def get_server_usage(self) -> Dict[str, Any]:
+        """Get usage across all sessions since startup"""
+        with self._lock:
+            usage = self.server.to_dict()
+            usage["sessions"] = len(self.sessions)
+            usage["uptime"] = time.time() - self.started_at
+        return usage
+
+
+# Global usage tracker instance
+usage_tracker = UsageTracker()
+
+# Convenience functions for easy access
+def use_session(session_id: Optional[str]) -> contextvars.Token:
+    """Charge completions made from the current context (thread or asyncio task) to a session"""
+    return current_session_id.set(session_id)
+
+def record_completion_usage(stage: str, model: str, response: Any, **kwargs):
+    """Record usage from a completion"""
+    usage_tracker.record(stage, model, response, **kwargs)
+
+def apply_session_budget(model_options: List[str], model: str, session_id: Optional[str] = None) -> str:
+    """Downgrade to the cheapest model when the session is over budget"""
+    return usage_tracker.apply_budget(model_options, model, session_id)
+
+def get_session_usage(session_id: str) -> Dict[str, Any]:
+    """Get usage for one session"""
+    return usage_tracker.get_session_usage(session_id)
+
+def get_server_usage() -> Dict[str, Any]:
+    """Get server-wide usage"""
+    return usage_tracker.get_server_usage()
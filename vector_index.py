@@ -0,0 +1,112 @@
+"""
+Dense vector retrieval for few-shot examples
+
+Examples are embedded once at load time (TF-IDF reduced with truncated SVD)
+into one contiguous, row-normalized float32 matrix. A query is a single
+matrix-vector product; argpartition picks the best candidates without
+sorting the whole corpus, and maximal marginal relevance re-ranks them so
+the chosen examples are not near-duplicates of each other.
+"""
+
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+from bm25_index import context_weights
+from keyword_engine import TOKEN_PATTERN
+
+try:
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+EMBEDDING_DIMENSIONS = 128
+# Candidates considered for diversity re-ranking, per example requested
+CANDIDATE_FACTOR = 8
+# 1.0 ranks by relevance only; lower values trade relevance for diversity
+MMR_LAMBDA = 0.7
+MIN_SIMILARITY = 0.05
+
+
+class VectorIndex:
+    """Contiguous matrix of normalized example embeddings with top-k and MMR selection"""
+
+    def __init__(self, documents: Sequence[str], dimensions: int = EMBEDDING_DIMENSIONS, seed: int = 0):
+        if not SKLEARN_AVAILABLE:
+            raise ImportError("scikit-learn is required for vector retrieval")
+        self.vectorizer = TfidfVectorizer(sublinear_tf=True, token_pattern=TOKEN_PATTERN.pattern)
+        tfidf = self.vectorizer.fit_transform(documents)
+        # SVD needs fewer components than features; tiny corpora keep the sparse TF-IDF space
+        components = min(dimensions, tfidf.shape[1] - 1, tfidf.shape[0] - 1)
+        self.svd = TruncatedSVD(n_components=components, random_state=seed) if components >= 2 else None
+        embeddings = self.svd.fit_transform(tfidf) if self.svd else tfidf.toarray()
+        self.matrix = np.ascontiguousarray(self._normalize(embeddings), dtype=np.float32)
+
+    @classmethod
+    def from_parts(cls, vectorizer, svd, matrix: np.ndarray) -> "VectorIndex":
+        """Index around an already fitted model and its normalized embedding matrix, e.g. from the dataset artifact"""
+        index = cls.__new__(cls)
+        index.vectorizer = vectorizer
+        index.svd = svd
+        index.matrix = matrix
+        return index
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def embed(self, texts: Iterable[str]) -> np.ndarray:
+        """Normalized embeddings for a batch of texts, one row per text"""
+        tfidf = self.vectorizer.transform(list(texts))
+        embeddings = self.svd.transform(tfidf) if self.svd else tfidf.toarray()
+        return self._normalize(embeddings).astype(np.float32)
+
+    def query_vector(self, text: str, context: Iterable[str] = (), context_weight: float = 0.5,
+                     decay: float = 1.0) -> np.ndarray:
+        """Embedding of a message with its context turns (oldest first) mixed in at lower, decaying weights"""
+        context = list(context)
+        vectors = self.embed([text] + context)
+        weights = np.array(context_weights(len(context), context_weight, decay), dtype=np.float32)
+        query = vectors[0] + weights @ vectors[1:]
+        return self._normalize(query)
+
+    def top_k(self, query: np.ndarray, k: int, mmr_lambda: float = MMR_LAMBDA) -> List[Tuple[int, float]]:
+        """The k most relevant, mutually diverse (document id, similarity) pairs, best first"""
+        return self.top_k_batch(query[np.newaxis, :], k, mmr_lambda)[0]
+
+    def top_k_batch(self, queries: np.ndarray, k: int, mmr_lambda: float = MMR_LAMBDA) -> List[List[Tuple[int, float]]]:
+        """top_k for a (queries x dimensions) matrix with one batched matrix product"""
+        if k <= 0 or not len(self):
+            return [[] for _ in range(len(queries))]
+        similarities = queries @ self.matrix.T
+        candidates = min(len(self), k * CANDIDATE_FACTOR)
+        if candidates < len(self):
+            top = np.argpartition(-similarities, candidates - 1, axis=1)[:, :candidates]
+        else:
+            top = np.broadcast_to(np.arange(len(self)), (len(queries), len(self)))
+        return [self._mmr(row_similarities, row_top, k, mmr_lambda)
+                for row_similarities, row_top in zip(similarities, top)]
+
+    def _mmr(self, similarities: np.ndarray, candidates: np.ndarray, k: int, mmr_lambda: float) -> List[Tuple[int, float]]:
+        """Maximal marginal relevance over the candidate rows"""
+        candidates = candidates[similarities[candidates] >= MIN_SIMILARITY]
+        if not len(candidates):
+            return []
+        relevance = similarities[candidates]
+        vectors = self.matrix[candidates]
+        available = np.ones(len(candidates), dtype=bool)
+        # Similarity of every candidate to the closest example chosen so far
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        chosen: List[int] = []
+        for _ in range(min(k, len(candidates))):
+            scores = relevance if not chosen else mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+            best = int(np.argmax(np.where(available, scores, -np.inf)))
+            available[best] = False
+            chosen.append(best)
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+        return [(int(candidates[index]), float(relevance[index])) for index in chosen]